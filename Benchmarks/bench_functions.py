@@ -0,0 +1,201 @@
+##################################################################
+## bench_functions.py : Micro-benchmarks of the hot paths of    ##
+## Functions.py and of the subtitle language detection, saved   ##
+## as JSON baselines to find performance regressions.           ##
+##################################################################
+## Usage: bench_functions.py run [-o BASELINE.json] [-n N ...]  ##
+##        [-s SIZE ...] [-r REPEAT] [--compare BASELINE.json]   ##
+##        bench_functions.py compare BASELINE.json RUN.json     ##
+##        [-t THRESHOLD]                                        ##
+##################################################################
+
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import platform
+import tempfile
+import argparse
+
+# The modules are in the Builds folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Functions import parse_timecodes, timecode_to_ms, ms_to_timecode, escape_characters, build_metadata
+from bench_timecodes import make_chapters
+
+# Sizes of the inputs by default : number of chapters, and size of the subtitle files in bytes
+CHAPTERS = [10, 1000, 100000, 1000000]
+SUBTITLE_SIZES = [1000, 1000000, 100000000]
+
+# A run is a regression if it is this much slower than the baseline (in %)
+THRESHOLD = 10.0
+
+WORDS = ("the of and to in is you that it he was for on are as with his they at be this have from or one had by "
+         "word but not what all were we when your can said there use an each which she do how their if will up").split()
+
+
+def make_subtitles(size):
+    """Returns the content of an English SRT file of about `size` bytes"""
+    random.seed(0)
+    blocks = []
+    length = 0
+    i = 0
+    while length < size:
+        start = ms_to_timecode(i * 2000)
+        end = ms_to_timecode(i * 2000 + 1500)
+        block = f"{i+1}\n{start},000 --> {end},500\n{' '.join(random.choices(WORDS, k=8)).capitalize()}.\n\n"
+        blocks.append(block)
+        length += len(block)
+        i += 1
+    return "".join(blocks)
+
+
+def measure(function, repeat):
+    """Returns the best time (in s) of one call of a function over repeat runs.
+    Fast functions are called several times per run (at least 0.2 s), so that the baselines are stable."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load_detect_language():
+    """Returns the subtitle language detection (without its cache), or None with the reason if it can't be imported"""
+    try:
+        import langdetect, pycountry
+        from Language import detect_language # Not from Shears_UI.py, whose import opens the splash screen
+    except ImportError as e: # langdetect or pycountry missing
+        return None, str(e)
+    return (lambda path: detect_language(path, use_cache=False)), ""
+
+
+def chapter_cases(n):
+    """Returns the benchmarks of the chapter functions for n chapters, as a list of (name, function)"""
+    text = make_chapters(n)
+    lines = text.split("\n")
+    times, titles = parse_timecodes(lines)
+    times_ms = [timecode_to_ms(t) for t in times]
+    video_time_ms = times_ms[-1] + 60000
+
+    return [(f"parse_timecodes[{n}]", lambda: parse_timecodes(lines)),
+            (f"timecode_to_ms[{n}]", lambda: [timecode_to_ms(t) for t in times]),
+            (f"ms_to_timecode[{n}]", lambda: [ms_to_timecode(t) for t in times_ms]),
+            (f"escape_characters[{n}]", lambda: [escape_characters(t) for t in titles]),
+            (f"build_metadata[{n}]", lambda: build_metadata(times, titles, video_time_ms, "Title", "Author", "2020"))]
+
+
+def subtitle_cases(size, folder):
+    """Returns the benchmark of the language detection for a subtitle file of `size` bytes"""
+    detect_language, reason = load_detect_language()
+    if detect_language is None:
+        print(f"detect_language[{size}] skipped : {reason}")
+        return []
+
+    path = os.path.join(folder, f"subtitles_{size}.srt")
+    if not os.path.isfile(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(make_subtitles(size))
+    return [(f"detect_language[{size}]", lambda: detect_language(path))]
+
+
+def run(chapters=CHAPTERS, subtitle_sizes=SUBTITLE_SIZES, repeat=3, folder=None):
+    """Runs the benchmarks and returns the results
+
+    Args:
+        chapters (list, optional): Numbers of chapters. Defaults to CHAPTERS.
+        subtitle_sizes (list, optional): Sizes of the subtitle files, in bytes. Defaults to SUBTITLE_SIZES.
+        repeat (int, optional): Number of runs of each benchmark, the best one is kept. Defaults to 3.
+        folder (str, optional): Folder where the subtitle files are generated. Defaults to the temporary folder.
+
+    Returns:
+        run (dict): The machine, date and results (best time in seconds of each benchmark)
+    """
+    folder = folder or tempfile.gettempdir()
+
+    results = {}
+    cases = [case for n in chapters for case in chapter_cases(n)]
+    cases += [case for size in subtitle_sizes for case in subtitle_cases(size, folder)]
+    for name, function in cases:
+        results[name] = measure(function, repeat)
+        print(f"{name:<32} {results[name]:>12.6f} s")
+
+    return {"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "repeat": repeat,
+            "results": results}
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """Prints the difference between two runs and returns the benchmarks that are slower than the threshold
+
+    Args:
+        baseline (dict): The reference run
+        current (dict): The new run
+        threshold (float, optional): Slowdown in % above which a benchmark is a regression. Defaults to THRESHOLD.
+
+    Returns:
+        regressions (list): The names of the benchmarks slower than the threshold
+    """
+    regressions = []
+    print(f"{'Benchmark':<32} {'Baseline (s)':>13} {'Current (s)':>13} {'Change':>9}")
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<32} {'-':>13} {new:>13.6f} {'new':>9}")
+            continue
+
+        change = 100 * (new - old) / old if old > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <- regression"
+        print(f"{name:<32} {old:>13.6f} {new:>13.6f} {change:>+8.1f}%{flag}")
+
+    print(f"{len(regressions)} regression(s) above {threshold:.0f} %")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of Functions.py, saved as JSON baselines.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Runs the benchmarks')
+    run_parser.add_argument('-n', type=int, nargs='+', help='Numbers of chapters', default=CHAPTERS)
+    run_parser.add_argument('-s', '--subtitle-sizes', type=int, nargs='+', help='Sizes of the subtitle files in bytes (0 to skip)', default=SUBTITLE_SIZES)
+    run_parser.add_argument('-r', '--repeat', type=int, help='Number of runs (the best one is kept)', default=3)
+    run_parser.add_argument('-o', '--output', type=str, help='Saves the results to this JSON file', default='')
+    run_parser.add_argument('--compare', type=str, help='Compares the results with this JSON baseline', default='')
+    run_parser.add_argument('-t', '--threshold', type=float, help='Regression threshold in %% (default : %(default)s)', default=THRESHOLD)
+
+    compare_parser = commands.add_parser('compare', help='Compares two JSON results')
+    compare_parser.add_argument('baseline', type=str, help='The reference results')
+    compare_parser.add_argument('current', type=str, help='The new results')
+    compare_parser.add_argument('-t', '--threshold', type=float, help='Regression threshold in %% (default : %(default)s)', default=THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        current = run(args.n, [size for size in args.subtitle_sizes if size > 0], args.repeat)
+        if args.output != '':
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+            print("Results saved to " + args.output)
+        if args.compare == '':
+            return
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+
+    # Non-zero exit code if there is a regression (e.g. to fail a CI job)
+    if len(compare(baseline, current, args.threshold)) != 0:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
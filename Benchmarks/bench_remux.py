@@ -0,0 +1,258 @@
+##################################################################
+## bench_remux.py : End to end throughput of Shears on          ##
+## synthetic videos generated with the lavfi sources of ffmpeg. ##
+##################################################################
+## Usage: bench_remux.py [-d DURATION ...] [-b BITRATE]         ##
+##        [-c {mp4,mkv} ...] [--count COUNT] [--chapters N]     ##
+##        [--sample] [--folder FOLDER] [-o RESULTS.json]        ##
+##################################################################
+## Requirements: 	ffmpeg (with libx264), ffprobe              ##
+##################################################################
+## Each stage (probe, metadata, remux, full pipeline, in place,  ##
+## batch) is run in a fresh Python process, to measure its wall  ##
+## time, throughput, peak memory (RSS, of Python and of ffmpeg)  ##
+## and the number of subprocesses started.                      ##
+##################################################################
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource # Peak memory of the processes (not available on Windows)
+except ImportError:
+    resource = None
+
+# The modules are in the Builds folder
+BUILDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds")
+sys.path.insert(0, BUILDS)
+
+from bench_timecodes import make_chapters
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Tests", "6min720p.mp4")
+STAGES = ["probe", "metadata", "remux", "pipeline", "in_place"]
+
+
+#%% Synthetic media
+
+def generate_video(folder, duration, bitrate="4M", container="mp4", size="1280x720", rate=25):
+    """Generates a test video (test pattern and sine wave) with the lavfi sources of ffmpeg.
+    The video is kept in the folder and reused by the next runs with the same parameters.
+
+    Args:
+        folder (str): The folder of the videos
+        duration (float): Duration of the video, in seconds
+        bitrate (str, optional): Bitrate of the video (the file size is about duration * bitrate). Defaults to "4M".
+        container (str, optional): "mp4" or "mkv". Defaults to "mp4".
+        size (str, optional): Size of the video. Defaults to "1280x720".
+        rate (int, optional): Frames per second. Defaults to 25.
+
+    Returns:
+        path (str): The path to the video
+    """
+    path = os.path.join(folder, f"synthetic_{duration:g}s_{bitrate}_{size}.{container}")
+    if os.path.isfile(path):
+        return path
+
+    command = ['ffmpeg', '-y', '-v', 'error',
+               '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={rate}:duration={duration}',
+               '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+               '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate,
+               '-x264-params', 'nal-hrd=cbr', '-c:a', 'aac', '-shortest', path + ".part." + container]
+    subprocess.run(command, check=True)
+    os.replace(path + ".part." + container, path)
+    return path
+
+
+def write_chapters_file(folder, duration, chapters):
+    """Writes a chapters file with the given number of chapters spread over the video (at least 1 s per chapter)"""
+    chapters = max(1, min(chapters, int(duration)))
+    path = os.path.join(folder, f"chapters_{duration:g}s_{chapters}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(make_chapters(chapters, int(duration * 1000)))
+    return path
+
+
+#%% Stages (run in a worker process)
+
+def _count_subprocesses():
+    """Replaces subprocess.Popen in the worker to count the processes started (also by subprocess.run and asyncio)"""
+
+    class CountingPopen(subprocess.Popen):
+        count = 0
+
+        def __init__(self, *args, **kwargs):
+            CountingPopen.count += 1
+            super().__init__(*args, **kwargs)
+
+    subprocess.Popen = CountingPopen
+    return CountingPopen
+
+
+def _peak_rss_mb():
+    """Returns the peak memory of the worker and of its finished subprocesses, in MB (None if unknown)"""
+    if resource is None:
+        return None, None
+    unit = 1 if sys.platform == "darwin" else 1024 # ru_maxrss is in bytes on macOS, in kB on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 1e6,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 1e6)
+
+
+def run_stage(stage, movie, chapters, output, cache):
+    """Runs one stage of the pipeline and measures it (in a fresh worker process)
+
+    Returns:
+        result (dict): stage, time (s), rss_mb (Python), child_rss_mb (largest subprocess) and subprocesses
+    """
+    os.environ["SHEARS_CACHE"] = cache # The probe cache of the benchmark, not the one of the user
+    counter = _count_subprocesses()
+
+    from Functions import probe_file, iter_chapters, iter_metadata, remux_command, add_chapters
+    start = time.perf_counter()
+
+    if stage == "probe":
+        probe_file(movie, use_cache=False)
+
+    elif stage == "metadata":
+        "".join(iter_metadata(iter_chapters(chapters), 10**12, "Title", "Author", "2020"))
+
+    elif stage == "remux":
+        # ffmpeg alone, with the metadata already built
+        metadata = "".join(iter_metadata(iter_chapters(chapters), 10**12)).encode("utf-8")
+        subprocess.run(remux_command(movie, output), input=metadata, check=True, capture_output=True)
+
+    elif stage == "pipeline":
+        # What Shears.py does : probe, metadata and remux
+        add_chapters(movie, chapters, output, overwrite="overwrite")
+
+    elif stage == "in_place":
+        # Chapters written in the output of the remux, without copying the streams
+        if output.endswith(".mkv"):
+            from Matroska import write_chapters
+        else:
+            from MP4 import write_chapters
+        write_chapters(output, iter_chapters(chapters))
+
+    elapsed = time.perf_counter() - start
+    rss, child_rss = _peak_rss_mb()
+    return {"stage": stage, "time": elapsed, "rss_mb": rss, "child_rss_mb": child_rss, "subprocesses": counter.count}
+
+
+def run_batch_stage(movies, chapters, folder, cache, workers):
+    """Runs the batch mode (async engine) on all the videos, in a fresh worker process"""
+    os.environ["SHEARS_CACHE"] = cache
+    counter = _count_subprocesses()
+
+    from Batch import Job, run_batch
+    jobs = [Job(movie, chapters, output=os.path.join(folder, "batch_" + os.path.basename(movie))) for movie in movies]
+
+    start = time.perf_counter()
+    results = run_batch(jobs, workers=workers, overwrite="overwrite", engine="async")
+    elapsed = time.perf_counter() - start
+
+    failed = [result["error"] for result in results if result["status"] != "done"]
+    if len(failed) != 0:
+        raise OSError(failed[0])
+
+    rss, child_rss = _peak_rss_mb()
+    return {"stage": "batch", "time": elapsed, "rss_mb": rss, "child_rss_mb": child_rss, "subprocesses": counter.count}
+
+
+def in_worker(function, *args):
+    """Runs a function in a new Python process, so that the peak memory and subprocesses are only the ones of the stage"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(function, *args).result()
+
+
+#%% Report
+
+def print_result(name, size, result):
+    mb_per_s = size / 1e6 / result["time"] if result["time"] > 0 else 0.0
+    rss = "-" if result["rss_mb"] is None else f"{result['rss_mb']:.0f}"
+    child_rss = "-" if result["child_rss_mb"] is None else f"{result['child_rss_mb']:.0f}"
+    print(f"{name:<36} {size/1e6:>9.1f} {result['stage']:<9} {result['time']:>9.3f} {mb_per_s:>9.1f} {rss:>8} {child_rss:>10} {result['subprocesses']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End to end throughput of Shears on synthetic videos.')
+    parser.add_argument('-d', '--duration', type=float, nargs='+', help='Durations of the videos, in seconds', default=[60, 600])
+    parser.add_argument('-b', '--bitrate', type=str, help='Bitrate of the videos (e.g. 4M, 40M for multi-GB files)', default="4M")
+    parser.add_argument('-c', '--containers', type=str, nargs='+', choices=["mp4", "mkv"], help='Containers of the videos', default=["mp4", "mkv"])
+    parser.add_argument('-s', '--size', type=str, help='Size of the videos', default="1280x720")
+    parser.add_argument('--chapters', type=int, help='Number of chapters', default=20)
+    parser.add_argument('--count', type=int, help='Number of small videos (10 s) for the batch stage (0 to skip)', default=20)
+    parser.add_argument('-j', '--jobs', type=int, help='Number of jobs at the same time in the batch stage', default=None)
+    parser.add_argument('--sample', action='store_true', help='Also runs the pipeline on Tests/6min720p.mp4')
+    parser.add_argument('--folder', type=str, help='Folder of the generated videos (kept between runs)', default="bench_media")
+    parser.add_argument('-o', '--output', type=str, help='Saves the results to this JSON file', default='')
+    args = parser.parse_args()
+
+    for tool in ["ffmpeg", "ffprobe"]:
+        if shutil.which(tool) is None:
+            raise SystemExit(f"{tool} is required for this benchmark")
+
+    args.folder = os.path.abspath(args.folder)
+    os.makedirs(args.folder, exist_ok=True)
+    cache = os.path.join(args.folder, "probe_cache.sqlite")
+
+    # Videos : synthetic ones, and the sample of the repository
+    movies = []
+    for duration in args.duration:
+        for container in args.containers:
+            start = time.perf_counter()
+            movie = generate_video(args.folder, duration, args.bitrate, container, args.size)
+            print(f"Video {movie} ready ({time.perf_counter() - start:.1f} s)")
+            movies.append((movie, duration))
+    if args.sample:
+        movies.append((os.path.abspath(SAMPLE), 360))
+
+    print(f"\n{'File':<36} {'Size (MB)':>9} {'Stage':<9} {'Time (s)':>9} {'MB/s':>9} {'RSS (MB)':>8} {'ffmpeg RSS':>10} {'Procs':>5}")
+    results = []
+    for movie, duration in movies:
+        size = os.path.getsize(movie)
+        chapters = write_chapters_file(args.folder, duration, args.chapters)
+        output = os.path.join(args.folder, "output_" + os.path.basename(movie))
+
+        for stage in STAGES:
+            result = in_worker(run_stage, stage, movie, chapters, output, cache)
+            result.update({"file": os.path.basename(movie), "bytes": size})
+            results.append(result)
+            print_result(os.path.basename(movie), size, result)
+        os.remove(output)
+
+    # Many small files at once
+    if args.count > 0:
+        small = []
+        for i in range(args.count):
+            template = generate_video(args.folder, 10, "1M", args.containers[i % len(args.containers)], "640x360")
+            small.append(os.path.join(args.folder, f"small_{i}{os.path.splitext(template)[1]}"))
+            shutil.copyfile(template, small[-1])
+        chapters = write_chapters_file(args.folder, 10, min(args.chapters, 10))
+        size = sum(os.path.getsize(movie) for movie in small)
+
+        result = in_worker(run_batch_stage, small, chapters, args.folder, cache, args.jobs)
+        result.update({"file": f"{args.count} small files", "bytes": size})
+        results.append(result)
+        print_result(result["file"], size, result)
+
+        for movie in small:
+            os.remove(movie)
+            os.remove(os.path.join(args.folder, "batch_" + os.path.basename(movie)))
+
+    if args.output != '':
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "python": platform.python_version(),
+                       "machine": platform.platform(),
+                       "results": results}, f, indent=2)
+        print("Results saved to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+##################################################################
+## bench_startup.py : Startup time of Shears : imports of the   ##
+## modules, splash screen and main window, each measured in a   ##
+## new Python interpreter (cold start of the modules).          ##
+##################################################################
+## Usage: bench_startup.py [-r REPEAT] [--importtime N]         ##
+##        [--budget MS]                                         ##
+##################################################################
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+BUILDS = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+SPLASH = os.path.abspath(os.path.join(BUILDS, "..", "Ressources", "Splash.png"))
+
+# Makes "import tkinter" fail, as on a server without Tk : the command line and the batch workers must not need it
+BLOCK_TK = "sys.modules['tkinter'] = None\n"
+
+# Modules of the command line and of the batch workers
+HEADLESS_MODULES = ["Functions", "Shears", "Batch", "Runner", "Language", "Cache", "Trace", "Progress", "Matroska", "MP4"]
+HEADLESS_CASE = "import Shears (command line, headless)"
+
+# Code run in a new interpreter for each case. The time is measured inside the interpreter (without its own startup)
+CASES = [
+    ("python (no import)", "pass"),
+    ("import Functions (headless)", BLOCK_TK + "import Functions"),
+    (HEADLESS_CASE, BLOCK_TK + "import Shears"),
+    ("import Batch (worker process, headless)", BLOCK_TK + "import Batch"),
+    ("import Shears_UI", "import Shears_UI"),
+    ("import Shears_UI (eager, as before)", "import Shears_UI, langdetect, pycountry, external_windows"),
+    ("splash screen shown", f"from Splash import Splash; s = Splash({SPLASH!r}); assert s.root is not None, 'no display'"),
+    ("main window shown", "import Shears_UI; app = Shears_UI.Application(); app.update(); app.destroy()"),
+]
+
+
+def measure(code):
+    """Runs code in a new interpreter (in the Builds folder)
+
+    Returns:
+        time (float): The time taken by the code in seconds, or None if it failed
+        total (float): The time until the interpreter exits (with its startup), or None
+        error (str): The last line of the error if the code failed
+    """
+    script = ("import time, sys\n"
+              "start = time.perf_counter()\n"
+              f"{code}\n"
+              "sys.stdout.write(repr(time.perf_counter() - start))\n")
+    import time
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", script], cwd=BUILDS, capture_output=True, text=True)
+    total = time.perf_counter() - start
+
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        return None, None, lines[-1] if lines else f"exit code {process.returncode}"
+    return float(process.stdout.strip().splitlines()[-1]), total, ""
+
+
+def import_times(module, count):
+    """Returns the slowest imports of a module, as (cumulative time in ms, module), using python -X importtime"""
+
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BUILDS, capture_output=True, text=True)
+    times = []
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(times, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of the modules and windows of Shears.')
+    parser.add_argument('-r', '--repeat', type=int, help='Number of runs of each case (the median is kept)', default=5)
+    parser.add_argument('--importtime', type=int, help='Shows the N slowest imports of Shears_UI (0 to skip)', default=10)
+    parser.add_argument('--budget', type=float, default=None,
+                        help='Fails (exit code 1) if the headless import of Shears takes more than this time (median, in ms)')
+    args = parser.parse_args()
+
+    # The modules of the command line must be importable without tkinter
+    _, _, error = measure(BLOCK_TK + "import " + ", ".join(HEADLESS_MODULES))
+    if error != "":
+        raise SystemExit(f"The command line modules need tkinter : {error}")
+    print("Command line modules importable without tkinter : " + ", ".join(HEADLESS_MODULES) + "\n")
+
+    print(f"{'Case':<40} {'Code (ms)':>10} {'With interpreter (ms)':>22}")
+    headless_time = None
+    for name, code in CASES:
+        runs = [measure(code) for _ in range(args.repeat)]
+        if runs[0][0] is None:
+            print(f"{name:<40} skipped : {runs[0][2]}")
+            continue
+        code_time = statistics.median(run[0] for run in runs)
+        total_time = statistics.median(run[1] for run in runs)
+        print(f"{name:<40} {code_time*1000:>10.1f} {total_time*1000:>22.1f}")
+        if name == HEADLESS_CASE:
+            headless_time = code_time * 1000
+
+    if args.importtime > 0:
+        print(f"\nSlowest imports of Shears_UI (cumulative, ms) :")
+        for cumulative, module in import_times("Shears_UI", args.importtime):
+            print(f"{cumulative:>10.1f}  {module}")
+
+    # Import time of the command line, held under a budget
+    if args.budget is not None and headless_time is not None and headless_time > args.budget:
+        print(f"\nThe headless import of Shears takes {headless_time:.1f} ms, more than the budget of {args.budget:g} ms")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+##################################################################
+## bench_timecodes.py : Compares the per-line timecode          ##
+## functions of Functions.py with the vectorized Timecodes.py.  ##
+##################################################################
+## Usage: bench_timecodes.py [-n N [N ...]] [-r REPEAT]         ##
+##################################################################
+
+import os
+import sys
+import timeit
+import argparse
+
+# The modules are in the Builds folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Functions import parse_timecodes, timecode_to_ms, ms_to_timecode
+from Timecodes import parse_timecodes_buffer, ms_to_timecodes
+
+
+def make_chapters(n, length_ms=3*3600000):
+    """Returns the content of a chapters file with n chapters spread over a 3 hours movie"""
+    step = length_ms / n
+    return "\n".join(f"{ms_to_timecode(i*step)} Chapter {i+1}" for i in range(n))
+
+
+def best_time(function, repeat):
+    """Returns the best time (in s) of a function over repeat runs"""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the timecode parsing and conversion.')
+    parser.add_argument('-n', type=int, nargs='+', help='Number of chapters', default=[10, 1000, 100000, 1000000])
+    parser.add_argument('-r', '--repeat', type=int, help='Number of runs (the best one is kept)', default=3)
+    args = parser.parse_args()
+
+    print(f"{'Chapters':>10} {'Stage':<22} {'Per-line (s)':>13} {'Vectorized (s)':>15} {'Speedup':>8}")
+    for n in args.n:
+        text = make_chapters(n)
+        times_ms, _ = parse_timecodes_buffer(text)
+
+        def per_line_parse():
+            times, titles = parse_timecodes(text.split("\n"))
+            return [timecode_to_ms(t) for t in times]
+
+        stages = [("parse + to ms", per_line_parse, lambda: parse_timecodes_buffer(text)),
+                  ("ms to timecode", lambda: [ms_to_timecode(t) for t in times_ms.tolist()], lambda: ms_to_timecodes(times_ms))]
+
+        for name, per_line, vectorized in stages:
+            old = best_time(per_line, args.repeat)
+            new = best_time(vectorized, args.repeat)
+            print(f"{n:>10} {name:<22} {old:>13.4f} {new:>15.4f} {old/new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+##################################################################
+## Batch.py : Adds chapters to many video files at once,        ##
+## given a manifest (CSV or JSONL) listing the jobs.            ##
+##################################################################
+## Requirements: 	ffmpeg, python3                             ##
+##################################################################
+
+import os
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Functions import get_output_file, resolve_output_file
+from Language import analyse_subtitles, subtitle_tracks
+from Progress import Progress
+from Governor import Limits
+import Jobs
+
+# How the jobs are run : in a pool of Python processes, as ffmpeg processes driven by asyncio (see Runner.py),
+# or driven by asyncio with a number of jobs per disk adjusted to the measured throughput (see Scheduler.py)
+ENGINES = ["process", "async", "adaptive"]
+
+# Columns of the manifest (only movie and chapters are required)
+MANIFEST_COLUMNS = ["movie", "chapters", "title", "author", "year", "output", "subtitles"]
+
+# Columns of the manifest limiting the ffmpeg process of a job (see Governor.py)
+LIMIT_COLUMNS = ["nice", "ionice", "cpus", "read_rate"]
+
+
+class Job():
+    """A line of the manifest : one video file to add chapters to"""
+
+    def __init__(self, movie, chapters, title='', author='', year='', output='', line=0, subtitles=(), limits=None):
+        self.movie = movie # Path to the movie file
+        self.chapters = chapters # Path to the timecodes file
+        self.title = title
+        self.author = author
+        self.year = year
+        self.output = output # Output file name, same rules as the -o argument of Shears.py
+        self.line = line # Line of the job in the manifest, for the summary
+        self.subtitles = list(subtitles) # Paths to the subtitle files, added as new tracks
+        self.analysis = {} # (language, error) of each subtitle file, filled by analyse_jobs
+        self.limits = limits or Limits() # Limits of the ffmpeg process of this job
+
+    def __repr__(self):
+        return f"Job({self.line}, {self.movie!r})"
+
+
+def read_manifest(manifest_file):
+    """Reads a manifest file and returns the list of jobs.
+    The manifest is a CSV file with a header, or a JSONL file (one JSON object per line),
+    with the columns movie, chapters, title, author, year, output and subtitles
+    (subtitle files separated by ";", or a list in JSONL), and optionally the limits of the job :
+    nice, ionice, cpus and read_rate (see Governor.Limits.from_strings).
+    Relative paths are relative to the folder of the manifest.
+
+    Args:
+        manifest_file (str): The path to the manifest (.csv, .jsonl or .json)
+
+    Raises:
+        ValueError: If a line of the manifest is invalid
+
+    Returns:
+        jobs (list): The list of Job objects
+    """
+    base_path = os.path.dirname(os.path.abspath(manifest_file))
+
+    # Reading the rows as dictionaries
+    with open(manifest_file, newline='', encoding="utf-8") as f:
+        if os.path.splitext(manifest_file)[1].lower() in [".jsonl", ".json"]:
+            rows = []
+            for i, line in enumerate(f, start=1):
+                if line.strip() == "":
+                    continue
+                try:
+                    rows.append((i, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Line {i} of the manifest is not valid JSON : {e}")
+        else:
+            rows = list(enumerate(csv.DictReader(f), start=2)) # The first line is the header
+
+    jobs = []
+    for i, row in rows:
+        row = {key.strip().lower(): (";".join(map(str, value)) if isinstance(value, list) else str(value)).strip()
+               for key, value in row.items() if key is not None and value is not None}
+
+        # Checks the required columns
+        if row.get("movie", "") == "" or row.get("chapters", "") == "":
+            raise ValueError(f"Line {i} of the manifest must have a movie and a chapters file")
+        try:
+            limits = Limits.from_strings(*[row.get(column, '') for column in LIMIT_COLUMNS])
+        except ValueError as e:
+            raise ValueError(f"Line {i} of the manifest : {e}")
+
+        jobs.append(Job(movie=os.path.join(base_path, row["movie"]),
+                        chapters=os.path.join(base_path, row["chapters"]),
+                        title=row.get("title", ''),
+                        author=row.get("author", ''),
+                        year=row.get("year", ''),
+                        output=row.get("output", ''),
+                        line=i,
+                        subtitles=[os.path.join(base_path, path.strip()) for path in row.get("subtitles", '').split(";") if path.strip() != ''],
+                        limits=limits))
+    return jobs
+
+
+def analyse_jobs(jobs, workers=None):
+    """Checks the subtitle files of all the jobs and detects their languages at once, in a pool of processes
+    (see Language.analyse_subtitles), before the jobs are run. An invalid file only fails its job."""
+
+    analysis = analyse_subtitles([path for job in jobs for path in job.subtitles], workers)
+    for job in jobs:
+        job.analysis = {path: analysis[path] for path in job.subtitles}
+
+
+def run_job(job, overwrite="skip", limits=None):
+    """Runs the probe + metadata + ffmpeg pipeline for a job (in a worker process)
+
+    Args:
+        job (Job): The job to run
+        overwrite (str, optional): Policy if the output exists, see Functions.OVERWRITE_POLICIES. Defaults to "skip".
+        limits (Limits, optional): Limits of all the jobs, combined with the limits of the job. Defaults to None.
+
+    Returns:
+        result (dict): status ("done", "skipped" or "failed"), output, time (s), bytes, error and stages (s)
+    """
+    start = time.perf_counter()
+    output_file = get_output_file(job.movie, job.output, job.title)
+    result = {"job": job, "status": "done", "output": output_file, "bytes": 0, "error": "", "stages": {}}
+
+    try:
+        # The languages of the subtitles were detected for the whole batch (see analyse_jobs)
+        subtitles = subtitle_tracks(job.subtitles, job.analysis)
+        job_result = Jobs.run_job(Jobs.ShearsJob(job.movie, job.chapters, output_file, job.title, job.author, job.year,
+                                                 subtitles, overwrite, job.limits.stricter(limits or Limits())))
+        result["output"] = job_result.output
+        result["bytes"] = job_result.bytes
+        result["stages"] = job_result.stages
+    except FileExistsError as e:
+        result["status"] = "skipped"
+        result["error"] = str(e)
+    except (OSError, ValueError) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+
+    result["time"] = time.perf_counter() - start
+    return result
+
+
+def _destination(job, overwrite="skip"):
+    """Returns the file a job will write, after the overwrite policy (e.g. renamed), to know the device it writes to.
+    The name is resolved again when the job starts (see Jobs.prepare_job)."""
+    output_file = get_output_file(job.movie, job.output, job.title)
+    try:
+        return resolve_output_file(output_file, overwrite)
+    except FileExistsError:
+        return output_file # The job will be skipped
+
+
+async def run_job_async(runner, job, overwrite="skip", progress_callback=None, limits=None):
+    """Same as run_job, with the ffprobe and ffmpeg processes started by an asyncio Runner
+
+    Args:
+        runner (Runner): The runner limiting the number of processes
+        job (Job): The job to run
+        overwrite (str, optional): Policy if the output exists, see Functions.OVERWRITE_POLICIES. Defaults to "skip".
+        progress_callback (function, optional): Called with a Progress object while ffmpeg runs. Defaults to None.
+        limits (Limits, optional): Limits of all the jobs, combined with the limits of the job. Defaults to None.
+
+    Returns:
+        result (dict): status ("done", "skipped" or "failed"), output, time (s), bytes, error and stages (s)
+    """
+    start = time.perf_counter()
+    output_file = get_output_file(job.movie, job.output, job.title)
+    result = {"job": job, "status": "done", "output": output_file, "bytes": 0, "error": "", "stages": {}}
+
+    try:
+        # Same stages as Jobs.run_job, only the probe and ffmpeg are run by the runner
+        subtitles = subtitle_tracks(job.subtitles, job.analysis)
+        limits = job.limits.stricter(limits or Limits())
+        job_result, chapters = Jobs.prepare_job(Jobs.ShearsJob(job.movie, job.chapters, output_file, job.title, job.author, job.year,
+                                                               subtitles, overwrite, limits))
+        result["output"] = job_result.output
+
+        probe_start = time.perf_counter()
+        info = await runner.probe(job.movie) # Writes its own span
+        job_result.stages["probe"] = time.perf_counter() - probe_start
+
+        command, metadata = Jobs.remux_input(job_result, chapters, info, progress_callback is not None)
+        progress = Progress(info.duration_ms, progress_callback) if progress_callback is not None else None
+        with Jobs.remux_stage(job_result):
+            process = await runner.run(command, input=metadata, stdout_callback=progress.feed if progress is not None else None, limits=limits)
+            job_result.stderr = process.check().stderr.decode('utf-8', 'replace').strip()
+
+        result["bytes"] = job_result.bytes
+        result["stages"] = job_result.stages
+    except FileExistsError as e:
+        result["status"] = "skipped"
+        result["error"] = str(e)
+    except (OSError, ValueError) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+
+    result["time"] = time.perf_counter() - start
+    return result
+
+
+def run_batch_async(jobs, workers=None, overwrite="skip", callback=None, adaptive=False, limits=None):
+    """Runs the jobs in an asyncio event loop, with at most `workers` ffmpeg/ffprobe processes at the same time.
+    No Python worker process is needed, and probing a file can overlap with remuxing another one.
+    With adaptive, the jobs are started by a Scheduler : the number of jobs reading or writing each disk
+    follows its measured throughput, `workers` being the maximum on all disks.
+    The other arguments and the results are the same as run_batch.
+    """
+    # Loaded here, asyncio is slow to import and not needed by the process engine
+    import asyncio
+    from Runner import Runner
+    from Scheduler import Scheduler
+
+    if overwrite == "ask":
+        raise ValueError("The batch mode can't ask before overwriting a file")
+
+    analyse_jobs(jobs, workers)
+    runner = Runner(max_jobs=workers)
+
+    async def run_one(job, scheduler):
+        if scheduler is None:
+            return await run_job_async(runner, job, overwrite, limits=limits)
+        return await scheduler.run(job.movie, _destination(job, overwrite),
+                                   lambda progress_callback: run_job_async(runner, job, overwrite, progress_callback, limits))
+
+    async def run_all(scheduler=None):
+        tasks = [asyncio.ensure_future(run_one(job, scheduler)) for job in jobs]
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            if callback is not None:
+                callback(result)
+        return [task.result() for task in tasks]
+
+    async def run_adaptive():
+        async with Scheduler(max_jobs=workers) as scheduler:
+            return await run_all(scheduler)
+
+    return asyncio.run(run_adaptive() if adaptive else run_all())
+
+
+def run_batch(jobs, workers=None, overwrite="skip", callback=None, engine="process", limits=None):
+    """Runs the jobs on a bounded process pool (or with run_batch_async if engine is "async")
+
+    Args:
+        jobs (list): The list of Job objects
+        workers (int, optional): Maximum number of jobs run at the same time. Defaults to the number of CPUs.
+        overwrite (str, optional): Policy if the output exists, can't be "ask". Defaults to "skip".
+        callback (function, optional): Called with each result as soon as its job is finished. Defaults to None.
+        engine (str, optional): One of ENGINES. Defaults to "process".
+        limits (Limits, optional): Limits of all the jobs (see Governor.py), a line of the manifest can only be stricter. Defaults to None.
+
+    Returns:
+        results (list): The results of the jobs, in the order of the manifest
+    """
+    if engine in ["async", "adaptive"]:
+        return run_batch_async(jobs, workers, overwrite, callback, adaptive=engine == "adaptive", limits=limits)
+
+    if overwrite == "ask":
+        raise ValueError("The batch mode can't ask before overwriting a file")
+
+    analyse_jobs(jobs, workers)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, job, overwrite, limits): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if callback is not None:
+                callback(result)
+
+    return [results[i] for i in range(len(jobs))]
+
+
+def print_summary(results, total_time=None):
+    """Prints a table with the status, wall time and bytes written of each job
+
+    Args:
+        results (list): The results returned by run_batch
+        total_time (float, optional): The wall time of the whole batch, in seconds. Defaults to None.
+    """
+    print(f"{'Line':>5}  {'Status':<8} {'Time (s)':>9} {'Bytes':>14}  Output")
+    for result in results:
+        print(f"{result['job'].line:>5}  {result['status']:<8} {result['time']:>9.2f} {result['bytes']:>14,}  {result['output']}")
+        if result["error"] != "":
+            print(f"{'':>5}  -> {result['error']}")
+
+    # Totals
+    done = sum(result["status"] == "done" for result in results)
+    written = sum(result["bytes"] for result in results)
+    print(f"{done}/{len(results)} jobs done, {written:,} bytes written" + (f" in {total_time:.2f} s" if total_time is not None else ""))
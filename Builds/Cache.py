@@ -0,0 +1,169 @@
+##################################################################
+## Cache.py : On-disk cache of the ffprobe results, keyed by    ##
+## the path, size and modification time of the files.           ##
+##################################################################
+## Usage: Cache.py info                                         ##
+##        Cache.py invalidate FILE [FILE ...]                   ##
+##        Cache.py clear                                        ##
+##################################################################
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+# Default maximum size of the cached data (in bytes) before the least recently used entries are evicted
+MAX_SIZE = 64 * 1024 * 1024
+
+
+def default_cache_path():
+    """Returns the path of the cache database (can be changed with the SHEARS_CACHE environment variable)"""
+
+    if os.environ.get("SHEARS_CACHE", "") != "":
+        return os.environ["SHEARS_CACHE"]
+
+    # User cache folder, depending on the OS
+    if sys.platform == "win32":
+        base_path = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base_path = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+
+    return os.path.join(base_path, "Shears", "probe_cache.sqlite")
+
+
+def file_identity(path):
+    """Returns the key of a file in the cache : (absolute path, size, modification time in ns)"""
+
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class ProbeCache():
+    """SQLite cache of the ffprobe results (duration, streams and chapters of a file).
+    An entry is only valid if the size and modification time of the file did not change.
+    When the cached data is bigger than max_size, the least recently used entries are evicted.
+    The cache can be used by several threads (e.g. the probes of the graphical interface run in worker threads).
+    """
+
+    def __init__(self, path=None, max_size=MAX_SIZE):
+        self.path = default_cache_path() if path is None else path
+        self.max_size = max_size
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # The timeout lets parallel jobs wait for each other instead of failing on a locked database.
+        # The connection is shared by the threads of the process, one at a time (see self._lock)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS probes ("
+                                    "path TEXT PRIMARY KEY, "
+                                    "size INTEGER, "
+                                    "mtime_ns INTEGER, "
+                                    "data TEXT, "
+                                    "last_used REAL)")
+
+    def get(self, file):
+        """Returns the cached probe data of a file, or None if it is not cached or outdated"""
+
+        path, size, mtime_ns = file_identity(file)
+        with self._lock:
+            row = self.connection.execute("SELECT size, mtime_ns, data FROM probes WHERE path = ?", (path,)).fetchone()
+
+            if row is None:
+                return None
+
+            # The file changed since it was probed
+            if row[0] != size or row[1] != mtime_ns:
+                self.invalidate(file)
+                return None
+
+            # Mark the entry as recently used
+            with self.connection:
+                self.connection.execute("UPDATE probes SET last_used = ? WHERE path = ?", (time.time(), path))
+            return row[2]
+
+    def put(self, file, data):
+        """Stores the probe data (str) of a file"""
+
+        path, size, mtime_ns = file_identity(file)
+        with self._lock:
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                                        (path, size, mtime_ns, data, time.time()))
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cached data is smaller than max_size"""
+
+        with self._lock:
+            total = self.connection.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM probes").fetchone()[0]
+            if total <= self.max_size:
+                return
+
+            with self.connection:
+                for path, length in self.connection.execute("SELECT path, LENGTH(data) FROM probes ORDER BY last_used").fetchall():
+                    if total <= self.max_size:
+                        break
+                    self.connection.execute("DELETE FROM probes WHERE path = ?", (path,))
+                    total -= length
+
+    def invalidate(self, file):
+        """Removes a file from the cache"""
+
+        with self._lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM probes WHERE path = ?", (os.path.abspath(file),))
+
+    def clear(self):
+        """Removes every entry of the cache"""
+
+        with self._lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM probes")
+
+    def info(self):
+        """Returns the number of entries and the size of the cached data (in bytes)"""
+
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM probes").fetchone()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+# One cache per process, opened on first use
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Returns the cache of the current process, or None if it can't be opened"""
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ProbeCache()
+            except (OSError, sqlite3.Error):
+                _cache = False # Don't try again, the probes will just not be cached
+    return _cache or None
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Manages the cache of the ffprobe results.')
+    parser.add_argument('command', type=str, choices=["info", "invalidate", "clear"], help='info : size of the cache, invalidate : remove the given files, clear : remove everything')
+    parser.add_argument('files', type=str, nargs='*', help='The files to remove from the cache (with invalidate)')
+    args = parser.parse_args()
+
+    cache = ProbeCache()
+    if args.command == "invalidate":
+        for file in args.files:
+            cache.invalidate(file)
+    elif args.command == "clear":
+        cache.clear()
+
+    entries, size = cache.info()
+    print(f"{cache.path} : {entries} files, {size:,} bytes")
@@ -0,0 +1,110 @@
+##################################################################
+## Chapters.py : Sorted list of chapters edited in the          ##
+## graphical interface (start time in ms and title).            ##
+##################################################################
+
+from bisect import bisect_left
+
+from Functions import ms_to_timecode
+
+
+class ChapterList():
+    """The chapters of the table, kept sorted by start time with bisect (one chapter per start time).
+    Finding, adding or removing a chapter gives its index, so that the table only inserts or deletes that row.
+    The chapters of a file are appended as they are read, and sorted once at the end (see append).
+
+    Usage:
+        chapters = ChapterList()
+        index, replaced = chapters.add(timecode_to_ms("01:30"), "Chapter 2")
+    """
+
+    def __init__(self, chapters=()):
+        """
+        Args:
+            chapters (iterable, optional): (start in ms, title) of the chapters, in any order. Defaults to ().
+        """
+        self._starts = [] # Start times in ms, sorted
+        self._titles = [] # Titles, in the same order
+        self.load(chapters)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        """Yields the (start in ms, title) of the chapters, in order"""
+        return zip(self._starts, self._titles)
+
+    def __getitem__(self, index):
+        return self._starts[index], self._titles[index]
+
+    def __contains__(self, start_ms):
+        return self.index(start_ms) != -1
+
+    def index(self, start_ms):
+        """Returns the index of the chapter starting at start_ms, or -1 if there is none (O(log n))"""
+        i = bisect_left(self._starts, start_ms)
+        if i < len(self._starts) and self._starts[i] == start_ms:
+            return i
+        return -1
+
+    def add(self, start_ms, title):
+        """Adds a chapter, or replaces the title of the chapter starting at the same time
+
+        Returns:
+            index (int): The index of the chapter in the list
+            replaced (bool): True if a chapter already started at this time (its title was replaced)
+        """
+        i = bisect_left(self._starts, start_ms)
+        if i < len(self._starts) and self._starts[i] == start_ms:
+            self._titles[i] = title
+            return i, True
+
+        self._starts.insert(i, start_ms)
+        self._titles.insert(i, title)
+        return i, False
+
+    def append(self, start_ms, title):
+        """Adds a chapter at the end, without keeping the order (O(1)), for the chapters of a file : call sort() after the last one"""
+        self._starts.append(start_ms)
+        self._titles.append(title)
+
+    def sort(self):
+        """Sorts the chapters added with append (a duplicated start time keeps the last title)"""
+        self.load(list(zip(self._starts, self._titles)))
+
+    def remove(self, start_ms):
+        """Removes the chapter starting at start_ms
+
+        Raises:
+            KeyError: If there is no chapter at this time
+
+        Returns:
+            index (int): The index the chapter had in the list
+        """
+        i = self.index(start_ms)
+        if i == -1:
+            raise KeyError(ms_to_timecode(start_ms))
+        del self._starts[i]
+        del self._titles[i]
+        return i
+
+    def load(self, chapters):
+        """Replaces the chapters (sorted once, a duplicated start time keeps the last title)
+
+        Args:
+            chapters (iterable): (start in ms, title) of the chapters, in any order (e.g. Functions.iter_chapters)
+        """
+        merged = dict(chapters)
+        self._starts = sorted(merged)
+        self._titles = [merged[start] for start in self._starts]
+
+    def starts(self):
+        """Returns the start times in ms, in order"""
+        return list(self._starts)
+
+    def titles(self):
+        """Returns the titles, in order"""
+        return list(self._titles)
+
+    def __repr__(self):
+        return f"ChapterList({len(self)} chapters)"
@@ -0,0 +1,34 @@
+##################################################################
+## Dialogs.py : Message windows of the graphical interface,     ##
+## kept out of Functions.py so that it doesn't need tkinter.    ##
+##################################################################
+
+import tkinter as tk # Graphical interface
+from tkinter import messagebox
+
+
+def Error_Window(title, message):
+    """Displays an error window
+
+    Args:
+        title (str): The title of the window
+        message (str): The message to display
+    """
+    
+    root = tk.Tk()
+    root.withdraw()
+    messagebox.showerror(title, message)
+    root.destroy()
+    
+def Info_Window(title, message):
+    """Displays an information window
+
+    Args:
+        title (str): The title of the window
+        message (str): The message to display
+    """
+    
+    root = tk.Tk()
+    root.withdraw()
+    messagebox.showinfo(title, message)
+    root.destroy()
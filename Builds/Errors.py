@@ -0,0 +1,52 @@
+##################################################################
+## Errors.py : Exceptions raised by the jobs of Shears, so that ##
+## a caller can tell a bad chapters file from a failed ffmpeg.  ##
+##################################################################
+## They also derive from the built-in exceptions raised before  ##
+## (ValueError, FileExistsError, OSError), which still work.    ##
+##################################################################
+
+
+class ShearsError(Exception):
+    """Base class of the errors of a job"""
+
+
+class InputError(ShearsError, ValueError):
+    """The movie file doesn't exist, or the output file is the movie file"""
+
+
+class ChaptersError(ShearsError, ValueError):
+    """The chapters are missing or invalid (e.g. a chapter starts after the end of the video)"""
+
+
+class SubtitleError(ShearsError, ValueError):
+    """A subtitle file doesn't exist or is not a subtitle file"""
+
+
+class OutputExistsError(ShearsError, FileExistsError):
+    """The output file exists and the overwrite policy doesn't allow to replace it"""
+
+
+class FFmpegError(ShearsError, OSError):
+    """ffmpeg (or ffprobe) can't be run, failed or was stopped"""
+
+    def __init__(self, message, returncode=None, stderr="", command=()):
+        """
+        Args:
+            message (str): The error message
+            returncode (int, optional): The exit code of the process, None if it didn't run. Defaults to None.
+            stderr (str, optional): The error output of the process. Defaults to "".
+            command (list, optional): The arguments of the process. Defaults to ().
+        """
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+        self.command = list(command)
+
+    def __reduce__(self):
+        # Keeps the attributes when the error is sent back by a worker process
+        return (type(self), (str(self), self.returncode, self.stderr, self.command))
+
+
+class ProbeError(FFmpegError):
+    """ffprobe failed to read the movie file"""
@@ -1,8 +1,39 @@
 import os
 import sys
 import re # Regular expressions
-import tkinter as tk # Graphical interface
-from tkinter import messagebox
+import json
+import itertools
+import sqlite3
+import subprocess
+import threading
+import collections
+
+from Cache import get_cache
+from Progress import Progress, PROGRESS_ARGS
+from Trace import span
+from Errors import InputError, ChaptersError, OutputExistsError, FFmpegError, ProbeError
+
+# Flag to hide the console window of the subprocesses (only exists on Windows)
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# First version of ffmpeg with the -readrate option (used to limit the read throughput, see Governor.py)
+READRATE_VERSION = (5, 0)
+
+# Arguments of ffmpeg to read a FFMETADATA document from stdin
+METADATA_INPUT = ['-f', 'ffmetadata', '-i', 'pipe:']
+
+# A timecode word in a line of a chapters file : [HH:]MM:SS[.mmm], separated from the title by spaces
+CHAPTER_TIMECODE = re.compile(r"(?<![^ \t])(?:(\d+):)?(\d+):(\d+)(?:[.,](\d{1,3}))?(?![^ \t])")
+
+# Arguments of ffprobe to get the format, streams and chapters of a file in JSON
+PROBE_COMMAND = ['ffprobe', '-v', 'error', '-of', 'json', '-show_format', '-show_streams', '-show_chapters']
+
+# Codec of the subtitle tracks added to each output container (SRT files can't be copied in MP4)
+SUBTITLE_CODECS = {".mkv": "srt", ".mka": "srt", ".mk3d": "srt", ".webm": "webvtt",
+                   ".mp4": "mov_text", ".m4v": "mov_text", ".m4a": "mov_text", ".mov": "mov_text"}
+
+# Policies when the output file already exists
+OVERWRITE_POLICIES = ["ask", "overwrite", "skip", "rename"]
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -119,34 +150,534 @@ def parse_timecodes(L: list = input) -> list:
     return times, titles
 
 
-def Error_Window(title, message):
-    """Displays an error window
+def iter_chapters(source, strict=False):
+    """Reads a chapters file line by line and yields the chapters lazily, so that huge files
+    are never loaded in memory. Each line with a timecode ([HH:]MM:SS[.mmm]) gives a chapter,
+    the other words of the line being the title (like parse_timecodes).
 
     Args:
-        title (str): The title of the window
-        message (str): The message to display
+        source (str or file): The path to the chapters file, or an open text file (or pipe)
+        strict (bool, optional): Raise an error on lines without timecode and on chapters out of order,
+            instead of skipping them. Defaults to False.
+
+    Raises:
+        ChaptersError: In strict mode, with the number of the bad line (a ValueError)
+
+    Yields:
+        chapter (tuple): The start time of the chapter in milliseconds (int) and its title (str)
     """
-    
-    root = tk.Tk()
-    root.withdraw()
-    messagebox.showerror(title, message)
-    root.destroy()
-    
-def Info_Window(title, message):
-    """Displays an information window
+    # Open the file if a path is given
+    if isinstance(source, str):
+        with open(source, "r") as f:
+            yield from iter_chapters(f, strict)
+        return
+
+    last_ms = -1
+    for line_number, line in enumerate(source, start=1):
+        line = line.rstrip("\r\n")
+        if line_number == 1:
+            line = line.lstrip("\ufeff") # Byte order mark of the files saved by Notepad
+        t = CHAPTER_TIMECODE.search(line) # The first timecode of the line
+
+        # If we can't find a timecode, we skip the line
+        if t is None:
+            if strict and line.strip() != "":
+                raise ChaptersError(f"Line {line_number} : no timecode found in \"{line}\"")
+            continue
+
+        H, M, S, fraction = t.groups()
+        ms = int(H or 0) * 3600000 + int(M) * 60000 + int(S) * 1000 + (int(fraction.ljust(3, "0")) if fraction else 0)
+
+        if strict and ms <= last_ms:
+            raise ChaptersError(f"Line {line_number} : the chapter starts before the previous one")
+        last_ms = ms
+
+        # The title is made of the words before and after the timecode
+        before, after = line[:t.start()], line[t.end():]
+        title = (before[:-1] + " " + after[1:]) if before and after else (before[:-1] if before else after[1:])
+
+        yield ms, title
+
+
+def ffmpeg_version(version_output):
+    """Reads the version of ffmpeg in the output of ffmpeg -version
+
+    Returns:
+        version (tuple): (major, minor), or None if unknown (e.g. "N-109421-g..." for a development build)
+    """
+    match = re.match(r"\S+ version n?(\d+)\.(\d+)", version_output)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def check_requirements(readrate=False):
+    """Checks that ffmpeg and ffprobe are installed
 
     Args:
-        title (str): The title of the window
-        message (str): The message to display
+        readrate (bool, optional): The read rate of ffmpeg is limited (see Governor.py), which needs ffmpeg 5.0
+            or newer (READRATE_VERSION). Defaults to False.
+
+    Raises:
+        OSError: If ffmpeg or ffprobe can't be run, or ffmpeg is too old to limit the read rate
     """
-    
-    root = tk.Tk()
-    root.withdraw()
-    messagebox.showinfo(title, message)
-    root.destroy()
-    
+    for tool in ["ffmpeg", "ffprobe"]:
+        try:
+            with span("version_check", tool=tool):
+                process = subprocess.run([tool, '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, creationflags=CREATE_NO_WINDOW)
+        except (OSError, subprocess.CalledProcessError):
+            raise OSError(f"{tool} is not installed. Please install it before running this script. (https://ffmpeg.org/)")
 
-        
-        
-        
+        if tool == "ffmpeg" and readrate:
+            version = ffmpeg_version(process.stdout.decode('utf-8', 'replace'))
+            if version is not None and version < READRATE_VERSION:
+                    raise OSError(f"Limiting the read rate needs ffmpeg {READRATE_VERSION[0]}.{READRATE_VERSION[1]} or newer (-readrate), "
+                              f"ffmpeg {version[0]}.{version[1]} is installed. Please update ffmpeg or remove the read rate limit.")
+
+
+class MediaInfo():
+    """Format, streams and chapters of a video file, from a single ffprobe call (see probe_file)"""
+
+    __slots__ = ("path", "format_name", "duration_ms", "size", "bit_rate", "tags", "streams", "chapters")
+
+    def __init__(self, path, probe):
+        """
+        Args:
+            path (str): The path to the video file
+            probe (dict): The JSON output of ffprobe -show_format -show_streams -show_chapters
+        """
+        file_format = probe.get("format", {})
+
+        self.path = path
+        self.format_name = file_format.get("format_name", "") # e.g. "mov,mp4,m4a,3gp,3g2,mj2" or "matroska,webm"
+        self.duration_ms = self._to_ms(file_format.get("duration"))
+        self.size = int(file_format.get("size", 0))
+        self.bit_rate = int(file_format.get("bit_rate", 0))
+        self.tags = file_format.get("tags", {}) # Global metadata (title, artist, date...)
+        self.streams = probe.get("streams", []) # One dictionary per stream, as given by ffprobe
+
+        # Existing chapters, as (start in ms, end in ms, title)
+        self.chapters = [(self._to_ms(chapter.get("start_time")), self._to_ms(chapter.get("end_time")), chapter.get("tags", {}).get("title", ""))
+                         for chapter in probe.get("chapters", [])]
+
+    @staticmethod
+    def _to_ms(seconds):
+        """Converts a time in seconds given by ffprobe ("N/A" if unknown) to milliseconds"""
+        try:
+            return int(float(seconds)*1000)
+        except (TypeError, ValueError):
+            return 0
+
+    def streams_of_type(self, codec_type):
+        """Returns the streams of a type ("video", "audio", "subtitle"...)"""
+        return [stream for stream in self.streams if stream.get("codec_type") == codec_type]
+
+    @property
+    def video_streams(self):
+        return self.streams_of_type("video")
+
+    @property
+    def audio_streams(self):
+        return self.streams_of_type("audio")
+
+    @property
+    def subtitle_streams(self):
+        return self.streams_of_type("subtitle")
+
+    def __repr__(self):
+        return f"MediaInfo({self.path!r}, {self.duration_ms} ms, {len(self.streams)} streams, {len(self.chapters)} chapters)"
+
+
+def cached_probe(movie_file):
+    """Returns the cached MediaInfo of a file, or None if it is not in the cache (see Cache.py)"""
+
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    try:
+        data = cache.get(movie_file)
+    except sqlite3.Error:
+        return None # The cache is not usable, the file will just be probed
+    except OSError:
+        return None # The file can't be read (e.g. it was removed) : ffprobe gives the error
+    return MediaInfo(movie_file, json.loads(data)) if data is not None else None
+
+
+def store_probe(movie_file, data):
+    """Stores the JSON output of ffprobe for a file in the cache, and returns the MediaInfo"""
+
+    cache = get_cache()
+    if cache is not None:
+        try:
+            cache.put(movie_file, data)
+        except (sqlite3.Error, OSError):
+            pass # The result is still returned, it is just not cached
+    return MediaInfo(movie_file, json.loads(data))
+
+
+def probe_file(movie_file, use_cache=True):
+    """Gets the format, streams and chapters of a video file with a single ffprobe call (source : https://ffmpeg.org/ffprobe.html#Main-options)
+    The result is kept in the on-disk cache (see Cache.py), so the same file is only probed once.
+
+    Args:
+        movie_file (str): The path to the video file
+        use_cache (bool, optional): Read and write the cache. Defaults to True.
+
+    Raises:
+        ProbeError: If ffprobe can't be run or fails (an OSError)
+
+    Returns:
+        info (MediaInfo): The format, streams and chapters of the file
+    """
+    with span("probe", file=movie_file, cached=False) as fields:
+        if use_cache:
+            info = cached_probe(movie_file)
+            if info is not None:
+                fields["cached"] = True
+                return info
+
+        command = PROBE_COMMAND + [movie_file]
+        try:
+            process = subprocess.run(command, capture_output=True, creationflags=CREATE_NO_WINDOW)
+        except OSError as e:
+            raise ProbeError(f"ffprobe can't be run : {e}", command=command)
+        if process.returncode != 0:
+            stderr = process.stderr.decode('utf-8', 'replace').strip()
+            raise ProbeError("ffprobe failed with the error : \n" + stderr, process.returncode, stderr, command)
+        data = process.stdout.decode('utf-8')
+        fields["bytes"] = len(data)
+
+    return store_probe(movie_file, data) if use_cache else MediaInfo(movie_file, json.loads(data))
+
+
+def get_output_file(movie_file, output='', movie_title=''):
+    """Builds the output file path the same way as the command line script
+
+    Args:
+        movie_file (str): The path to the video file
+        output (str, optional): Output file name, with or without extension. Defaults to ''.
+        movie_title (str, optional): Title of the movie, used if no output is given. Defaults to ''.
+
+    Returns:
+        output_file (str): The path to the output file, in the folder of the movie file
+    """
+    path = os.path.dirname(movie_file) # Path to the movie file folder
+    movie_extension = os.path.splitext(movie_file)[1] # Extension of the movie file
+
+    # If not specified, use the movie title
+    if output == '':
+        return os.path.join(path, movie_title + '_modified' + movie_extension)
+
+    # Don't add the extension twice
+    if os.path.splitext(output)[1].lower() == movie_extension.lower():
+        return os.path.join(path, output)
+    return os.path.join(path, output + movie_extension)
+
+
+def resolve_output_file(output_file, overwrite="ask"):
+    """Applies the overwrite policy when the output file already exists
+
+    Args:
+        output_file (str): The path to the output file
+        overwrite (str, optional): One of OVERWRITE_POLICIES. "ask" prompts the user in the terminal. Defaults to "ask".
+
+    Raises:
+        OutputExistsError: If the output file exists and must not be overwritten (a FileExistsError)
+
+    Returns:
+        output_file (str): The path to write to (can be renamed with the "rename" policy)
+    """
+    if overwrite not in OVERWRITE_POLICIES:
+        raise ValueError(f"Unknown overwrite policy : {overwrite}")
+
+    if not os.path.isfile(output_file):
+        return output_file
+
+    if overwrite == "ask":
+        print("The output file already exists. Do you want to overwrite it? (y/n)")
+        if input().lower() != 'y':
+            raise OutputExistsError("The output file already exists")
+    elif overwrite == "skip":
+        raise OutputExistsError("The output file already exists")
+    elif overwrite == "rename":
+        # Add a number to the name, like the graphical interface does
+        root, extension = os.path.splitext(output_file)
+        n = 1
+        while os.path.isfile(f"{root}({n}){extension}"):
+            n += 1
+        return f"{root}({n}){extension}"
+
+    return output_file # ffmpeg is run with -y and overwrites the file
+
+
+def iter_metadata(chapters, video_time_ms, movie_title='', author='', movie_year=''):
+    """Yields a FFMETADATA document piece by piece, so that it can be written to ffmpeg while the chapters are read
+    (source : http://underpop.online.fr/f/ffmpeg/help/metadata.htm.gz)
+
+    Args:
+        chapters (iterable): The chapters, as (start time in milliseconds, title), in order (e.g. from iter_chapters)
+        video_time_ms (int): The duration of the video in milliseconds
+        movie_title (str, optional): Title of the movie. Defaults to ''.
+        author (str, optional): Author of the movie. Defaults to ''.
+        movie_year (str, optional): Year of the movie. Defaults to ''.
+
+    Raises:
+        ChaptersError: If a chapter starts after the end of the video (a ValueError)
+
+    Yields:
+        metadata (str): The header, then one [CHAPTER] section at a time
+    """
+    header = ';FFMETADATA1\n'
+    header += 'title='+movie_title+'\n' if movie_title != '' else ''
+    header += 'date='+movie_year+'\n' if movie_year != '' else ''
+    header += 'artist='+author+'\n' if author != '' else ''
+    yield header + '\n'
+
+    def chapter(i, start_ms, end_ms, end_comment, title):
+        return ('[CHAPTER]\n'
+                'TIMEBASE=1/1000\n'
+                '# Chapter '+str(i)+' starts at '+ms_to_timecode(start_ms)+'\n'
+                'START='+str(start_ms)+'\n'
+                '# Chapter '+str(i)+' ends at '+ms_to_timecode(end_comment)+' (minus 1 millisecond)\n'
+                'END='+str(end_ms)+'\n'
+                'title='+title+'\n\n')
+
+    # Each chapter ends where the next one starts, so it is written when the next one is read
+    previous = None
+    i = 0
+    for start_ms, title in chapters:
+        if start_ms >= video_time_ms:
+            raise ChaptersError("The video is shorter than the last timecode. Please check the timecodes.")
+        if previous is not None:
+            yield chapter(i, previous[0], start_ms-1, start_ms, previous[1])
+        previous = (start_ms, title)
+        i += 1
+
+    # The last chapter ends at the end of the video
+    if previous is not None:
+        yield chapter(i, previous[0], video_time_ms, video_time_ms, previous[1])
+
+
+def build_metadata(times, titles, video_time_ms, movie_title='', author='', movie_year=''):
+    """Builds a FFMETADATA document with the title, author, year and chapters.
+    The document is kept in memory and given to ffmpeg through a pipe (see METADATA_INPUT), so no file is written.
+
+    Args:
+        times (list): The timecodes of the chapters, in the form HH:MM:SS (can be empty)
+        titles (list): The titles of the chapters
+        video_time_ms (int): The duration of the video in milliseconds
+        movie_title (str, optional): Title of the movie. Defaults to ''.
+        author (str, optional): Author of the movie. Defaults to ''.
+        movie_year (str, optional): Year of the movie. Defaults to ''.
+
+    Returns:
+        metadata (str): The content of the FFMETADATA document
+    """
+    chapters = zip([timecode_to_ms(t) for t in times], titles)
+    return "".join(iter_metadata(chapters, video_time_ms, movie_title, author, movie_year))
+
+
+def prepare_output(movie_file, output_file, overwrite="ask"):
+    """Checks the input and output files before a remux
+
+    Args:
+        movie_file (str): The path to the video file
+        output_file (str): The path to the output file
+        overwrite (str, optional): One of OVERWRITE_POLICIES. Defaults to "ask".
+
+    Raises:
+        InputError: If the movie file does not exist, or if the output file is the movie file (a ValueError)
+        OutputExistsError: If the output file exists and must not be overwritten (a FileExistsError)
+
+    Returns:
+        output_file (str): The path to write to
+    """
+    if not os.path.isfile(movie_file):
+        raise InputError(f"The movie file \"{movie_file}\" does not exist.")
+
+    # Checks if the output file is the same as the input file
+    if os.path.abspath(output_file) == os.path.abspath(movie_file):
+        raise InputError("The output file cannot be the same as the input file")
+
+    return resolve_output_file(output_file, overwrite)
+
+
+def open_chapters(timecodes_file):
+    """Reads the chapters of a file lazily (see iter_chapters), after checking that there is at least one
+
+    Raises:
+        ChaptersError: If the file has no chapters (a ValueError)
+
+    Returns:
+        chapters (iterator): The chapters, as (start time in milliseconds, title)
+    """
+    chapters = iter_chapters(timecodes_file)
+    first = next(chapters, None)
+    if first is None:
+        raise ChaptersError("No chapters found in "+timecodes_file)
+    return itertools.chain([first], chapters)
+
+
+def subtitle_codec(output_file, subtitle_file):
+    """Returns the codec of a subtitle track in the container of the output file :
+    srt for Matroska (ass for ASS/SSA files, to keep their styles), webvtt for WebM and mov_text for MP4
+    """
+    codec = SUBTITLE_CODECS.get(os.path.splitext(output_file)[1].lower(), "mov_text")
+    if codec == "srt" and os.path.splitext(subtitle_file)[1].lower() in [".ass", ".ssa"]:
+        return "ass"
+    return codec
+
+
+def subtitle_arguments(subtitles, output_file, first_input, existing_subtitles=0):
+    """Returns the ffmpeg arguments to add subtitle tracks to a video in the same pass as the remux (the video is read once)
+
+    Args:
+        subtitles (list): The (path, language) of each subtitle file, language being an ISO 639-2 code (or None if unknown)
+        output_file (str): The path to the output file (its container gives the codec of the tracks)
+        first_input (int): Index of the first subtitle file in the inputs of ffmpeg (after the video and the metadata)
+        existing_subtitles (int, optional): Number of subtitle streams already in the video, kept before the new ones. Defaults to 0.
+
+    Returns:
+        inputs (list): The inputs of the subtitle files, to put after the other inputs
+        outputs (list): The mapping, codec and language of the streams, to put after "-codec copy"
+    """
+    if len(subtitles) == 0:
+        return [], []
+
+    # All the streams of the video (without -map, ffmpeg only keeps one stream of each type), except the data streams (e.g. chapter tracks)
+    inputs = []
+    outputs = ['-map', '0', '-map', '-0:d?']
+    for i, (path, language) in enumerate(subtitles):
+        inputs += ['-i', path]
+        outputs += ['-map', f'{first_input + i}:s']
+
+    # Codec and language of each new subtitle stream (the streams of the video are copied)
+    for i, (path, language) in enumerate(subtitles):
+        stream = existing_subtitles + i
+        outputs += [f'-c:s:{stream}', subtitle_codec(output_file, path), f'-metadata:s:s:{stream}', f'language={language or "und"}']
+    return inputs, outputs
+
+
+def remux_command(movie_file, output_file, progress=False, subtitles=(), existing_subtitles=0, readrate=None):
+    """Returns the ffmpeg arguments to copy a video with the metadata read from stdin (source : https://ffmpeg.org/ffmpeg.html#Synopsis)
+    With progress, ffmpeg also writes its progress to stdout (see Progress.py), which must then be read.
+    The subtitle files are added as new tracks (see subtitle_arguments).
+    With readrate, the movie is read at most that many times faster than real time (see Governor.Limits.readrate).
+    """
+    subtitle_inputs, subtitle_outputs = subtitle_arguments(subtitles, output_file, 2, existing_subtitles)
+    readrate_arguments = ['-readrate', f"{readrate:.6g}"] if readrate is not None else []
+    return ['ffmpeg', '-y'] + readrate_arguments + ['-i', movie_file] + METADATA_INPUT + subtitle_inputs + ['-map_metadata', '1', '-codec', 'copy'] + \
+           subtitle_outputs + [output_file, '-v', 'error'] + (PROGRESS_ARGS if progress else [])
+
+
+def add_chapters(movie_file, timecodes_file, output_file, movie_title='', author='', movie_year='', overwrite="ask", progress_callback=None, subtitles=()):
+    """Adds the chapters of a timecodes file, and subtitle tracks, to a video file (probe, metadata and ffmpeg remux).
+    Same as Jobs.run_job, which also returns the duration of each stage and the error output of ffmpeg.
+
+    Args:
+        movie_file (str): The path to the video file
+        timecodes_file (str): The path to the file containing the timecodes and titles of the chapters
+        output_file (str): The path to the output file
+        movie_title (str, optional): Title of the movie. Defaults to ''.
+        author (str, optional): Author of the movie. Defaults to ''.
+        movie_year (str, optional): Year of the movie. Defaults to ''.
+        overwrite (str, optional): One of OVERWRITE_POLICIES. Defaults to "ask".
+        progress_callback (function, optional): Called with a Progress object (percent, MB/s, ETA) while ffmpeg runs. Defaults to None.
+        subtitles (list, optional): The subtitle files to add, as paths or (path, language). Defaults to ().
+
+    Raises:
+        ShearsError: See Jobs.run_job (the errors are also ValueError, FileExistsError or OSError)
+
+    Returns:
+        output_file (str): The path to the created file
+    """
+    from Jobs import ShearsJob, run_job # Jobs uses this module
+
+    job = ShearsJob(movie_file, timecodes_file, output_file, movie_title, author, movie_year, subtitles, overwrite)
+    return run_job(job, progress_callback).output
+
+
+# Lines of the error output of ffmpeg kept for the warnings and the errors (the last ones)
+STDERR_TAIL_LINES = 200
+
+
+def _drain_stderr(stream, tail):
+    """Reads the error output of a process until it ends, keeping its last lines (run in a thread,
+    so that ffmpeg never blocks on a full stderr pipe while stdin or stdout are used)"""
+    for line in stream:
+        tail.append(line)
+    stream.close()
+
+
+def remux(command, output_file, metadata, video_time_ms, progress_callback=None, limits=None):
+    """Runs an ffmpeg remux command (see remux_command), writing the metadata to its stdin and reading its progress
+
+    Args:
+        command (list): The ffmpeg arguments, reading the metadata from stdin
+        output_file (str): The path to the output file (removed if the metadata is invalid)
+        metadata (iterable): The chunks of the FFMETADATA document (e.g. iter_metadata), written while they are produced
+        video_time_ms (int): The duration of the video, for the progress
+        progress_callback (function, optional): Called with a Progress object while ffmpeg runs. Defaults to None.
+        limits (Limits, optional): Priority and CPUs of the ffmpeg process (see Governor.py). Defaults to None.
+
+    Raises:
+        ChaptersError: If a chapter is invalid (the partial output is removed)
+        FFmpegError: If ffmpeg can't be run or fails (an OSError)
+
+    Returns:
+        stderr (str): The error output of ffmpeg (warnings)
+    """
+    # The limits are set when ffmpeg starts (see Governor.Limits.spawn)
+    args, options = limits.spawn(command, CREATE_NO_WINDOW) if limits else (command, {"creationflags": CREATE_NO_WINDOW})
+    try:
+        process = subprocess.Popen(args,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE if progress_callback is not None else subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE,
+                                   **options)
+    except OSError as e:
+        raise FFmpegError(f"ffmpeg can't be run : {e}", command=command)
+    except subprocess.SubprocessError as e:
+        raise FFmpegError(f"The limits of ffmpeg can't be applied (e.g. a negative niceness without the rights) : {e}", command=command)
+
+    # The error output is read in the background, and only its end is kept
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    stderr_reader = threading.Thread(target=_drain_stderr, args=(process.stderr, stderr_tail), daemon=True)
+    stderr_reader.start()
+
+    try:
+        try:
+            for chunk in metadata:
+                process.stdin.write(chunk.encode('utf-8'))
+            process.stdin.close() # ffmpeg then reads the end of the metadata
+        except BrokenPipeError:
+            # ffmpeg stopped early, the error is read below
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        except (ValueError, OSError):
+            # Bad chapter (e.g. the video is shorter than the last timecode) : stop ffmpeg and remove the partial output
+            process.kill()
+            process.wait()
+            if os.path.isfile(output_file):
+                os.remove(output_file)
+            raise
+
+        # Reading the progress while ffmpeg runs
+        if progress_callback is not None:
+            progress = Progress(video_time_ms, progress_callback)
+            for line in process.stdout:
+                progress.feed(line)
+
+        process.wait()
+    finally:
+        # An error while ffmpeg runs (e.g. raised by progress_callback, or Ctrl+C) must not leave it running
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_reader.join()
 
+    stderr = b"".join(stderr_tail).decode('utf-8', 'replace').strip()
+    if process.returncode != 0:
+        raise FFmpegError("ffmpeg failed with the error : \n"+stderr, process.returncode, stderr, command)
+    return stderr
@@ -0,0 +1,233 @@
+##################################################################
+## Governor.py : Limits of the resources used by the ffmpeg     ##
+## processes : CPU and I/O priority, CPUs and read throughput.  ##
+##################################################################
+## The priority and the CPUs are set when the process starts,   ##
+## before ffmpeg runs (POSIX, ionice and affinity on Linux      ##
+## only, a priority class on Windows), and the reads are        ##
+## throttled by ffmpeg itself with -readrate (ffmpeg 5.0 or     ##
+## newer, a pipe would not work with MP4 files indexed at       ##
+## their end).                                                  ##
+##################################################################
+
+import os
+import re
+import sys
+import shutil
+import subprocess
+
+# I/O scheduling classes of Linux, from the highest priority to the lowest (source : man ionice)
+IONICE_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+# Windows priority classes of the niceness, from the lowest priority (niceness from which the class is used)
+WINDOWS_PRIORITIES = [(15, "IDLE_PRIORITY_CLASS"), (5, "BELOW_NORMAL_PRIORITY_CLASS"), (-4, None),
+                      (-14, "ABOVE_NORMAL_PRIORITY_CLASS"), (-20, "HIGH_PRIORITY_CLASS")]
+
+# Units of the read rates (bytes per second), as in the MB/s of the progress
+RATE_UNITS = {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}
+
+
+def parse_rate(text):
+    """Reads a throughput like "50M", "2.5MB/s" or "800k" (bytes per second)
+
+    Raises:
+        ValueError: If the text is not a positive throughput
+
+    Returns:
+        rate (float): The throughput in bytes per second
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?)\s*([kmg]?)(?:b(?:/s)?)?\s*", text.lower())
+    if match is None or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid read rate \"{text}\" (e.g. 50M for 50 MB/s)")
+    return float(match.group(1)) * RATE_UNITS[match.group(2)]
+
+
+def parse_cpus(text):
+    """Reads a list of CPUs like "0-3,6" (separated by "," or ";")
+
+    Raises:
+        ValueError: If the text is not a list of CPU numbers or ranges
+
+    Returns:
+        cpus (frozenset): The CPU numbers
+    """
+    cpus = set()
+    for part in re.split(r"[,;]", text):
+        match = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?", part)
+        if match is None:
+            raise ValueError(f"Invalid list of CPUs \"{text}\" (e.g. 0-3,6)")
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if last < first:
+            raise ValueError(f"Invalid range of CPUs \"{part.strip()}\"")
+        cpus.update(range(first, last + 1))
+    return frozenset(cpus)
+
+
+def parse_ionice(text):
+    """Reads an I/O class like "idle", "best-effort" or "best-effort:7" (level from 0, highest priority, to 7)
+
+    Raises:
+        ValueError: If the class or the level is invalid
+
+    Returns:
+        ionice (tuple): The class name and its level (None for the idle class or the default level)
+    """
+    name, _, level = text.strip().lower().partition(":")
+    if name not in IONICE_CLASSES:
+        raise ValueError(f"Invalid I/O class \"{text}\" (one of " + ", ".join(IONICE_CLASSES) + ")")
+    if level == "":
+        return (name, None)
+    if name == "idle" or not level.isdigit() or int(level) > 7:
+        raise ValueError(f"Invalid I/O level \"{text}\" (from 0 to 7, not for the idle class)")
+    return (name, int(level))
+
+
+def _priority_class(nice):
+    """Returns the Windows priority class of a niceness (0 for the normal class)"""
+    for lowest, name in WINDOWS_PRIORITIES:
+        if nice >= lowest:
+            return getattr(subprocess, name) if name is not None else 0
+    return 0
+
+
+class Limits():
+    """Limits of the ffmpeg process of a job. None means no limit.
+
+    Usage:
+        limits = Limits.from_strings(nice="10", ionice="idle", read_rate="50M")
+        command = remux_command(..., readrate=limits.readrate(size, duration_ms))
+        command, options = limits.spawn(command)
+        process = subprocess.Popen(command, **options, ...)
+    """
+
+    def __init__(self, nice=None, ionice=None, cpus=None, read_rate=None):
+        """
+        Args:
+            nice (int, optional): Niceness of the process, from -20 to 19 (higher is a lower priority). Defaults to None.
+            ionice (tuple, optional): I/O class and level, see parse_ionice. Defaults to None.
+            cpus (iterable, optional): The CPUs the process can run on. Defaults to None.
+            read_rate (float, optional): Maximum read throughput of the movie file, in bytes per second. Defaults to None.
+        """
+        self.nice = nice
+        self.ionice = ionice
+        self.cpus = frozenset(cpus) if cpus is not None else None
+        self.read_rate = read_rate
+
+    @classmethod
+    def from_strings(cls, nice='', ionice='', cpus='', read_rate=''):
+        """Reads the limits given as text (command line or manifest), empty strings meaning no limit
+
+        Raises:
+            ValueError: If a limit is invalid, or can't be applied on this system
+        """
+        if nice.strip() != '':
+            try:
+                nice = int(nice)
+            except ValueError:
+                raise ValueError(f"Invalid niceness \"{nice}\" (from -20 to 19)")
+            if not -20 <= nice <= 19:
+                raise ValueError(f"Invalid niceness \"{nice}\" (from -20 to 19)")
+        limits = cls(nice=nice if nice != '' else None,
+                     ionice=parse_ionice(ionice) if ionice.strip() != '' else None,
+                     cpus=parse_cpus(cpus) if cpus.strip() != '' else None,
+                     read_rate=parse_rate(read_rate) if read_rate.strip() != '' else None)
+        limits.check()
+        return limits
+
+    def __bool__(self):
+        return any(value is not None for value in [self.nice, self.ionice, self.cpus, self.read_rate])
+
+    def check(self):
+        """Checks that the limits can be applied on this system
+
+        Raises:
+            ValueError: If a limit is not supported (e.g. the CPUs on macOS or Windows)
+        """
+        if self.nice is not None and not hasattr(os, "setpriority") and sys.platform != "win32":
+            raise ValueError("The niceness of the processes can't be set on this system")
+        if self.cpus is not None:
+            if not hasattr(os, "sched_setaffinity"):
+                raise ValueError("The CPUs of the processes can't be chosen on this system")
+            available = os.sched_getaffinity(0)
+            if not self.cpus <= available:
+                raise ValueError("Unknown CPUs : " + ", ".join(str(cpu) for cpu in sorted(self.cpus - available)))
+        if self.ionice is not None and (not sys.platform.startswith("linux") or shutil.which("ionice") is None):
+            raise ValueError("The I/O class of the processes can only be set on Linux, with the ionice command")
+
+    def stricter(self, other):
+        """Combines two limits (e.g. of the command line and of a manifest line), keeping the strictest of each
+
+        Raises:
+            ValueError: If the two lists of CPUs have no CPU in common
+
+        Returns:
+            limits (Limits): The combined limits
+        """
+        def strictest(a, b, key=None):
+            # The highest value (None is no limit)
+            if a is None or b is None:
+                return b if a is None else a
+            return max(a, b, key=key)
+
+        cpus = self.cpus if other.cpus is None else other.cpus if self.cpus is None else self.cpus & other.cpus
+        if cpus is not None and len(cpus) == 0:
+            raise ValueError("The CPUs of the job and of the command line have no CPU in common")
+
+        # A class of lower priority is stricter, then a higher level in the same class
+        ionice_key = lambda ionice: (IONICE_CLASSES[ionice[0]], 4 if ionice[1] is None else ionice[1])
+        return Limits(nice=strictest(self.nice, other.nice),
+                      ionice=strictest(self.ionice, other.ionice, ionice_key),
+                      cpus=cpus,
+                      read_rate=strictest(self.read_rate, other.read_rate, key=lambda rate: -rate))
+
+    def readrate(self, size, duration_ms):
+        """Returns the -readrate of ffmpeg (speed compared to real time) reading the file at self.read_rate,
+        or None without a read limit (or if the bitrate of the file is unknown)
+
+        Args:
+            size (int): The size of the movie file, in bytes
+            duration_ms (int): The duration of the movie, in milliseconds
+        """
+        if self.read_rate is None or size <= 0 or duration_ms <= 0:
+            return None
+        bytes_per_s = size / (duration_ms / 1000) # Average bitrate of the file
+        return self.read_rate / bytes_per_s
+
+    def spawn(self, args, creationflags=0):
+        """Returns the command and the arguments of subprocess.Popen (or asyncio.create_subprocess_exec) starting
+        a process with the limits already set, so that it never runs unthrottled : the niceness and the CPUs are set
+        in the child process before ffmpeg is run (a priority class on Windows), the I/O class by the ionice command.
+        A limit that can't be applied (e.g. a negative niceness without the rights) makes Popen raise a
+        subprocess.SubprocessError, or ionice fail.
+
+        Args:
+            args (list): The command line
+            creationflags (int, optional): Flags of the process on Windows (e.g. CREATE_NO_WINDOW). Defaults to 0.
+
+        Returns:
+            args (list): The command line, run by ionice if needed
+            options (dict): The keyword arguments of Popen
+        """
+        options = {"creationflags": creationflags}
+        if sys.platform == "win32":
+            if self.nice is not None:
+                options["creationflags"] |= _priority_class(self.nice)
+        elif self.nice is not None or self.cpus is not None:
+            options["preexec_fn"] = self._limit_child
+
+        if self.ionice is not None:
+            name, level = self.ionice
+            args = ["ionice", "-c", str(IONICE_CLASSES[name])] + (["-n", str(level)] if level is not None else []) + list(args)
+        return list(args), options
+
+    def _limit_child(self):
+        """Sets the niceness and the CPUs of the child process, between fork and exec (POSIX)"""
+        if self.nice is not None:
+            os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+        if self.cpus is not None:
+            os.sched_setaffinity(0, self.cpus)
+
+    def __repr__(self):
+        limits = {"nice": self.nice, "ionice": self.ionice, "cpus": sorted(self.cpus) if self.cpus is not None else None, "read_rate": self.read_rate}
+        return "Limits(" + ", ".join(f"{key}={value!r}" for key, value in limits.items() if value is not None) + ")"
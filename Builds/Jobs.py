@@ -0,0 +1,247 @@
+##################################################################
+## Jobs.py : Python interface of Shears : a job (paths,         ##
+## metadata and chapters) is run in the current process and     ##
+## returns a result, errors are the exceptions of Errors.py.    ##
+##################################################################
+## Usage:                                                       ##
+##    from Jobs import ShearsJob, run_job                       ##
+##    result = run_job(ShearsJob("movie.mkv", "chapters.txt",   ##
+##                               title="Movie", year="2020"))   ##
+##    print(result.output, result.bytes, result.stages)         ##
+##################################################################
+
+import os
+import time
+import itertools
+from contextlib import contextmanager
+
+from Functions import get_output_file, prepare_output, open_chapters, probe_file, iter_metadata, remux_command, remux
+# The errors raised by run_job can be imported from here
+from Errors import ShearsError, InputError, ChaptersError, SubtitleError, OutputExistsError, FFmpegError, ProbeError
+from Trace import span, timed
+
+
+class ShearsJob():
+    """A video file to add chapters, metadata and subtitle tracks to"""
+
+    def __init__(self, movie, chapters=None, output='', title='', author='', year='', subtitles=(), overwrite="skip", limits=None):
+        """
+        Args:
+            movie (str): The path to the video file
+            chapters (str or iterable, optional): The path to a chapters file, or the chapters as (start time in ms, title).
+                                                  None for no chapters (only the metadata). Defaults to None.
+            output (str, optional): Output file name, same rules as the -o argument of Shears.py. Defaults to ''.
+            title (str, optional): Title of the movie. Defaults to ''.
+            author (str, optional): Author of the movie. Defaults to ''.
+            year (str, optional): Year of the movie. Defaults to ''.
+            subtitles (list, optional): The subtitle files to add, as paths (their language is detected)
+                                        or (path, language) with an ISO 639-2 code. Defaults to ().
+            overwrite (str, optional): One of Functions.OVERWRITE_POLICIES ("ask" prompts in the terminal). Defaults to "skip".
+            limits (Limits, optional): Priority, CPUs and read throughput of ffmpeg (see Governor.py). Defaults to None.
+        """
+        self.movie = movie
+        self.chapters = chapters
+        self.output = output
+        self.title = title
+        self.author = author
+        self.year = year
+        self.subtitles = list(subtitles)
+        self.overwrite = overwrite
+        self.limits = limits
+
+    def __repr__(self):
+        return f"ShearsJob({self.movie!r})"
+
+
+class JobResult():
+    """What a job did : the output file, the time spent in each stage and the error output of ffmpeg"""
+
+    __slots__ = ("job", "output", "bytes", "stages", "stderr", "subtitles", "duration_ms")
+
+    def __init__(self, job):
+        self.job = job
+        self.output = "" # The path to the created file
+        self.bytes = 0 # Size of the created file
+        self.stages = {} # Duration of each stage in seconds (probe, language_detection, metadata, remux)
+        self.stderr = "" # Warnings of ffmpeg
+        self.subtitles = [] # (path, language) of the subtitle tracks added
+        self.duration_ms = 0 # Duration of the video
+
+    @property
+    def time(self):
+        """Total time of the job in seconds (the metadata is written while ffmpeg runs, so it is part of the remux)"""
+        return sum(duration for stage, duration in self.stages.items() if stage != "metadata")
+
+    def __repr__(self):
+        return f"JobResult({self.output!r}, {self.bytes} bytes, {self.time:.2f} s)"
+
+
+@contextmanager
+def _stage(result, stage, trace=True, **fields):
+    """Measures a stage of a job in its result, and in the trace (see Trace.py) unless the stage writes its own span"""
+    start = time.perf_counter()
+    try:
+        if trace:
+            with span(stage, **fields) as trace_fields:
+                yield trace_fields
+        else:
+            yield fields
+    finally:
+        result.stages[stage] = result.stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _timed_chunks(result, stage, chunks):
+    """Yields the chunks of a streamed stage, adding the time spent producing them to the result"""
+    iterator = iter(chunks)
+    result.stages.setdefault(stage, 0.0)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            result.stages[stage] += time.perf_counter() - start
+        yield chunk
+
+
+def _read_chapters(path):
+    """Reads a chapters file when the chapters are first needed (while ffmpeg reads the metadata), so that a job
+    waiting for its turn doesn't keep the file open, and a job failing before never opens it"""
+    try:
+        chapters = open_chapters(path)
+    except OSError as e:
+        raise ChaptersError(f"The chapters file can't be read : {e}") from e
+    yield from chapters
+
+
+def _chapters(chapters):
+    """Returns the chapters of a job as an iterator of (start time in ms, title)"""
+    if chapters is None:
+        return iter(())
+    if isinstance(chapters, str):
+        if not os.path.isfile(chapters):
+            raise ChaptersError(f"The chapters file \"{chapters}\" does not exist.")
+        return _read_chapters(chapters)
+
+    # Chapters given in memory : checks that there is at least one
+    chapters = iter(chapters)
+    first = next(chapters, None)
+    if first is None:
+        raise ChaptersError("No chapters given")
+    return itertools.chain([first], chapters)
+
+
+def _subtitles(subtitles):
+    """Returns the subtitle tracks of a job as (path, language), detecting the missing languages (see Language.py)"""
+    tracks = [(track, None) if isinstance(track, str) else tuple(track) for track in subtitles]
+    unknown = [path for path, language in tracks if language is None]
+    if len(unknown) == 0:
+        return tracks
+
+    from Language import analyse_subtitles, subtitle_tracks # Loaded on first use (imports langdetect)
+    detected = dict(subtitle_tracks(unknown, analyse_subtitles(unknown)))
+    return [(path, language if language is not None else detected[path]) for path, language in tracks]
+
+
+def prepare_job(job):
+    """First stages of a job, before the probe : checks the files and detects the languages of the subtitles
+    (shared by run_job and the asyncio engine of Batch.py, which probes and remuxes with a Runner).
+    The chapters file is only opened when ffmpeg reads the metadata.
+
+    Raises:
+        InputError: If the movie file doesn't exist, or is the output file
+        OutputExistsError: If the output file exists and must not be overwritten
+        ChaptersError: If the chapters file doesn't exist, or no chapters are given
+        SubtitleError: If a subtitle file is invalid
+
+    Returns:
+        result (JobResult): The result of the job, with its output file and subtitle tracks
+        chapters (iterator): The chapters, as (start time in ms, title), read while ffmpeg runs
+            (an empty or unreadable chapters file raises a ChaptersError in the remux stage)
+    """
+    result = JobResult(job)
+
+    output_file = get_output_file(job.movie, job.output, job.title)
+    result.output = prepare_output(job.movie, output_file, job.overwrite)
+    chapters = _chapters(job.chapters)
+
+    # All the subtitle files are checked and their languages detected at the same time
+    with _stage(result, "language_detection", files=len(job.subtitles)):
+        try:
+            result.subtitles = _subtitles(job.subtitles)
+        except ValueError as e:
+            raise SubtitleError(str(e)) from e
+
+    return result, chapters
+
+
+def remux_input(result, chapters, info, progress=False):
+    """Returns the ffmpeg command of a prepared job (see prepare_job) and its metadata
+
+    Args:
+        result (JobResult): The result of prepare_job
+        chapters (iterator): The chapters of prepare_job
+        info (MediaInfo): The probe of the movie file
+        progress (bool, optional): ffmpeg writes its progress to stdout (see Progress.py). Defaults to False.
+
+    Returns:
+        command (list): The ffmpeg arguments, reading the metadata from stdin
+        metadata (iterator): The chunks of the FFMETADATA document, produced while they are written to ffmpeg
+    """
+    job = result.job
+    result.duration_ms = info.duration_ms
+
+    # The metadata is written to ffmpeg's stdin while the chapters are read
+    metadata = iter_metadata(chapters, info.duration_ms, job.title, job.author, job.year)
+    metadata = timed("metadata", _timed_chunks(result, "metadata", metadata))
+    readrate = job.limits.readrate(os.path.getsize(job.movie), info.duration_ms) if job.limits else None
+    command = remux_command(job.movie, result.output, progress, result.subtitles, len(info.subtitle_streams), readrate)
+    return command, metadata
+
+
+@contextmanager
+def remux_stage(result):
+    """Measures the remux of a job (ffmpeg is run in the block) and reads the size of the output file.
+    A chapter that can't be read or decoded raises a ChaptersError, and the partial output is removed."""
+    with _stage(result, "remux", file=result.output, subtitles=len(result.subtitles)) as fields:
+        try:
+            yield fields
+        except (ValueError, UnicodeError) as e:
+            if os.path.isfile(result.output):
+                os.remove(result.output)
+            if isinstance(e, ChaptersError):
+                raise
+            raise ChaptersError(str(e)) from e # The chapters file can't be decoded
+        result.bytes = fields["bytes"] = os.path.getsize(result.output)
+
+
+def run_job(job, progress_callback=None):
+    """Runs a job in this process : probe, language detection of the subtitles, metadata and ffmpeg remux.
+    Nothing is printed and the process is not exited, so that many jobs can be run by the same worker.
+
+    Args:
+        job (ShearsJob): The job to run
+        progress_callback (function, optional): Called with a Progress object (percent, MB/s, ETA) while ffmpeg runs. Defaults to None.
+
+    Raises:
+        InputError: If the movie file doesn't exist, or is the output file
+        OutputExistsError: If the output file exists and must not be overwritten
+        ChaptersError: If the chapters are missing or invalid (e.g. longer than the video)
+        SubtitleError: If a subtitle file is invalid
+        ProbeError: If ffprobe fails
+        FFmpegError: If ffmpeg fails (with its exit code and error output), or its limits can't be applied
+
+    Returns:
+        result (JobResult): The output file, its size, the duration of each stage and the warnings of ffmpeg
+    """
+    result, chapters = prepare_job(job)
+
+    with _stage(result, "probe", trace=False):
+        info = probe_file(job.movie) # Writes its own span
+
+    command, metadata = remux_input(result, chapters, info, progress_callback is not None)
+    with remux_stage(result):
+        result.stderr = remux(command, result.output, metadata, info.duration_ms, progress_callback, job.limits)
+
+    return result
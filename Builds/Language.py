@@ -0,0 +1,415 @@
+##################################################################
+## Language.py : Detects the language of a subtitle file,       ##
+## reading it line by line and only analysing a sample of it.   ##
+##################################################################
+## Requirements: 	langdetect, pycountry                       ##
+##################################################################
+
+import os
+import re # Regular expressions
+import atexit
+import threading
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+from Cache import file_identity
+from Errors import SubtitleError
+
+# Lines which are not text : cue numbers, timings (SRT/VTT "00:00:01,000 --> ...", SBV "0:00:01.000,0:00:04.000") and headers
+_CUE_NUMBER = re.compile(r"^\d+$")
+_TIMING = re.compile(r"^(?:\d+:)?\d+:\d+(?:[.,]\d+)?\s*(?:-->|,\s*(?:\d+:)?\d+:\d+)")
+_HEADER = re.compile(r"^(?:WEBVTT|NOTE|STYLE|REGION)\b")
+
+# Dialogue line of an ASS/SSA file (the text is the 10th field) : "Dialogue: 0,0:00:01.00,0:00:04.00,Default,,0,0,0,,Text"
+_ASS_DIALOGUE = re.compile(r"^Dialogue:\s*(?:[^,]*,){9}(.*)$")
+
+# Formatting tags (<i>, </font>, {\an8}...)
+_TAGS = re.compile(r"<[^>]*>|\{[^}]*\}")
+
+MAX_CUES = 200 # Maximum number of cues analysed
+MAX_CHECKED_LINES = 100 # A subtitle file must have a timing in its first lines
+BATCH = 25 # The detection is run every BATCH cues, and stops when it is confident enough
+THRESHOLD = 0.95 # Probability of the most likely language to stop early
+IN_PROCESS_FILES = 2 # Up to this number of files to analyse, they are analysed in this process (faster than a worker)
+CACHE_SIZE = 1024 # Number of detected languages kept in memory
+
+
+def iter_cues(lines):
+    """Yields the text of each cue of a subtitle file (SRT, VTT, SBV or ASS), without the numbers, timings and tags
+
+    Args:
+        lines (iterable): The lines of the file (e.g. an open file)
+    """
+    text = []
+    ass = False
+    for line in lines:
+        line = line.strip()
+
+        # ASS/SSA : only the text of the dialogue lines ("\N" is a line break)
+        if line == "[Script Info]":
+            ass = True
+        if ass:
+            match = _ASS_DIALOGUE.match(line)
+            if match:
+                cue = _TAGS.sub("", match.group(1).replace("\\N", " ").replace("\\n", " ")).strip()
+                if cue != "":
+                    yield cue
+            continue
+
+        # An empty line ends the cue
+        if line == "":
+            if len(text) != 0:
+                yield " ".join(text)
+                text = []
+            continue
+
+        if _CUE_NUMBER.match(line) or _TIMING.match(line) or _HEADER.match(line):
+            continue
+
+        line = _TAGS.sub("", line).strip()
+        if line != "":
+            text.append(line)
+
+    if len(text) != 0:
+        yield " ".join(text)
+
+
+def detect_text_language(cues, threshold=THRESHOLD, max_cues=MAX_CUES):
+    """Detects the language of a sequence of cues, analysing them by batches until the detection is confident enough
+
+    Args:
+        cues (iterable): The texts of the cues (e.g. from iter_cues), read lazily
+        threshold (float, optional): Probability of the most likely language to stop early. Defaults to THRESHOLD.
+        max_cues (int, optional): Maximum number of cues analysed. Defaults to MAX_CUES.
+
+    Returns:
+        language (str): The ISO 639-1 code given by langdetect (e.g. "en", "zh-cn"), or None if there is no text
+    """
+    # Loaded on first use (slow to import)
+    from langdetect import DetectorFactory, detect_langs
+    from langdetect.lang_detect_exception import LangDetectException
+
+    DetectorFactory.seed = 0 # Same result on every run
+
+    sample = []
+    best = None
+    for i, cue in enumerate(cues, start=1):
+        sample.append(cue)
+        if i % BATCH != 0 and i < max_cues:
+            continue
+
+        try:
+            best = detect_langs("\n".join(sample))[0]
+        except LangDetectException: # No letters in the sample yet
+            best = None
+        if (best is not None and best.prob >= threshold) or i >= max_cues:
+            break
+    else:
+        # End of the file before a decision : the whole sample is used
+        if len(sample) % BATCH != 0:
+            try:
+                best = detect_langs("\n".join(sample))[0]
+            except LangDetectException:
+                best = None
+
+    return best.lang if best is not None else None
+
+
+# Languages detected in this process, by file identity and settings : (path, size, mtime_ns, threshold, max_cues) -> language.
+# The results of the worker processes are added by LanguageDetector, so that a file is only analysed once.
+_languages = collections.OrderedDict()
+_languages_lock = threading.Lock()
+
+
+def _cached_language(key):
+    """Returns the language of a file from the cache, or None"""
+    with _languages_lock:
+        language = _languages.get(key)
+        if language is not None:
+            _languages.move_to_end(key)
+        return language
+
+
+def _store_language(key, language):
+    """Keeps the language of a file, evicting the least recently used ones"""
+    with _languages_lock:
+        _languages[key] = language
+        _languages.move_to_end(key)
+        while len(_languages) > CACHE_SIZE:
+            _languages.popitem(last=False)
+
+
+def _cache_key(path, threshold, max_cues):
+    """Returns the key of a file in the cache (a modified file is analysed again), or None if it can't be read"""
+    try:
+        return file_identity(path) + (threshold, max_cues)
+    except OSError:
+        return None
+
+
+def _detect_file(path, threshold, max_cues):
+    """Detection of a file, without the cache"""
+    from pycountry import languages
+
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        language = detect_text_language(iter_cues(f), threshold, max_cues)
+
+    if language is None:
+        return "und" # Undetermined (ISO 639-2)
+
+    # langdetect gives ISO 639-1 codes, with a region for Chinese ("zh-cn")
+    country = languages.get(alpha_2=language.split("-")[0])
+    return country.alpha_3 if country is not None else "und"
+
+
+def detect_language(path, threshold=THRESHOLD, max_cues=MAX_CUES, use_cache=True):
+    """Detects the language of a subtitle file, only reading the first cues until the detection is confident enough.
+    The result is kept in memory for each file (path, size and modification time).
+
+    Args:
+        path (str): The path to the subtitle file (SRT, VTT or SBV)
+        threshold (float, optional): Probability of the most likely language to stop early. Defaults to THRESHOLD.
+        max_cues (int, optional): Maximum number of cues analysed. Defaults to MAX_CUES.
+        use_cache (bool, optional): Use the result of a previous detection of the same file. Defaults to True.
+
+    Returns:
+        language (str): The ISO 639-2 code of the language (e.g. "eng"), "und" if unknown, or None if the file doesn't exist
+    """
+    key = _cache_key(path, threshold, max_cues)
+    if key is None:
+        return None
+
+    language = _cached_language(key) if use_cache else None
+    if language is None:
+        language = _detect_file(path, threshold, max_cues)
+        _store_language(key, language)
+    return language
+
+
+def check_subtitle(path, max_lines=MAX_CHECKED_LINES):
+    """Checks that a file is a subtitle file ffmpeg can read, only reading its first lines
+
+    Args:
+        path (str): The path to the subtitle file
+        max_lines (int, optional): Number of lines read to find a timing. Defaults to MAX_CHECKED_LINES.
+
+    Raises:
+        ValueError: If the file doesn't exist, or has no timing (SRT, VTT, SBV or ASS) in its first lines
+    """
+    if not os.path.isfile(path):
+        raise ValueError(f"The subtitle file \"{os.path.basename(path)}\" does not exist.")
+
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for i, line in enumerate(f):
+            if i >= max_lines:
+                break
+            line = line.strip()
+            if _TIMING.match(line) or _ASS_DIALOGUE.match(line):
+                return
+    raise ValueError(f"The file \"{os.path.basename(path)}\" is not a subtitle file (no timings found).")
+
+
+def analyse_subtitle(path, threshold=THRESHOLD, max_cues=MAX_CUES):
+    """Checks a subtitle file and detects its language
+
+    Returns:
+        language (str): The ISO 639-2 code of the language ("und" if unknown), None if the file is invalid
+        error (str): Why the file is invalid, "" if it is valid
+    """
+    try:
+        check_subtitle(path)
+        return detect_language(path, threshold, max_cues), ""
+    except (OSError, ValueError) as e:
+        return None, str(e)
+
+
+#%% Many files at once
+
+def load_profiles():
+    """Loads the language profiles of langdetect and the languages of pycountry (about a second),
+    done once per worker process instead of on the first detection of each file"""
+    from langdetect.detector_factory import init_factory
+    from pycountry import languages
+    init_factory()
+    languages.get(alpha_2="en")
+
+
+def _detect_batch(paths, threshold, max_cues):
+    """Detects the languages of a batch of files in a worker process (None for the files that can't be read)"""
+    languages = []
+    for path in paths:
+        try:
+            languages.append(detect_language(path, threshold, max_cues))
+        except OSError:
+            languages.append(None)
+    return languages
+
+
+def _analyse_batch(paths, threshold, max_cues):
+    """Checks a batch of subtitle files and detects their languages in a worker process (see analyse_subtitle)"""
+    return [analyse_subtitle(path, threshold, max_cues) for path in paths]
+
+
+class LanguageDetector():
+    """Detects the languages of many subtitle files in a pool of processes, which load the langdetect profiles once.
+    The files already analysed (see detect_language) are not sent to the workers, and the results of the workers
+    are kept in the cache of this process.
+
+    Usage:
+        with LanguageDetector(workers=4) as detector:
+            languages = detector.detect(paths) # {path: "eng", ...}
+    """
+
+    def __init__(self, workers=None, threshold=THRESHOLD, max_cues=MAX_CUES, batch_size=8):
+        """
+        Args:
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            threshold (float, optional): Probability of the most likely language to stop early. Defaults to THRESHOLD.
+            max_cues (int, optional): Maximum number of cues analysed per file. Defaults to MAX_CUES.
+            batch_size (int, optional): Number of files sent to a worker at once. Defaults to 8.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self.max_cues = max_cues
+        self.batch_size = batch_size
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=load_profiles)
+
+    def submit(self, paths, function=_detect_batch):
+        """Sends a batch of files to a worker
+
+        Returns:
+            future (concurrent.futures.Future): The list of ISO 639-2 codes, in the order of the paths
+                                                (of (language, error) tuples with function=_analyse_batch)
+        """
+        return self.executor.submit(function, list(paths), self.threshold, self.max_cues)
+
+    def _map(self, paths, function, in_process):
+        """Runs a batch function on all the files, in parallel, and returns its result for each file.
+        The files whose language is cached are handled in this process by in_process (a function of one path)."""
+        paths = list(dict.fromkeys(paths)) # Each file once
+
+        results = {}
+        keys = {}
+        for path in paths:
+            key = _cache_key(path, self.threshold, self.max_cues)
+            if key is not None and _cached_language(key) is not None:
+                results[path] = in_process(path)
+            else:
+                keys[path] = key
+        paths = list(keys)
+
+        # Batches small enough for every worker to have several of them
+        size = max(1, min(self.batch_size, len(paths) // (self.workers * 2)))
+        futures = [(paths[i:i+size], self.submit(paths[i:i+size], function)) for i in range(0, len(paths), size)]
+
+        for batch, future in futures:
+            for path, result in zip(batch, future.result()):
+                results[path] = result
+                language = result[0] if isinstance(result, tuple) else result
+                if language is not None and keys[path] is not None:
+                    _store_language(keys[path], language)
+        return results
+
+    def detect(self, paths):
+        """Detects the languages of the files, in parallel
+
+        Args:
+            paths (iterable): The paths to the subtitle files
+
+        Returns:
+            languages (dict): The ISO 639-2 code of each file ("und" if unknown, None if it can't be read)
+        """
+        return self._map(paths, _detect_batch, lambda path: detect_language(path, self.threshold, self.max_cues))
+
+    def analyse(self, paths):
+        """Checks the files and detects their languages, in parallel
+
+        Args:
+            paths (iterable): The paths to the subtitle files
+
+        Returns:
+            analysis (dict): The (language, error) of each file, see analyse_subtitle
+        """
+        return self._map(paths, _analyse_batch, lambda path: analyse_subtitle(path, self.threshold, self.max_cues))
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# One detector per process, started on first use and kept until the process exits (its workers keep the profiles loaded)
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector(workers=None):
+    """Returns the LanguageDetector of the process (workers is only used when it is started)"""
+
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = LanguageDetector(workers)
+            atexit.register(_detector.close)
+    return _detector
+
+
+def detect_languages(paths, workers=None):
+    """Detects the languages of many subtitle files in parallel, see LanguageDetector.detect.
+    A few files are analysed in this process, which is faster than using the workers."""
+    paths = list(dict.fromkeys(paths))
+    if len(paths) <= IN_PROCESS_FILES:
+        return {path: detect_language(path) for path in paths}
+    return get_detector(workers).detect(paths)
+
+
+def analyse_subtitles(paths, workers=None):
+    """Checks many subtitle files and detects their languages at the same time (see LanguageDetector.analyse).
+    A few files are analysed in this process, which is faster than using the workers.
+
+    Returns:
+        analysis (dict): The (language, error) of each file, see analyse_subtitle
+    """
+    paths = list(dict.fromkeys(paths))
+    if len(paths) <= IN_PROCESS_FILES:
+        return {path: analyse_subtitle(path) for path in paths}
+    return get_detector(workers).analyse(paths)
+
+
+def subtitle_tracks(paths, analysis):
+    """Returns the subtitle tracks to add to a video, from the analysis of their files
+
+    Args:
+        paths (list): The paths to the subtitle files, in the order of the tracks
+        analysis (dict): The (language, error) of each file, see analyse_subtitles
+
+    Raises:
+        SubtitleError: If a file is invalid, with the errors of all the invalid files (a ValueError)
+
+    Returns:
+        tracks (list): The (path, language) of each track
+    """
+    errors = [analysis[path][1] for path in paths if analysis[path][1] != ""]
+    if len(errors) != 0:
+        raise SubtitleError("\n".join(errors))
+    return [(path, analysis[path][0]) for path in paths]
+
+
+def detect_subtitles(paths, workers=None):
+    """Checks the subtitle files of a video and detects their languages concurrently, see subtitle_tracks"""
+    return subtitle_tracks(paths, analyse_subtitles(paths, workers))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Detects the language (ISO 639-2) of subtitle files.')
+    parser.add_argument('files', type=str, nargs='+', help='The subtitle files')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of worker processes (default : number of CPUs)', default=None)
+    args = parser.parse_args()
+
+    for path, language in detect_languages(args.files, args.jobs).items():
+        print(f"{language or '-':<4} {path}")
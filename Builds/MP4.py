@@ -0,0 +1,322 @@
+##################################################################
+## MP4.py : Writes the chapters and the title, author and year  ##
+## of an MP4 file in place, without remuxing the whole file.    ##
+##################################################################
+## Only the moov box (the index of the file) is rebuilt, with   ##
+## the chapters in a Nero chpl box. The new moov is written     ##
+## over the old one if there is enough free space, or appended  ##
+## at the end of the file. The media data (mdat) never moves.   ##
+## (source : ISO/IEC 14496-12 and 14496-14)                     ##
+##################################################################
+
+import os
+import struct
+
+from Errors import ChaptersError
+
+MP4_EXTENSIONS = [".mp4", ".m4v", ".m4a", ".mov"]
+
+# Boxes which only contain other boxes
+CONTAINERS = [b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"edts", b"dinf", b"tref", b"ilst"]
+
+# Metadata items of the ilst box (the © character is 0xA9)
+TITLE = b"\xa9nam"
+ARTIST = b"\xa9ART"
+DATE = b"\xa9day"
+
+MAX_CHAPTERS = 255 # The number of chapters of a chpl box is written on one byte
+
+
+class Box():
+    """A box of the MP4 file : a type and its data, or its children for the containers"""
+
+    def __init__(self, type, data=b"", children=None, prefix=b""):
+        self.type = type # 4 bytes
+        self.data = data # Content of the box (if it is not a container)
+        self.children = children # List of boxes (if it is a container)
+        self.prefix = prefix # Bytes before the children (the version and flags of a meta box)
+
+    def find(self, type):
+        """Returns the first child of the given type, or None"""
+        for child in self.children or []:
+            if child.type == type:
+                return child
+        return None
+
+    def find_all(self, type):
+        return [child for child in self.children or [] if child.type == type]
+
+    def to_bytes(self):
+        content = self.data if self.children is None else self.prefix + b"".join(child.to_bytes() for child in self.children)
+        if len(content) + 8 > 0xFFFFFFFF:
+            return struct.pack(">I4sQ", 1, self.type, len(content) + 16) + content
+        return struct.pack(">I4s", len(content) + 8, self.type) + content
+
+    def __repr__(self):
+        return f"Box({self.type!r}, {len(self.children) if self.children is not None else len(self.data)})"
+
+
+def _box_headers(f, start, end):
+    """Reads the headers of the boxes between two positions of a file
+
+    Returns:
+        boxes (list): The boxes as (type, offset, header size, total size)
+    """
+    boxes = []
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1: # 64 bits size
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0: # The box goes until the end of the file
+            size = end - offset
+        if size < header_size:
+            raise ValueError(f"Invalid size of the box {type!r} at {offset}")
+        boxes.append((type, offset, header_size, size))
+        offset += size
+    return boxes
+
+
+def parse_boxes(data):
+    """Parses boxes in memory (the content of a container), recursively for the containers
+
+    Returns:
+        boxes (list): The list of Box objects
+    """
+    boxes = []
+    offset = 0
+    while offset + 8 <= len(data):
+        size, type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            raise ValueError(f"Invalid size of the box {type!r}")
+        content = data[offset + header_size:offset + size]
+
+        if type in CONTAINERS:
+            boxes.append(Box(type, children=parse_boxes(content)))
+        elif type == b"meta":
+            # The meta box of MP4 files has a version and flags, the one of QuickTime files doesn't
+            prefix = b"" if content[4:8] == b"hdlr" else content[:4]
+            boxes.append(Box(type, children=parse_boxes(content[len(prefix):]), prefix=prefix))
+        else:
+            boxes.append(Box(type, data=content))
+        offset += size
+    return boxes
+
+
+#%% Building the new boxes
+
+def _chpl(chapters):
+    """Builds a Nero chapter box (chpl), read by ffmpeg, VLC, mpv and most players
+
+    Args:
+        chapters (list): The chapters, as (start time in milliseconds, title)
+    """
+    if len(chapters) > MAX_CHAPTERS:
+        raise ValueError(f"An MP4 file can't have more than {MAX_CHAPTERS} chapters in place, remux the file instead")
+
+    data = struct.pack(">B3xIB", 1, 0, len(chapters)) # Version 1, no flags, reserved, number of chapters
+    for start_ms, title in chapters:
+        title = title.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8") # Without a cut character
+        data += struct.pack(">QB", start_ms * 10000, len(title)) + title # Start time in units of 100 ns
+    return Box(b"chpl", data=data)
+
+
+def _metadata_item(type, value):
+    """Builds an item of the ilst box, with a UTF-8 value"""
+    return Box(type, children=[Box(b"data", data=struct.pack(">II", 1, 0) + value.encode("utf-8"))]) # Type 1 is UTF-8
+
+
+def _metadata(udta, title='', author='', year=''):
+    """Writes the title, author and year in the meta/ilst box of the udta box (the other items are kept)"""
+
+    items = [(type, value) for type, value in [(TITLE, title), (ARTIST, author), (DATE, year)] if value != '']
+    if len(items) == 0:
+        return
+
+    meta = udta.find(b"meta")
+    if meta is None:
+        # Handler of iTunes metadata : version and flags, pre-defined, handler type, reserved, empty name
+        hdlr = Box(b"hdlr", data=struct.pack(">II4s4s8xB", 0, 0, b"mdir", b"appl", 0))
+        meta = Box(b"meta", children=[hdlr], prefix=bytes(4))
+        udta.children.append(meta)
+
+    ilst = meta.find(b"ilst")
+    if ilst is None:
+        ilst = Box(b"ilst", children=[])
+        meta.children.append(ilst)
+
+    for type, value in items:
+        ilst.children = [item for item in ilst.children if item.type != type] + [_metadata_item(type, value)]
+
+
+def _duration_ms(moov):
+    """Returns the duration of the movie in milliseconds, read in the mvhd box, or None if it is unknown"""
+    mvhd = moov.find(b"mvhd")
+    if mvhd is None:
+        return None
+    if mvhd.data[0] == 1: # Version 1 : 64 bits times and duration
+        timescale, duration = struct.unpack_from(">IQ", mvhd.data, 20)
+        unknown = 0xFFFFFFFFFFFFFFFF
+    else:
+        timescale, duration = struct.unpack_from(">II", mvhd.data, 12)
+        unknown = 0xFFFFFFFF
+    if timescale == 0 or duration == unknown:
+        return None
+    return duration * 1000 // timescale
+
+
+def _track_id(trak):
+    """Returns the ID of a track, read in its tkhd box"""
+    tkhd = trak.find(b"tkhd")
+    return struct.unpack_from(">I", tkhd.data, 20 if tkhd.data[0] == 1 else 12)[0]
+
+
+def _remove_chapter_tracks(moov):
+    """Removes the QuickTime chapter tracks (text tracks referenced by a tref/chap box), replaced by the chpl box.
+    Their samples stay in the media data but are not used anymore."""
+
+    chapter_ids = set()
+    for trak in moov.find_all(b"trak"):
+        tref = trak.find(b"tref")
+        if tref is None:
+            continue
+        for chap in tref.find_all(b"chap"):
+            chapter_ids.update(struct.unpack(f">{len(chap.data) // 4}I", chap.data))
+        tref.children = [child for child in tref.children if child.type != b"chap"]
+        if len(tref.children) == 0:
+            trak.children.remove(tref)
+
+    moov.children = [child for child in moov.children if child.type != b"trak" or _track_id(child) not in chapter_ids]
+
+
+def build_moov(moov_data, chapters, title='', author='', year=''):
+    """Rebuilds a moov box with new chapters (and title, author and year if given)
+
+    Args:
+        moov_data (bytes): The content of the old moov box (without its header)
+        chapters (iterable): The chapters, as (start time in milliseconds, title), e.g. from Functions.iter_chapters
+        title (str, optional): Title of the movie. Defaults to '' (unchanged).
+        author (str, optional): Author of the movie. Defaults to '' (unchanged).
+        year (str, optional): Year of the movie. Defaults to '' (unchanged).
+
+    Raises:
+        ChaptersError: If a chapter starts after the end of the video (a ValueError)
+        ValueError: If there are too many chapters
+
+    Returns:
+        moov (bytes): The new moov box
+    """
+    moov = Box(b"moov", children=parse_boxes(moov_data))
+
+    chapters = sorted(chapters)
+    duration_ms = _duration_ms(moov)
+    if duration_ms is not None and len(chapters) != 0 and chapters[-1][0] >= duration_ms:
+        raise ChaptersError("The video is shorter than the last timecode. Please check the timecodes.")
+
+    _remove_chapter_tracks(moov)
+
+    udta = moov.find(b"udta")
+    if udta is None:
+        udta = Box(b"udta", children=[])
+        moov.children.append(udta)
+
+    # The old chapters are replaced
+    udta.children = [child for child in udta.children if child.type != b"chpl"]
+    udta.children.insert(0, _chpl(chapters))
+    _metadata(udta, title, author, year)
+
+    return moov.to_bytes()
+
+
+def _free(size):
+    """Returns a free box (padding) of exactly `size` bytes (at least 8)"""
+    return struct.pack(">I4s", size, b"free") + bytes(size - 8)
+
+
+def write_chapters(path, chapters, title='', author='', year=''):
+    """Writes the chapters (and title, author and year if given) of an MP4 file in place.
+
+    Only the moov box is rebuilt. It is written over the old one if it is at the end of the file or if it fits
+    in the old one and the free boxes after it, otherwise it is appended at the end of the file and the old one
+    becomes a free box. The media data is never moved, so the chunk offsets (stco, co64) stay valid.
+
+    Args:
+        path (str): The path to the MP4 file, modified in place
+        chapters (iterable): The chapters, as (start time in milliseconds, title), e.g. from Functions.iter_chapters
+        title (str, optional): Title of the movie. Defaults to '' (unchanged).
+        author (str, optional): Author of the movie. Defaults to '' (unchanged).
+        year (str, optional): Year of the movie. Defaults to '' (unchanged).
+
+    Raises:
+        ChaptersError: If a chapter starts after the end of the video (a ValueError), the file is not modified
+        ValueError: If the file is not an MP4 file, or has too many chapters (the file must then be remuxed with ffmpeg)
+
+    Returns:
+        written (int): The number of bytes written
+    """
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+
+        boxes = _box_headers(f, 0, file_size)
+        if len(boxes) == 0 or boxes[0][0] not in [b"ftyp", b"free", b"skip", b"wide", b"moov", b"mdat"]:
+            raise ValueError("The file is not an MP4 file")
+
+        index = [i for i, box in enumerate(boxes) if box[0] == b"moov"]
+        if len(index) == 0:
+            raise ValueError("The MP4 file has no moov box")
+        index = index[0]
+        _, moov_offset, header_size, moov_size = boxes[index]
+
+        f.seek(moov_offset + header_size)
+        new_moov = build_moov(f.read(moov_size - header_size), chapters, title, author, year)
+
+        # Free space : the old moov and the free boxes after it
+        space = moov_size
+        for type, _, _, size in boxes[index+1:]:
+            if type not in [b"free", b"skip"]:
+                break
+            space += size
+        at_end = moov_offset + space == file_size
+
+        if at_end or len(new_moov) == space or len(new_moov) + 8 <= space:
+            # In place
+            f.seek(moov_offset)
+            f.write(new_moov)
+            if at_end:
+                f.truncate()
+            elif len(new_moov) != space:
+                f.write(_free(space - len(new_moov)))
+            return len(new_moov)
+
+        # At the end of the file. The last box must have an explicit size (a size of 0 means "until the end of the file")
+        written = 0
+        type, offset, header_size, size = boxes[-1]
+        f.seek(offset)
+        if struct.unpack(">I", f.read(4))[0] == 0:
+            if size > 0xFFFFFFFF:
+                raise ValueError("The last box of the MP4 file has no size, remux the file instead")
+            f.seek(offset)
+            f.write(struct.pack(">I", size))
+            written += 4
+
+        f.seek(file_size)
+        f.write(new_moov)
+        written += len(new_moov)
+
+        # The old moov becomes a free box (after the new one is written, so that the file always has a moov)
+        f.flush()
+        f.seek(moov_offset + 4)
+        f.write(b"free")
+        written += 4
+
+    return written
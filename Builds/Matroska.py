@@ -0,0 +1,485 @@
+##################################################################
+## Matroska.py : Writes the chapters of a Matroska file (.mkv)  ##
+## in place, without remuxing the whole file with ffmpeg.       ##
+##################################################################
+## The Chapters element is written over the old one or in a     ##
+## Void element (padding), or appended at the end of the file,  ##
+## and the SeekHead is updated. Only a few kilobytes are        ##
+## written, whatever the size of the file.                      ##
+## (source : https://www.matroska.org/technical/elements.html)  ##
+##################################################################
+
+import os
+import random
+import struct
+
+# EBML and Matroska element IDs
+EBML = 0x1A45DFA3
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMESTAMP_SCALE = 0x2AD7B1
+DURATION = 0x4489
+CHAPTERS = 0x1043A770
+EDITION_ENTRY = 0x45B9
+EDITION_UID = 0x45BC
+EDITION_FLAG_HIDDEN = 0x45BD
+EDITION_FLAG_DEFAULT = 0x45DB
+CHAPTER_ATOM = 0xB6
+CHAPTER_UID = 0x73C4
+CHAPTER_TIME_START = 0x91
+CHAPTER_TIME_END = 0x92
+CHAPTER_FLAG_HIDDEN = 0x98
+CHAPTER_FLAG_ENABLED = 0x4598
+CHAPTER_DISPLAY = 0x80
+CHAP_STRING = 0x85
+CHAP_LANGUAGE = 0x437C
+CLUSTER = 0x1F43B675
+VOID = 0xEC
+CRC32 = 0xBF
+
+MATROSKA_EXTENSIONS = [".mkv", ".mka", ".mk3d", ".webm"]
+
+
+#%% Reading
+
+class Element():
+    """An EBML element of the file : its ID, position and sizes"""
+
+    __slots__ = ("id", "offset", "header_size", "size")
+
+    def __init__(self, id, offset, header_size, size):
+        self.id = id
+        self.offset = offset # Position of the element in the file
+        self.header_size = header_size # Size of the ID and size fields
+        self.size = size # Size of the data (None if unknown)
+
+    @property
+    def data_offset(self):
+        return self.offset + self.header_size
+
+    @property
+    def end(self):
+        return self.data_offset + self.size
+
+    @property
+    def total_size(self):
+        return self.header_size + self.size
+
+    def __repr__(self):
+        return f"Element(0x{self.id:X}, offset={self.offset}, size={self.size})"
+
+
+def _read_vint(f, is_id=False):
+    """Reads a variable size integer (EBML ID or size)
+
+    Returns:
+        value (int): The value (with the length marker for IDs, None for unknown sizes)
+        length (int): The number of bytes read
+    """
+    first = f.read(1)
+    if len(first) == 0:
+        raise EOFError("End of file")
+    first = first[0]
+
+    # The number of leading zeros gives the length
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or (is_id and length > 4):
+        raise ValueError("Invalid EBML variable size integer")
+
+    rest = f.read(length - 1)
+    if len(rest) != length - 1:
+        raise EOFError("End of file")
+
+    if is_id:
+        return int.from_bytes(bytes([first]) + rest, "big"), length
+
+    value = int.from_bytes(bytes([first & (0xFF >> length)]) + rest, "big")
+    if value == (1 << (7 * length)) - 1:
+        value = None # Unknown size (all bits set)
+    return value, length
+
+
+def _read_element(f):
+    """Reads the header of the element at the current position and returns it (the data is not read)"""
+
+    offset = f.tell()
+    id, id_length = _read_vint(f, is_id=True)
+    size, size_length = _read_vint(f)
+    return Element(id, offset, id_length + size_length, size)
+
+
+def _children(f, parent):
+    """Returns the headers of the children of an element"""
+
+    children = []
+    f.seek(parent.data_offset)
+    while f.tell() < parent.end:
+        child = _read_element(f)
+        children.append(child)
+        f.seek(child.end)
+    return children
+
+
+def _read_uint(f, element):
+    f.seek(element.data_offset)
+    return int.from_bytes(f.read(element.size), "big")
+
+
+def _read_float(f, element):
+    f.seek(element.data_offset)
+    return struct.unpack(">f" if element.size == 4 else ">d", f.read(element.size))[0]
+
+
+class Layout():
+    """Top level structure of a Matroska file (everything but the clusters)"""
+
+    def __init__(self, f):
+        f.seek(0, os.SEEK_END)
+        self.file_size = f.tell()
+        f.seek(0)
+
+        # EBML header
+        header = _read_element(f)
+        if header.id != EBML:
+            raise ValueError("The file is not a Matroska file")
+        f.seek(header.end)
+
+        # The Segment contains everything else
+        self.segment = _read_element(f)
+        while self.segment.id != SEGMENT:
+            f.seek(self.segment.end)
+            self.segment = _read_element(f)
+
+        # Top level elements, until the first Cluster
+        self.elements = {}
+        f.seek(self.segment.data_offset)
+        segment_end = self.file_size if self.segment.size is None else min(self.segment.end, self.file_size)
+        while f.tell() < segment_end:
+            element = _read_element(f)
+            if element.id == CLUSTER:
+                break
+            if element.size is None:
+                raise ValueError("Elements of unknown size are not supported")
+            self.elements[element.offset] = element
+            f.seek(element.end)
+
+        # Elements after the clusters, found with the SeekHeads (e.g. Chapters or Tags at the end of the file)
+        for seek_head in [element for element in self.elements.values() if element.id == SEEK_HEAD]:
+            for id, position in self.read_seek_head(f, seek_head):
+                offset = self.segment.data_offset + position
+                if offset not in self.elements and offset < self.file_size:
+                    f.seek(offset)
+                    element = _read_element(f)
+                    if element.id == id and element.size is not None:
+                        self.elements[offset] = element
+                        self._read_following(f, element, segment_end)
+
+    def _read_following(self, f, element, segment_end):
+        """Reads the top level elements after the given one (e.g. a Void element after Chapters at the end of the file)"""
+
+        f.seek(element.end)
+        while f.tell() < segment_end and f.tell() not in self.elements:
+            element = _read_element(f)
+            if element.id == CLUSTER or element.size is None:
+                break
+            self.elements[element.offset] = element
+            f.seek(element.end)
+
+    def find(self, id):
+        """Returns the elements with the given ID, in the order of the file"""
+        return [self.elements[offset] for offset in sorted(self.elements) if self.elements[offset].id == id]
+
+    @staticmethod
+    def read_seek_head(f, seek_head):
+        """Returns the entries of a SeekHead as a list of (ID, position from the start of the segment data)"""
+
+        entries = []
+        for seek in _children(f, seek_head):
+            if seek.id != SEEK:
+                continue
+            id = position = None
+            for child in _children(f, seek):
+                if child.id == SEEK_ID:
+                    f.seek(child.data_offset)
+                    id = int.from_bytes(f.read(child.size), "big")
+                elif child.id == SEEK_POSITION:
+                    position = _read_uint(f, child)
+            if id is not None and position is not None:
+                entries.append((id, position))
+        return entries
+
+    def duration_ms(self, f):
+        """Returns the duration of the file in milliseconds (from the Info element), or None if unknown"""
+
+        for info in self.find(INFO):
+            scale = 1000000 # Default timestamp scale, in nanoseconds
+            duration = None
+            for child in _children(f, info):
+                if child.id == TIMESTAMP_SCALE:
+                    scale = _read_uint(f, child)
+                elif child.id == DURATION:
+                    duration = _read_float(f, child)
+            if duration is not None:
+                return int(duration * scale / 1000000)
+        return None
+
+
+#%% Writing
+
+def _encode_id(id):
+    return id.to_bytes((id.bit_length() + 7) // 8, "big")
+
+
+def _encode_size(size, length=None):
+    """Encodes a size as a variable size integer, on the given number of bytes (or the smallest possible)"""
+
+    if length is None:
+        length = 1
+        while size >= (1 << (7 * length)) - 1:
+            length += 1
+    if length > 8 or size >= (1 << (7 * length)) - 1:
+        raise ValueError(f"The size {size} can't be written on {length} bytes")
+    # The length marker is the bit just before the 7*length bits of the value
+    return ((1 << (7 * length)) | size).to_bytes(length, "big")
+
+
+def _element(id, data):
+    return _encode_id(id) + _encode_size(len(data)) + data
+
+
+def _uint(id, value):
+    return _element(id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def _void(total_size):
+    """Returns a Void element (padding) of exactly total_size bytes (at least 2)"""
+
+    for length in range(1, 9):
+        size = total_size - 1 - length
+        if size >= 0 and size < (1 << (7 * length)) - 1:
+            return bytes([VOID]) + _encode_size(size, length) + bytes(size)
+    raise ValueError("A Void element must be at least 2 bytes long")
+
+
+def build_chapters(chapters, duration_ms=None, language="und"):
+    """Builds a Chapters element with one edition
+
+    Args:
+        chapters (iterable): The chapters, as (start time in milliseconds, title), e.g. from Functions.iter_chapters
+        duration_ms (int, optional): Duration of the video, the end of the last chapter. Defaults to None (no end).
+        language (str, optional): ISO 639-2 language of the titles. Defaults to "und".
+
+    Raises:
+        ValueError: If a chapter starts after the end of the video
+
+    Returns:
+        chapters (bytes): The Chapters element
+    """
+    chapters = sorted(chapters)
+
+    atoms = b""
+    if duration_ms is not None and len(chapters) != 0 and chapters[-1][0] >= duration_ms:
+        raise ValueError("The video is shorter than the last timecode. Please check the timecodes.")
+
+    for i, (start_ms, title) in enumerate(chapters):
+        # A chapter ends where the next one starts
+        end_ms = chapters[i+1][0] if i+1 < len(chapters) else duration_ms
+
+        atom = _uint(CHAPTER_UID, random.randrange(1 << 48, 1 << 56))
+        atom += _uint(CHAPTER_TIME_START, start_ms * 1000000) # In nanoseconds
+        if end_ms is not None:
+            atom += _uint(CHAPTER_TIME_END, end_ms * 1000000)
+        atom += _uint(CHAPTER_FLAG_HIDDEN, 0)
+        atom += _uint(CHAPTER_FLAG_ENABLED, 1)
+        atom += _element(CHAPTER_DISPLAY, _element(CHAP_STRING, title.encode("utf-8")) + _element(CHAP_LANGUAGE, language.encode("ascii")))
+        atoms += _element(CHAPTER_ATOM, atom)
+
+    edition = _uint(EDITION_UID, random.randrange(1 << 48, 1 << 56)) + _uint(EDITION_FLAG_HIDDEN, 0) + _uint(EDITION_FLAG_DEFAULT, 1) + atoms
+    return _element(CHAPTERS, _element(EDITION_ENTRY, edition))
+
+
+def _build_seek_head(entries):
+    """Builds a SeekHead element from a list of (ID, position)"""
+
+    seeks = b""
+    for id, position in entries:
+        seeks += _element(SEEK, _element(SEEK_ID, _encode_id(id)) + _uint(SEEK_POSITION, position))
+    return _element(SEEK_HEAD, seeks)
+
+
+def _free_space(layout, free_ids, start):
+    """Returns the size of the free space starting at `start` : the consecutive elements of the given IDs"""
+
+    offset = start
+    while offset in layout.elements and layout.elements[offset].id in free_ids:
+        offset = layout.elements[offset].end
+    return offset - start
+
+
+def _fits(size, space):
+    """A block fits in a free space if it fills it exactly, or leaves room for a Void element (2 bytes)"""
+    return size == space or space - size >= 2
+
+
+def _fill(data, space):
+    """Returns the data followed by a Void element filling the rest of the space (see _fits)"""
+    return data + (_void(space - len(data)) if space != len(data) else b"")
+
+
+def _indexing_seek_heads(f, layout):
+    """Returns the SeekHeads to update, with their entries : the ones with a Chapters entry, or the first one if none has"""
+
+    seek_heads = [(seek_head, layout.read_seek_head(f, seek_head)) for seek_head in layout.find(SEEK_HEAD)]
+    indexing = [(seek_head, entries) for seek_head, entries in seek_heads if any(id == CHAPTERS for id, _ in entries)]
+    return indexing or seek_heads[:1]
+
+
+def _plan_writes(layout, seek_heads, new_chapters, position, append=False, drop=False):
+    """Plans the writes of the chapters at a given position, with the updated SeekHeads
+
+    Args:
+        layout (Layout): The structure of the file
+        seek_heads (list): The SeekHeads to update with their entries, see _indexing_seek_heads
+        new_chapters (bytes): The Chapters element
+        position (int): Where to write the chapters : a Void or Chapters element before the clusters, or the end of the file
+        append (bool, optional): The chapters are appended at the end of the file. Defaults to False.
+        drop (bool, optional): A SeekHead without room for the new position of the chapters loses its Chapters entry
+            (the chapters are before the clusters, where they are found anyway). Defaults to False (the plan fails).
+
+    Returns:
+        writes (list): The (offset, data) to write, or None if the chapters or a SeekHead don't fit
+    """
+    free_ids = [VOID, CHAPTERS]
+    writes = []
+    used = None # (start, end) of the space used by the chapters (and the SeekHead written with them)
+    indexed = False # A SeekHead points to the new chapters
+
+    def seek_head_space(seek_head):
+        """The SeekHead is rewritten in its place, using the Void elements after it"""
+        return seek_head.total_size + _free_space(layout, [VOID], seek_head.end)
+
+    # The chapters go in the Void after a SeekHead : they are written right after the new SeekHead.
+    # Its size depends on the position of the chapters, which depends on its size (a few iterations at most).
+    packing = [(seek_head, entries) for seek_head, entries in seek_heads
+               if not append and seek_head.offset <= position < seek_head.offset + seek_head_space(seek_head)]
+    for seek_head, entries in packing:
+        entries = [entry for entry in entries if entry[0] != CHAPTERS]
+        new_seek_head = _build_seek_head(entries + [(CHAPTERS, position - layout.segment.data_offset)])
+        while position != seek_head.offset + len(new_seek_head):
+            position = seek_head.offset + len(new_seek_head)
+            new_seek_head = _build_seek_head(entries + [(CHAPTERS, position - layout.segment.data_offset)])
+
+        space = seek_head.total_size + _free_space(layout, free_ids, seek_head.end)
+        if not _fits(len(new_seek_head) + len(new_chapters), space):
+            return None
+        used = (seek_head.offset, seek_head.offset + space)
+        writes.append((seek_head.offset, new_seek_head))
+        indexed = True
+
+    if used is None and not append:
+        used = (position, position + _free_space(layout, free_ids, position))
+        if not _fits(len(new_chapters), used[1] - used[0]):
+            return None
+
+    # The other SeekHeads point to the new position of the chapters
+    for seek_head, entries in seek_heads:
+        if any(seek_head is packed for packed, _ in packing):
+            continue
+        entries = [entry for entry in entries if entry[0] != CHAPTERS]
+        new_seek_head = _build_seek_head(entries + [(CHAPTERS, position - layout.segment.data_offset)])
+        space = seek_head_space(seek_head)
+        if _fits(len(new_seek_head), space):
+            indexed = True
+        elif drop and not append:
+            # Without the entry, the SeekHead is smaller (and never points to the old chapters, now a Void element)
+            new_seek_head = _build_seek_head(entries)
+        else:
+            return None
+        writes.append((seek_head.offset, _fill(new_seek_head, space)))
+
+    if append and not indexed:
+        return None # The chapters at the end of the file would not be found
+
+    # The old chapters that are not overwritten become Void elements
+    for element in layout.find(CHAPTERS):
+        if used is None or not used[0] <= element.offset < used[1]:
+            writes.append((element.offset, _void(element.total_size)))
+
+    # The new chapters, followed by a Void element if there is space left
+    if append:
+        writes.append((position, new_chapters))
+        if layout.segment.size is not None:
+            # The size of the Segment is rewritten on the same number of bytes
+            size_length = layout.segment.header_size - len(_encode_id(SEGMENT))
+            new_size = layout.segment.size + len(new_chapters)
+            writes.append((layout.segment.offset + len(_encode_id(SEGMENT)), _encode_size(new_size, size_length)))
+    else:
+        writes.append((position, _fill(new_chapters, used[1] - position)))
+        writes.sort()
+    return writes
+
+
+def write_chapters(path, chapters, duration_ms=None, language="und"):
+    """Writes the chapters of a Matroska file in place (the other chapters are replaced).
+
+    The Chapters element is written, by order of preference, over the old Chapters element or in a Void
+    element before the clusters, or at the end of the file, where the SeekHeads have room to point to it.
+    If they have no room anywhere, it is written before the clusters and the SeekHeads lose their Chapters
+    entry. The space left is filled with Void elements. The clusters (audio, video) are never read nor moved.
+
+    Args:
+        path (str): The path to the Matroska file, modified in place
+        chapters (iterable): The chapters, as (start time in milliseconds, title), e.g. from Functions.iter_chapters
+        duration_ms (int, optional): End of the last chapter. Defaults to the duration written in the file.
+        language (str, optional): ISO 639-2 language of the titles. Defaults to "und".
+
+    Raises:
+        ValueError: If the file is not a Matroska file, or if its structure does not allow
+            an in place update (the file must then be remuxed with ffmpeg)
+
+    Returns:
+        written (int): The number of bytes written
+    """
+    with open(path, "r+b") as f:
+        layout = Layout(f)
+
+        if duration_ms is None:
+            duration_ms = layout.duration_ms(f)
+        new_chapters = build_chapters(chapters, duration_ms, language)
+
+        seek_heads = _indexing_seek_heads(f, layout)
+        candidates = [element.offset for element in layout.find(CHAPTERS) + layout.find(VOID)]
+
+        # At the end of the file if the Segment is the last element (its size is then updated)
+        can_append = len(seek_heads) != 0 and (layout.segment.size is None or layout.segment.end == layout.file_size)
+
+        plans = [(position, False, False) for position in candidates]
+        if can_append:
+            plans.append((layout.file_size, True, False))
+        plans += [(position, False, True) for position in candidates]
+
+        for position, append, drop in plans:
+            writes = _plan_writes(layout, seek_heads, new_chapters, position, append, drop)
+            if writes is not None:
+                break
+        else:
+            if len(seek_heads) == 0:
+                raise ValueError("There is no room for the chapters and no SeekHead to find them at the end of the file")
+            if not can_append:
+                raise ValueError("There is no room for the chapters and the Segment is not at the end of the file")
+            raise ValueError("There is no room to update the SeekHead")
+
+        # The writes are done in the order of the file (the chapters last if they are appended)
+        written = 0
+        for offset, data in writes:
+            f.seek(offset)
+            f.write(data)
+            written += len(data)
+
+    return written
@@ -0,0 +1,117 @@
+##################################################################
+## Progress.py : Parses the output of ffmpeg -progress to get   ##
+## the percentage, throughput and remaining time of a job.      ##
+##################################################################
+
+import time
+
+# Arguments of ffmpeg to write its progress to stdout, as key=value lines (source : https://ffmpeg.org/ffmpeg.html#Advanced-options)
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+
+class Progress():
+    """Progress of an ffmpeg job. Give it the lines of `ffmpeg -progress pipe:1` with feed(),
+    the callback is called with the Progress object after each block of values (about twice per second).
+
+    Usage:
+        progress = Progress(video_time_ms, callback=lambda p: print(p))
+        for line in process.stdout:
+            progress.feed(line)
+    """
+
+    def __init__(self, total_ms, callback=None):
+        """
+        Args:
+            total_ms (int): The duration of the video in milliseconds (0 if unknown)
+            callback (function, optional): Called with this object after each update. Defaults to None.
+        """
+        self.total_ms = total_ms
+        self.callback = callback
+
+        self.start = time.perf_counter()
+        self.out_time_ms = 0 # Position in the output, in milliseconds
+        self.total_size = 0 # Bytes written in the output
+        self.speed = 0.0 # Speed compared to real time (e.g. 150 for 150x)
+        self.finished = False
+
+        self._values = {} # Values of the current block
+
+    def feed(self, line):
+        """Reads a line of the progress output (str or bytes)"""
+
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        key, _, value = line.strip().partition("=")
+        if key == "":
+            return
+
+        self._values[key] = value.strip()
+
+        # "progress" is the last key of a block
+        if key == "progress":
+            self._update(self._values)
+            self._values = {}
+
+    def _update(self, values):
+        # out_time_us and out_time_ms are both in microseconds (out_time_ms is misnamed in ffmpeg)
+        for key in ["out_time_us", "out_time_ms"]:
+            try:
+                self.out_time_ms = int(values[key]) // 1000
+                break
+            except (KeyError, ValueError):
+                continue
+
+        try:
+            self.total_size = int(values.get("total_size", self.total_size))
+        except ValueError:
+            pass # "N/A" at the beginning
+
+        try:
+            self.speed = float(values.get("speed", "0").rstrip("x"))
+        except ValueError:
+            pass
+
+        self.finished = values.get("progress") == "end"
+
+        if self.callback is not None:
+            self.callback(self)
+
+    @property
+    def elapsed(self):
+        """Wall time since the start of the job, in seconds"""
+        return time.perf_counter() - self.start
+
+    @property
+    def percent(self):
+        """Percentage of the video already written (0 if the duration is unknown)"""
+        if self.finished:
+            return 100.0
+        if self.total_ms <= 0:
+            return 0.0
+        return min(100.0, 100 * self.out_time_ms / self.total_ms)
+
+    @property
+    def mb_per_s(self):
+        """Throughput of the job, in MB written per second"""
+        elapsed = self.elapsed
+        return self.total_size / 1e6 / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated remaining time in seconds, or None if unknown"""
+        if self.finished:
+            return 0.0
+        remaining_ms = self.total_ms - self.out_time_ms
+        if self.total_ms <= 0 or remaining_ms < 0:
+            return None
+
+        # Speed given by ffmpeg if possible, otherwise the average speed since the start
+        if self.speed > 0:
+            return remaining_ms / 1000 / self.speed
+        if self.out_time_ms > 0:
+            return self.elapsed * remaining_ms / self.out_time_ms
+        return None
+
+    def __str__(self):
+        eta = "--:--:--" if self.eta is None else time.strftime("%H:%M:%S", time.gmtime(self.eta))
+        return f"{self.percent:5.1f} %  {self.mb_per_s:8.1f} MB/s  ETA {eta}"
@@ -0,0 +1,227 @@
+##################################################################
+## Runner.py : Asyncio engine to run ffmpeg and ffprobe jobs,   ##
+## with a limited number of processes at the same time.         ##
+##################################################################
+
+import os
+import time
+import asyncio
+import threading
+import subprocess
+
+from Functions import CREATE_NO_WINDOW, PROBE_COMMAND, cached_probe, store_probe
+from Trace import span
+from Errors import FFmpegError, ProbeError
+
+
+class ProcessResult():
+    """Result of an ffmpeg or ffprobe process"""
+
+    def __init__(self, args, returncode, stdout=b"", stderr=b"", start=0, duration=0, timed_out=False):
+        self.args = args # The command line, as a list
+        self.returncode = returncode
+        self.stdout = stdout # bytes (empty if the output was given to a callback)
+        self.stderr = stderr # bytes
+        self.start = start # time.time() when the process was started
+        self.duration = duration # Wall time of the process, in seconds
+        self.timed_out = timed_out # The process was killed because it was too long
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+    def check(self):
+        """Raises an FFmpegError (an OSError) if the process failed, returns the result otherwise"""
+
+        stderr = self.stderr.decode('utf-8', 'replace').strip()
+        if self.timed_out:
+            raise FFmpegError(f"{self.args[0]} was stopped after {self.duration:.1f} s (timeout)", self.returncode, stderr, self.args)
+        if self.returncode != 0:
+            raise FFmpegError(f"{self.args[0]} failed with the error : \n" + stderr, self.returncode, stderr, self.args)
+        return self
+
+    def __repr__(self):
+        return f"ProcessResult({self.args[0]!r}, returncode={self.returncode}, {self.duration:.2f} s)"
+
+
+class Runner():
+    """Runs ffmpeg and ffprobe with asyncio, with at most max_jobs processes at the same time.
+
+    In a coroutine, use `await runner.run(...)`, `await runner.ffmpeg(...)` or `await runner.probe(...)`.
+    From another thread (e.g. the graphical interface), use `runner.submit(coroutine)`, which runs the
+    coroutine in a background event loop and returns a concurrent.futures.Future.
+    """
+
+    def __init__(self, max_jobs=None, timeout=None):
+        """
+        Args:
+            max_jobs (int, optional): Maximum number of processes at the same time. Defaults to the number of CPUs.
+            timeout (float, optional): Default timeout of the processes, in seconds. Defaults to None (no timeout).
+        """
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.running = 0 # Number of processes currently running
+
+        self._semaphore = None # Created in the event loop on first use
+        self._semaphore_loop = None
+        self._loop = None # Background event loop for submit()
+        self._thread = None
+
+    @property
+    def semaphore(self):
+        # An asyncio semaphore can only be used in one event loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_jobs)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def run(self, args, input=None, timeout=None, stdout_callback=None, limits=None):
+        """Runs a process and waits for it, killing it if it is too long or if the task is cancelled
+
+        Args:
+            args (list): The command line
+            input (bytes or iterable, optional): Data written to stdin, as bytes or as an iterable of str/bytes
+                chunks written one at a time (e.g. iter_metadata). Defaults to None.
+            timeout (float, optional): Timeout in seconds. Defaults to the timeout of the runner.
+            stdout_callback (function, optional): Called with each line of stdout (str) while the process runs,
+                stdout is then not kept in the result. Defaults to None.
+            limits (Limits, optional): Priority and CPUs of the process (see Governor.py). Defaults to None.
+
+        Raises:
+            FFmpegError: If the limits can't be applied (an OSError, the process is not started)
+
+        Returns:
+            result (ProcessResult): The exit code, outputs and timings of the process
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        # The limits are set when the process starts (see Governor.Limits.spawn)
+        command, options = limits.spawn(args, CREATE_NO_WINDOW) if limits else (args, {"creationflags": CREATE_NO_WINDOW})
+
+        async with self.semaphore:
+            start = time.time()
+            try:
+                process = await asyncio.create_subprocess_exec(*command,
+                                                               stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                                                               stdout=asyncio.subprocess.PIPE,
+                                                               stderr=asyncio.subprocess.PIPE,
+                                                               **options)
+            except subprocess.SubprocessError as e:
+                raise FFmpegError(f"The limits of {args[0]} can't be applied (e.g. a negative niceness without the rights) : {e}", command=args)
+            self.running += 1
+            try:
+                stdout, stderr = await asyncio.wait_for(self._communicate(process, input, stdout_callback), timeout)
+                timed_out = False
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                stdout, stderr, timed_out = b"", b"", True
+            except BaseException:
+                # Cancelled or error while writing the input : the process must not keep running
+                await self._kill(process)
+                raise
+            finally:
+                self.running -= 1
+
+        return ProcessResult(args, process.returncode, stdout, stderr, start, time.time() - start, timed_out)
+
+    @staticmethod
+    async def _communicate(process, input, stdout_callback):
+        """Writes the input and reads the outputs of a process at the same time, then waits for it"""
+
+        async def write():
+            if input is None:
+                return
+            try:
+                for chunk in [input] if isinstance(input, (bytes, str)) else input:
+                    process.stdin.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass # The process stopped early, its error is in stderr
+            finally:
+                process.stdin.close()
+
+        async def read_stdout():
+            if stdout_callback is None:
+                return await process.stdout.read()
+            async for line in process.stdout:
+                stdout_callback(line.decode('utf-8', 'replace').rstrip())
+            return b""
+
+        _, stdout, stderr = await asyncio.gather(write(), read_stdout(), process.stderr.read())
+        await process.wait()
+        return stdout, stderr
+
+    @staticmethod
+    async def _kill(process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+    async def ffmpeg(self, args, **kwargs):
+        """Runs ffmpeg with the given arguments (without 'ffmpeg'), see run() for the other arguments"""
+        return await self.run(['ffmpeg'] + args, **kwargs)
+
+    async def probe(self, movie_file, use_cache=True, timeout=None):
+        """Probes a file with ffprobe (see Functions.probe_file), without blocking the event loop
+
+        Raises:
+            ProbeError: If ffprobe fails (an OSError)
+
+        Returns:
+            info (MediaInfo): The format, streams and chapters of the file
+        """
+        with span("probe", file=movie_file, cached=False) as fields:
+            if use_cache:
+                info = cached_probe(movie_file)
+                if info is not None:
+                    fields["cached"] = True
+                    return info
+
+            result = await self.run(PROBE_COMMAND + [movie_file], timeout=timeout)
+            try:
+                result.check()
+            except FFmpegError as e:
+                raise ProbeError(str(e), e.returncode, e.stderr, e.command)
+            fields["bytes"] = len(result.stdout)
+
+        return store_probe(movie_file, result.stdout.decode('utf-8'))
+
+    def submit(self, coroutine):
+        """Runs a coroutine in the background event loop of the runner (started on first use).
+        Can be called from any thread, e.g. runner.submit(runner.ffmpeg([...])).
+
+        Returns:
+            future (concurrent.futures.Future): The result of the coroutine, future.cancel() cancels the job
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="Runner", daemon=True)
+            self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def call_soon(self, callback):
+        """Calls a function in the background event loop of the runner, from another thread (e.g. to cancel a task
+        of submit() : the task then handles its cancellation before its future is done)"""
+        self._loop.call_soon_threadsafe(callback)
+
+    def close(self):
+        """Cancels the jobs still running in the background event loop (their processes are killed), then stops it"""
+
+        if self._loop is None:
+            return
+
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(cancel_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
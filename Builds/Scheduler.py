@@ -0,0 +1,241 @@
+##################################################################
+## Scheduler.py : Adaptive number of remux jobs run at the same ##
+## time, per disk, from the throughput measured while they run. ##
+##################################################################
+## A stream copy only reads and writes the files, so the best   ##
+## number of jobs depends on the disks : an SSD is faster with  ##
+## many jobs, a hard drive or a network share with one or two.  ##
+## Each device (os.stat().st_dev) used by a job, as source or   ##
+## destination, has its own limit : one more job is tried, and  ##
+## kept only if the throughput of the device improves.          ##
+##################################################################
+
+import os
+import time
+import asyncio
+
+from Trace import TRACER
+
+
+def device_of(path):
+    """Returns the device of a file, or of the folder it will be written to if it doesn't exist yet (None if unknown)"""
+
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+class DeviceLimit():
+    """Jobs allowed at the same time on a device, adjusted after each measure of its throughput"""
+
+    # Measures at the same limit before trying one more job again (the load of the disk may have changed)
+    EXPLORE_EVERY = 10
+
+    def __init__(self, device, limit=1, maximum=1):
+        """
+        Args:
+            device (int): The device number (None if unknown)
+            limit (int, optional): Number of jobs allowed at first. Defaults to 1.
+            maximum (int, optional): Highest limit. Defaults to 1.
+        """
+        self.device = device
+        self.limit = limit
+        self.maximum = maximum
+        self.running = 0 # Jobs running on the device
+        self.waiting = 0 # Jobs waiting for the device
+
+        self.bytes = 0 # Bytes written by the jobs of the device since the last measure
+        self.rates = {} # Throughput (MB/s, moving average) measured with each number of jobs
+        self._steady = 0 # Measures since the limit last changed
+
+        # Number of jobs running, integrated over the time since the last measure
+        self._job_time = 0.0
+        self._last = time.perf_counter()
+
+    def _account(self):
+        # Called before self.running changes
+        now = time.perf_counter()
+        self._job_time += (now - self._last) * self.running
+        self._last = now
+
+    def start(self):
+        self._account()
+        self.running += 1
+
+    def finish(self):
+        self._account()
+        self.running -= 1
+
+    def measure(self, elapsed, tolerance=0.1):
+        """Computes the throughput since the last measure and adjusts the limit :
+        one more job if it was faster with one more, one less if it was about as fast with one less.
+
+        Args:
+            elapsed (float): Time since the last measure, in seconds
+            tolerance (float, optional): Relative gain of throughput needed to keep one more job. Defaults to 0.1.
+
+        Returns:
+            mb_per_s (float): The throughput of the device since the last measure, in MB/s
+        """
+        self._account()
+        mb_per_s = self.bytes / 1e6 / elapsed
+        jobs = self._job_time / elapsed # Average number of jobs running
+        self.bytes = 0
+        self._job_time = 0.0
+
+        # Fewer jobs than allowed (e.g. at the end of the batch) : the measure says nothing about the limit
+        if jobs < 0.9 * self.limit:
+            return mb_per_s
+
+        # The jobs still running after the limit was lowered are counted with the measure
+        jobs = max(1, round(jobs))
+        previous = self.rates.get(jobs)
+        self.rates[jobs] = mb_per_s if previous is None else (previous + mb_per_s) / 2
+
+        self._steady += 1
+        if self._steady >= self.EXPLORE_EVERY:
+            self.rates.pop(self.limit + 1, None)
+
+        rate = self.rates.get(self.limit)
+        more = self.rates.get(self.limit + 1)
+        less = self.rates.get(self.limit - 1)
+        if rate is None:
+            return mb_per_s
+
+        # One more job is tried while each job added so far made the device faster
+        if more is None:
+            faster = less is None or rate > less * (1 + tolerance)
+        else:
+            faster = more > rate * (1 + tolerance)
+
+        if self.waiting > 0 and self.limit < self.maximum and faster:
+            self.limit += 1
+            self._steady = 0
+        elif less is not None and less * (1 + tolerance) >= rate:
+            self.limit -= 1
+            self._steady = 0
+        return mb_per_s
+
+    def __repr__(self):
+        return f"DeviceLimit({self.device}, {self.running}/{self.limit} jobs)"
+
+
+class Scheduler():
+    """Starts asyncio jobs when the devices of their source and destination files have a free slot.
+    The jobs report the bytes they write (ffmpeg -progress), and every `interval` seconds the limit
+    of each device is adjusted to its throughput.
+
+    Usage:
+        async with Scheduler(max_jobs=8) as scheduler:
+            result = await scheduler.run(movie, output, lambda progress_callback: run_job_async(..., progress_callback))
+    """
+
+    def __init__(self, max_jobs=None, interval=2.0, tolerance=0.1, start=1):
+        """
+        Args:
+            max_jobs (int, optional): Maximum number of jobs at the same time, on all devices. Defaults to the number of CPUs.
+            interval (float, optional): Time between two measures, in seconds. Defaults to 2.0.
+            tolerance (float, optional): Relative gain of throughput needed to keep one more job. Defaults to 0.1.
+            start (int, optional): Number of jobs allowed on a device at first. Defaults to 1.
+        """
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.interval = interval
+        self.tolerance = tolerance
+        self.start = min(start, self.max_jobs)
+        self.running = 0 # Jobs running, on all devices
+        self.devices = {} # DeviceLimit of each device
+        self.history = [] # (time, device, limit, MB/s) of each measure
+
+        self._condition = None # Created in the event loop
+        self._monitor = None
+
+    async def __aenter__(self):
+        self._condition = asyncio.Condition()
+        self._monitor = asyncio.ensure_future(self._measure_loop())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._monitor.cancel()
+        try:
+            await self._monitor
+        except asyncio.CancelledError:
+            pass
+
+    def limits(self, source, destination):
+        """Returns the DeviceLimit of the source and destination devices (only one if they are the same)"""
+
+        limits = []
+        for device in dict.fromkeys([device_of(source), device_of(destination)]):
+            if device not in self.devices:
+                self.devices[device] = DeviceLimit(device, self.start, self.max_jobs)
+            limits.append(self.devices[device])
+        return limits
+
+    def _can_start(self, limits):
+        return self.running < self.max_jobs and all(limit.running < limit.limit for limit in limits)
+
+    async def run(self, source, destination, job):
+        """Waits until the devices of the files have a free slot, then runs a job
+
+        Args:
+            source (str): The file read by the job
+            destination (str): The file written by the job
+            job (function): Called with a progress callback (taking a Progress object), returns the coroutine of the job
+
+        Returns:
+            result: The result of the job
+        """
+        limits = self.limits(source, destination)
+        async with self._condition:
+            for limit in limits:
+                limit.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self._can_start(limits))
+            finally:
+                for limit in limits:
+                    limit.waiting -= 1
+            self.running += 1
+            for limit in limits:
+                limit.start()
+
+        written = 0
+        def progress_callback(progress):
+            # The bytes written since the last report are counted on the devices of the job
+            nonlocal written
+            for limit in limits:
+                limit.bytes += max(0, progress.total_size - written)
+            written = max(written, progress.total_size)
+
+        try:
+            return await job(progress_callback)
+        finally:
+            async with self._condition:
+                self.running -= 1
+                for limit in limits:
+                    limit.finish()
+                self._condition.notify_all()
+
+    async def _measure_loop(self):
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            async with self._condition:
+                for limit in self.devices.values():
+                    mb_per_s = limit.measure(elapsed, self.tolerance)
+                    self.history.append((time.time(), limit.device, limit.limit, mb_per_s))
+                    if TRACER.enabled:
+                        TRACER.write("scheduler", time.time() - elapsed, elapsed,
+                                     {"device": limit.device, "jobs": limit.limit, "running": limit.running, "mb_per_s": round(mb_per_s, 3)})
+                # A limit may have been raised
+                self._condition.notify_all()
+
+    def __repr__(self):
+        return f"Scheduler({self.running}/{self.max_jobs} jobs, {list(self.devices.values())})"
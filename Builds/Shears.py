@@ -10,143 +10,214 @@
 ##################################################################
 ## Usage: Shears.py [-h] [-mt MOVIE_TITLE]                      ##
 ##        [-a AUTHOR] [-y YEAR] [-o OUTPUT] movie_file chapters ##
+##        [-s SUBTITLES [SUBTITLES ...]]                        ##
+##        Shears.py --batch MANIFEST [-j JOBS] [--engine E]     ##
+##        [--overwrite {skip,overwrite,rename}]                 ##
+##        Shears.py --in-place movie_file.mkv/mp4 chapters      ##
+##        [--profile TRACE.jsonl] [--cprofile STATS.prof]       ##
+##        [--nice N] [--ionice CLASS] [--cpus LIST]             ##
+##        [--read-rate BYTES/S]                                 ##
+##        Shears.py --split movie_file [chapters] [-o OUTPUT]   ##
 ##################################################################
 ## Changelog:                                                   ##
 ## 2020-05-05: 	Initial release                                 ##
+##            	Batch mode with a manifest file                 ##
+##            	In place chapters for Matroska and MP4 files    ##
+##            	Timing trace and profiling                      ##
+##            	Several subtitle tracks in one pass             ##
+##            	Python API (Jobs.py) with typed errors          ##
+##            	Adaptive number of batch jobs per disk          ##
+##            	Priority, CPUs and read rate limits of ffmpeg   ##
+##            	Split mode : one file per chapter               ##
 ##################################################################
 
 
 #%% Start
-import os, subprocess#, re
-from subprocess import CREATE_NO_WINDOW
-
-from Functions import timecode_to_ms, ms_to_timecode, parse_timecodes as parse
-
-#%% Check system requirements
-# Check if ffmpeg is installed
-import subprocess
-try:
-    subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, creationflags=CREATE_NO_WINDOW)
-except:
-    err = "ffmpeg is not installed. Please install it before running this script. (https://ffmpeg.org/)"
-    raise SystemExit(err)
-
-# Check if ffprobe is installed
-try:
-    subprocess.run(['ffprobe', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, creationflags=CREATE_NO_WINDOW)
-except:
-    err = "ffprobe is not installed. Please install it before running this script. (https://ffmpeg.org/)"
-    raise SystemExit(err)
-
-
-#%% Parsing arguments (Pyhton version in command line)
+import os, sys, time
 import argparse
-parser = argparse.ArgumentParser(description='Adds chapters to a video file, given the timecodes and titles of the chapters.')
-
-# Positional arguments (required)
-parser.add_argument('movie_file', type=str, help='The path to the video file to add chapters to.')
-parser.add_argument('chapters', type=str, help='The path to the file containing the timecodes and titles of the chapters.')
 
-# Optional arguments (not required)
-parser.add_argument('-mt', '--movie-title', type=str, help='Title of the movie', default='')
-parser.add_argument('-a', '--author', type=str, help='Author of the movie', default='')
-parser.add_argument('-y', '--year', type=str, help='Year of the movie', default='')
-
-parser.add_argument('-o', '--output', type=str, help='Output file name (without extension)', default='')
-
-# Parse the arguments
-args = parser.parse_args()
-
-# Movie title, author and year
-movie_title = args.movie_title
-author = args.author
-movie_year = args.year
-
-movie_file = args.movie_file # Path to the movie file
-timecodes_file = args.chapters # Path to the timecodes file
-path = os.path.dirname(args.movie_file) # Path to the movie file folder
-movie_extension = os.path.splitext(args.movie_file)[1] # Extension of the movie file
+from Functions import check_requirements, open_chapters, OVERWRITE_POLICIES
+from Batch import read_manifest, run_batch, print_summary, ENGINES
+from Jobs import ShearsJob, run_job, ShearsError, OutputExistsError
+from Trace import span, enable_trace, profile_to
+from Governor import Limits
+
+
+def parse_arguments(argv=None):
+    """Parses the arguments of the command line"""
+
+    parser = argparse.ArgumentParser(description='Adds chapters to a video file, given the timecodes and titles of the chapters.')
+
+    # Positional arguments (required, except in batch mode)
+    parser.add_argument('movie_file', type=str, nargs='?', help='The path to the video file to add chapters to.')
+    parser.add_argument('chapters', type=str, nargs='?', help='The path to the file containing the timecodes and titles of the chapters.')
+
+    # Optional arguments (not required)
+    parser.add_argument('-mt', '--movie-title', type=str, help='Title of the movie', default='')
+    parser.add_argument('-a', '--author', type=str, help='Author of the movie', default='')
+    parser.add_argument('-y', '--year', type=str, help='Year of the movie', default='')
+
+    parser.add_argument('-o', '--output', type=str, help='Output file name (without extension)', default='')
+    parser.add_argument('-s', '--subtitles', type=str, nargs='+', default=[],
+                        help='Subtitle files added as new tracks (their languages are detected)')
+
+    # Batch mode
+    parser.add_argument('-b', '--batch', type=str, help='Manifest file (CSV or JSONL) with the columns movie, chapters, title, author, year, output and subtitles', default='')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of jobs run at the same time in batch mode (default : number of CPUs)', default=None)
+    parser.add_argument('--engine', type=str, choices=ENGINES, default="process",
+                        help='How batch jobs are run : in a pool of Python processes, as ffmpeg processes driven by asyncio, '
+                             'or driven by asyncio with a number of jobs per disk adapted to the measured throughput (-j is then the maximum)')
+    parser.add_argument('--overwrite', type=str, choices=OVERWRITE_POLICIES, default=None,
+                        help='What to do if the output file already exists (default : ask, or skip in batch mode)')
+
+    # Limits of the ffmpeg processes (also per job in a manifest, which can only be stricter)
+    parser.add_argument('--nice', type=str, default='',
+                        help='Niceness of ffmpeg, from -20 to 19 (higher leaves more CPU time to the other programs)')
+    parser.add_argument('--ionice', type=str, default='',
+                        help='I/O class of ffmpeg on Linux : idle, best-effort (or best-effort:0 to best-effort:7) or realtime')
+    parser.add_argument('--cpus', type=str, default='',
+                        help='CPUs ffmpeg can run on (e.g. 0-3,6)')
+    parser.add_argument('--read-rate', type=str, default='',
+                        help='Maximum read throughput of each movie file, in bytes per second (e.g. 50M for 50 MB/s)')
+
+    # Split mode
+    parser.add_argument('--split', action='store_true',
+                        help='Cuts the video into one file per chapter (from the chapters file, or the chapters of the video if it is not given)')
+
+    # In place mode
+    parser.add_argument('--in-place', action='store_true',
+                        help='Writes the chapters directly in the Matroska (.mkv) or MP4 file, without remuxing it')
+
+    # Profiling
+    parser.add_argument('--profile', type=str, default='',
+                        help='Appends the duration of each stage (tool checks, probe, metadata, remux) to this JSONL trace file')
+    parser.add_argument('--cprofile', type=str, default='',
+                        help='Dumps the cProfile statistics of the Python code to this file (read them with python -m pstats)')
+
+    args = parser.parse_args(argv)
+
+    if args.batch == '' and (args.movie_file is None or (args.chapters is None and not args.split)):
+        parser.error("the movie_file and chapters arguments are required (or use --batch)")
+    if args.split and (args.batch != '' or args.in_place or len(args.subtitles) != 0):
+        parser.error("--split can't be used with --batch, --in-place or -s")
+    if args.batch != '' and args.overwrite == "ask":
+        parser.error("the batch mode can't ask before overwriting a file")
+    if args.in_place and (args.batch != '' or args.output != '' or len(args.subtitles) != 0):
+        parser.error("--in-place modifies the movie file, it can't be used with --batch, -o or -s")
+
+    try:
+        args.limits = Limits.from_strings(args.nice, args.ionice, args.cpus, args.read_rate)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.in_place and args.limits:
+        parser.error("--in-place doesn't run ffmpeg, it can't be used with --nice, --ionice, --cpus or --read-rate")
+    if args.batch != '' and len(args.subtitles) != 0:
+        parser.error("in batch mode, the subtitles are given by the subtitles column of the manifest")
+
+    return args
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    if args.profile != '':
+        enable_trace(args.profile)
+
+    with profile_to(args.cprofile):
+        run(args)
+
+
+def run(args):
+    """Runs the script with the parsed arguments"""
+
+    #%% In place mode (no ffmpeg needed)
+    if args.in_place:
+        from Matroska import MATROSKA_EXTENSIONS
+        from MP4 import MP4_EXTENSIONS
+        extension = os.path.splitext(args.movie_file)[1].lower()
+        try:
+            if extension in MATROSKA_EXTENSIONS:
+                if args.movie_title != '' or args.author != '' or args.year != '':
+                    raise SystemExit("--in-place only writes the chapters of Matroska files, it can't be used with -mt, -a or -y")
+                from Matroska import write_chapters
+                with span("in_place", file=args.movie_file) as fields:
+                    written = fields["bytes"] = write_chapters(args.movie_file, open_chapters(args.chapters))
+            elif extension in MP4_EXTENSIONS:
+                from MP4 import write_chapters
+                with span("in_place", file=args.movie_file) as fields:
+                    written = fields["bytes"] = write_chapters(args.movie_file, open_chapters(args.chapters), args.movie_title, args.author, args.year)
+            else:
+                raise SystemExit("--in-place only works with Matroska and MP4 files (" + ", ".join(MATROSKA_EXTENSIONS + MP4_EXTENSIONS) + ")")
+        except (OSError, ValueError) as e:
+            raise SystemExit(str(e) + "\n(Run the script without --in-place to remux the file instead)")
+        print(f"Chapters written in {args.movie_file} ({written:,} bytes written)")
+        return
+
+    # The manifest is read first, the limits of its jobs are checked with the requirements
+    jobs = []
+    if args.batch != '':
+        try:
+            jobs = read_manifest(args.batch)
+        except (OSError, ValueError) as e:
+            raise SystemExit(str(e))
+
+    #%% Check system requirements (ffmpeg 5.0 or newer to limit the read rate)
+    try:
+        check_requirements(readrate=any(limits.read_rate is not None for limits in [args.limits] + [job.limits for job in jobs]))
+    except OSError as e:
+        raise SystemExit(str(e))
+
+    #%% Batch mode
+    if args.batch != '':
+        start = time.perf_counter()
+        results = run_batch(jobs, workers=args.jobs, overwrite=args.overwrite or "skip", engine=args.engine, limits=args.limits,
+                            callback=lambda result: print(f"[{result['status']}] {result['job'].movie}"))
+        print_summary(results, time.perf_counter() - start)
+
+        # Non-zero exit code if a job failed
+        if any(result["status"] == "failed" for result in results):
+            raise SystemExit(1)
+        return
+
+    # Progress of ffmpeg on a single line (only in a terminal)
+    progress_callback = (lambda progress: print("\r" + str(progress), end="", flush=True)) if sys.stdout.isatty() else None
+
+    #%% Split mode
+    if args.split:
+        from Split import split_movie
+        try:
+            pieces, warnings = split_movie(args.movie_file, args.chapters, args.output, args.movie_title, args.author, args.year,
+                                           args.overwrite or "ask", progress_callback, args.limits)
+        except OutputExistsError:
+            raise SystemExit("Exiting the script. (A file of the chapters already exists)")
+        except (OSError, ValueError) as e:
+            raise SystemExit(str(e))
+
+        if progress_callback is not None:
+            print() # End the progress line
+        for piece in pieces:
+            print("File created : "+piece)
+        for warning in warnings:
+            print("The title could not be written in "+warning)
+        return
+
+    #%% Actual code
+    # Output file name : if not specified, the movie title is used (see Jobs.py)
+    job = ShearsJob(args.movie_file, args.chapters, args.output, args.movie_title, args.author, args.year,
+                    subtitles=args.subtitles, overwrite=args.overwrite or "ask", limits=args.limits)
+
+    try:
+        result = run_job(job, progress_callback)
+    except OutputExistsError:
+        raise SystemExit("Exiting the script. (The output file already exists)")
+    except (ShearsError, ValueError, OSError) as e:
+        # The error is printed to stderr, with the exit code 1 (e.g. FFmpegError or ProbeError)
+        raise SystemExit(str(e))
 
-# Output file name (if not specified, use the movie title)
-output_file = os.path.join(path, movie_title + '_modified' + movie_extension) if args.output == '' else os.path.join(path, args.output + movie_extension)
+    if progress_callback is not None:
+        print() # End the progress line
+    print("File created : "+result.output)
 
-# Checks if the output file is the same as the input file
-if output_file == movie_file:
-    err = "The output file cannot be the same as the input file"
-    raise SystemExit(err)
 
-# Checks if the output file already exists. Asks the user if they want to overwrite it.
-if os.path.isfile(output_file):
-    print("The output file already exists. Do you want to overwrite it? (y/n)")
-    answer = input()
-    if answer.lower() != 'y':
-        raise SystemExit("Exiting the script. (The output file already exists)")
-    os.remove(output_file)
-    
-
-#%% Actual code 
-
-# Open a text file in which are put the inputs and parsing them
-with open(timecodes_file) as f:
-    lines = f.read()
-
-input = lines.split("\n")
-
-# Extracting the timecodes and titles
-times, titles = parse(input)
-
-# Converting the timecodes to milliseconds
-times_ms = [timecode_to_ms(t) for t in times]
-
-# Checking if the video is longer than the last timecode (source :  https://ffmpeg.org/ffprobe.html#Main-options)
-video_time_s = float(subprocess.check_output(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', movie_file]).decode('utf-8'))
-video_time_ms = int(float(video_time_s)*1000)
-try:
-    assert video_time_ms > times_ms[-1]
-except AssertionError:
-    err = "The video is shorter than the last timecode. Please check the timecodes."
-    raise SystemExit("The video is shorter than the last timecode")
-
-# print("Video time: "+str(video_time_ms)+" ms")
-# print("Last timecode: "+str(times_ms[-1])+" ms")
-
-# Creating the metadata file (source : http://underpop.online.fr/f/ffmpeg/help/metadata.htm.gz)
-path = os.getcwd()
-with open(path+"/metadata.txt", "w") as f:
-    f.write(';FFMETADATA1\n')
-    f.write('title='+movie_title+'\n') if movie_title != '' else None
-    f.write('date='+movie_year+'\n') if movie_year != '' else None
-    f.write('artist='+author+'\n') if author != '' else None
-    f.write('\n')
-    
-    # Writing the timecodes and titles in the metadata file
-    for i in range(len(times_ms)-1):
-        f.write('[CHAPTER]\n')
-        f.write('TIMEBASE=1/1000\n')
-        f.write('# Chapter '+str(i+1)+' starts at '+times[i]+'\n')
-        f.write('START='+str(times_ms[i])+'\n')
-        f.write('# Chapter '+str(i+1)+' ends at '+times[i+1]+' (minus 1 millisecond)\n')
-        f.write('END='+str(times_ms[i+1]-1)+'\n')
-        f.write('title='+titles[i]+'\n\n')
-    
-    # Writing the last timecode and title in the metadata file
-    i = len(times_ms)-1
-    f.write('[CHAPTER]\n')
-    f.write('TIMEBASE=1/1000\n')
-    f.write('# Chapter '+str(i+1)+' starts at '+times[i]+'\n')
-    f.write('START='+str(times_ms[i])+'\n')
-    f.write('# Chapter '+str(i+1)+' ends at '+ms_to_timecode(video_time_ms)+' (minus 1 millisecond)\n')
-    f.write('END='+str(video_time_ms)+'\n')
-    f.write('title='+titles[i]+'\n\n')
-
-# Adding the metadata to the video (source : https://ffmpeg.org/ffmpeg.html#Synopsis)
-cmd = "ffmpeg -y -i \""+movie_file+"\" -i \""+path+"/metadata.txt\" -map_metadata 1 -codec copy \""+output_file+"\" -v error"
-try : # Should allways work, but just in case
-    if subprocess.run(cmd, capture_output=True, creationflags=CREATE_NO_WINDOW).returncode != 0:
-        raise OSError("ffmpeg failed. Try to run this command in terminal to see the error : \n"+cmd)
-    else : 
-        # Deleting the metadata file to keep the folder clean
-        os.remove(path+"/metadata.txt")
-        print("File created : "+output_file)
-except OSError as e:
-    print(e)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
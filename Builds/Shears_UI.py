@@ -14,28 +14,49 @@
 ##################################################################
 ## Changelog:                                                   ##
 ## 2020-05-05: 	Initial release                                 ##
+##            	Splash screen and faster startup                ##
+##            	Several subtitle files in one pass              ##
+##            	Sorted chapter list, faster table edits         ##
+##            	Virtual table, large chapter files load quickly ##
 ##################################################################
 
+#%% Splash screen, shown while the other modules are loaded
+if __name__ == "__main__":
+    # The language detection of several subtitle files runs in worker processes (needed by the executable)
+    from multiprocessing import freeze_support
+    freeze_support()
+
+    from Splash import Splash
+    from Functions import resource_path
+    splash = Splash(resource_path("Ressources/Splash.png"))
+
 #%% Imports
 import os
 import re
+import queue
+import itertools
+import threading
 import subprocess
-from subprocess import CREATE_NO_WINDOW
 
-# Language modules
-from pycountry import languages
-from langdetect import detect, DetectorFactory
+# The language modules (langdetect, pycountry) and the windows with images (PIL) are loaded on first use
 
 # GUI modules
 import customtkinter
 import tkinter.font as tkfont
-from tkinter.filedialog import askopenfilename, asksaveasfilename
+from tkinter.filedialog import askopenfilename, askopenfilenames, asksaveasfilename
 from tkinter import END, ttk
 from tkinter.messagebox import askyesno
 
 # Custom modules
-from Functions import resource_path, timecode_to_ms, ms_to_timecode, parse_timecodes as parse, Error_Window
-from external_windows import Help_window, Credits_window
+from Functions import resource_path, timecode_to_ms, ms_to_timecode, iter_chapters, probe_file, build_metadata, iter_metadata, check_requirements, subtitle_arguments, METADATA_INPUT
+from Dialogs import Error_Window
+from Progress import Progress, PROGRESS_ARGS
+from Chapters import ChapterList
+from VirtualTable import VirtualTable
+from Trace import span, enable_trace
+from Cache import default_cache_path
+
+LOAD_CHUNK = 5000 # Number of chapters read from a file between two updates of the window
 
 #%% Application class definition
 
@@ -56,6 +77,15 @@ class Application(customtkinter.CTk):
         self.minsize(Application.WIDTH, Application.HEIGHT)
         self.protocol("WM_DELETE_WINDOW", self.on_closing) # call .on_closing() when app gets closed
 
+        # Engine running the ffmpeg and ffprobe processes in the background, one job at a time
+        self._runner = None  # Created on first use (see the runner property), asyncio is slow to import
+        self.jobs = []  # Running and queued jobs (see submit_job)
+        self.events = queue.Queue()  # Progress and results sent by the jobs to the window
+        self.after(100, self.poll_events)
+
+        # ffmpeg and ffprobe are checked in the background, the window doesn't wait for them
+        threading.Thread(target=self.check_tools, name="Requirements", daemon=True).start()
+
         # Get the default font and prints it with the size
         # default_font = tkfont.nametofont("TkDefaultFont")
         # print("Default font : " + default_font.actual()["family"] + " " + str(default_font.actual()["size"]))
@@ -79,12 +109,31 @@ class Application(customtkinter.CTk):
         self.Cancel_button = customtkinter.CTkButton(master=self,
                                                      text="Cancel",
                                                      border_width=1,
-                                                     command=self.on_closing)
+                                                     command=self.cancel_button_event)
         self.Cancel_button.grid(row=1, column=3, sticky="e", padx=10, pady=10)
 
         # Binding the escape key to the Cancel button
         self.bind("<Escape>", lambda event: self.on_closing())
 
+        # Progress of ffmpeg, on the bottom left of the buttons
+        self.progress_frame = customtkinter.CTkFrame(master=self,
+                                                     corner_radius=0)
+        self.progress_frame.grid(row=1, column=1, sticky="we", padx=20, pady=10)
+        self.progress_frame.configure(fg_color=self.progress_frame.bg_color)  # Make the frame invisible
+        self.progress_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = customtkinter.CTkProgressBar(master=self.progress_frame)
+        self.progress_bar.grid(row=0, column=0, sticky="we", padx=10)
+        self.progress_bar.set(0)
+
+        self.progress_label = customtkinter.CTkLabel(master=self.progress_frame,
+                                                     text="",
+                                                     anchor="e",
+                                                     width=1)
+        self.progress_label.grid(row=0, column=1, sticky="e")
+
+        self.progress = None  # Last Progress object of the running job
+
         # ============ Create two frames ============
         # The left frame is not resizable and is on rows 1 and 2
         self.left_frame = customtkinter.CTkFrame(master=self,
@@ -213,7 +262,7 @@ class Application(customtkinter.CTk):
 
         # Subtitle selection
         self.subtitle_field = customtkinter.CTkEntry(master=self.right_frame,
-                                                     placeholder_text="Subtitle file",
+                                                     placeholder_text="Subtitle files (separated by ;)",
                                                      state="normal")
         self.subtitle_field.grid(row=3, column=0, sticky="we", padx=10, pady=10)
 
@@ -247,46 +296,52 @@ class Application(customtkinter.CTk):
         #color = self.table_frame.bg_color
         self.table_frame.configure(fg_color='silver')
 
-        style = ttk.Style()
+        style = ttk.Style(master=self)  # The style of this window (not of the splash screen)
         style.theme_use("default")
         style.map("Treeview")
         style.configure("Treeview", rowheight=19) # Sets the height of the rows to fit the frame
 
+        # The chapters of the table, kept sorted
+        self.chapter_list = ChapterList()
+        self.loading = None  # The after() call loading the next chunk of a chapters file
+        self.reader = None  # The chapters read from this file
+
         # Set the tables columns
         columns = ("Start time", "Chapter title")
 
-        self.table = ttk.Treeview(self.table_frame,
-                                  style="Treeview",
-                                  columns=columns,
+        # Only the visible lines are created in the Treeview, the chapters stay in self.chapter_list
+        self.table = VirtualTable(self.table_frame,
+                                  columns,
+                                  self.chapter_list,
+                                  lambda chapter: (ms_to_timecode(chapter[0]), chapter[1]),
                                   height=9,
-                                  show="headings")
-        self.table.grid(row=1, column=0, sticky="nswe", padx=0, pady=0)
+                                  rowheight=19,
+                                  style="Treeview")
+        self.table.tree.grid(row=1, column=0, sticky="nswe", padx=0, pady=0)
 
         # Define headings
         for col in columns:
-            self.table.heading(col, text=col)
+            self.table.tree.heading(col, text=col)
 
         # Define column width
-        self.table.column("Start time", minwidth=70, width=70, stretch=False)
-        self.table.column("Chapter title", minwidth=225, width=225)
+        self.table.tree.column("Start time", minwidth=70, width=70, stretch=False)
+        self.table.tree.column("Chapter title", minwidth=225, width=225)
 
         # Bind actions to the table
-        # self.table.bind('<Motion>', 'break') # Make columns not resizable
-        # If a line is selected, update the entry field with row_selection
-        self.table.bind('<ButtonRelease-1>', lambda e: self.row_selection())
-
-        # Add a y-scrollbar
-        self.table_scrollbar = ttk.Scrollbar(self.table_frame, 
-                                             orient="vertical", 
-                                             command=self.table.yview)
-        self.table.configure(yscrollcommand=self.table_scrollbar.set)
+        # self.table.tree.bind('<Motion>', 'break') # Make columns not resizable
+        # If a line is selected (with the mouse or the keyboard), update the entry field with row_selection
+        self.table.tree.bind('<ButtonRelease-1>', lambda e: self.row_selection())
+        self.table.tree.bind('<<VirtualSelect>>', lambda e: self.row_selection())
+
+        # Add a y-scrollbar (it scrolls the chapters, not the lines of the Treeview)
+        self.table_scrollbar = self.table.scrollbar
         self.table_scrollbar.grid(row=1, column=1, sticky="ns", padx=0, pady=0)
 
         # Add a x-scrollbar
         self.table_scrollbar_x = ttk.Scrollbar(self.table_frame, 
                                                orient="horizontal", 
-                                               command=self.table.xview)
-        self.table.configure(xscrollcommand=self.table_scrollbar_x.set)
+                                               command=self.table.tree.xview)
+        self.table.tree.configure(xscrollcommand=self.table_scrollbar_x.set)
         self.table_scrollbar_x.grid(row=2, column=0, sticky="we", padx=0, pady=0)
 
         # Table modification frame on second column
@@ -372,12 +427,11 @@ class Application(customtkinter.CTk):
             raise ValueError("Invalid timecode : " + string)
 
 
-    @staticmethod
-    def measure_string(string: str):
+    def measure_string(self, string: str):
         """Measures the a string in pixels"""
 
         # Get a font to measure a standard width
-        font = tkfont.nametofont("TkDefaultFont")
+        font = tkfont.nametofont("TkDefaultFont", root=self)
         font_size = font.measure("0")  # Get the width of a character
         measure = len(string) * font_size # Multiply the number of characters by the width of a character
         
@@ -385,54 +439,84 @@ class Application(customtkinter.CTk):
 
 
     @staticmethod
-    def detect_language(path):
-        """Detects the language of the subtitle file"""
+    def detect_subtitles(paths):
+        """Checks the subtitle files and detects their languages, all at the same time (see Language.py)
 
-        if not os.path.isfile(path):
-            return None
+        Returns:
+            subtitles (list): The (path, language) of each file
+        """
 
-        # Open the subtitle file
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read()
+        from Language import detect_subtitles  # Loaded on first use (imports langdetect)
+        return detect_subtitles(paths)
 
-        # Remove the lines with the timecodes
-        text = re.sub(r"\d{2}:\d{2}:\d+,\d+ --> \d{2}:\d{2}:\d+,\d+", "", text)
-        # Remove the lines with the numbers
-        text = re.sub(r"\d+", "", text)
-        # Remove the empty lines
-        text = re.sub(r"\n+", "\n", text)
 
-        # Detect the language
-        DetectorFactory.seed = 0
-        language = detect(text)
-        iso_369_2 = languages.get(alpha_2=language).alpha_3
-        return iso_369_2
+    def show_chapters(self, chapters):
+        """Replaces the chapters of the table (only the visible lines are updated)"""
 
+        self.chapter_list = chapters
+        self.table.rows = chapters
+        self.table.top = 0
+        self.table.select(None)
 
-    def add_to_table(self, times, chapters):
-        """Replaces the table with the given values"""
 
-        # Order the lists by time
-        times, chapters = (list(t) for t in zip(*sorted(zip(times, chapters))))
+    def load_chapters(self, file_path):
+        """Reads a chapters file in chunks of LOAD_CHUNK chapters, scheduled with after() so that the window stays responsive.
+        The table shows the chapters as they are read. If the file can't be read, the previous chapters are restored."""
 
-        # Erase the table
-        for record in self.table.get_children():
-            self.table.delete(record)
+        # Stop the loading of another file
+        if self.loading is not None:
+            self.after_cancel(self.loading)
+            self.reader.close()
+            self.loading = None
 
-        # Add the timecodes and chapters to the table
-        for i in range(len(times)):
-            self.table.insert('', 'end', text=str(i), values=(times[i], chapters[i]))
+        previous = self.chapter_list
+        chapters = ChapterList()
+        self.reader = iter_chapters(file_path)  # Reads the file lazily
+        self.show_chapters(chapters)
+
+        def load_chunk():
+            count = 0
+            try:
+                for start_ms, title in itertools.islice(self.reader, LOAD_CHUNK):
+                    chapters.append(start_ms, title)  # Sorted once at the end of the file
+                    count += 1
+            except (OSError, ValueError) as e:  # Just in case the file is not formatted correctly
+                error = str(e)
+            else:
+                if count == LOAD_CHUNK:
+                    # More chapters to read : the window is updated before the next chunk
+                    self.table.refresh()
+                    self.loading = self.after(1, load_chunk)
+                    return
+                error = "No chapters found." if len(chapters) == 0 else ""
+
+            # End of the file
+            self.loading = None
+            self.reader = None
+            if error != "":
+                self.show_chapters(previous)
+                Error_Window("Error",
+                             error+"\nPlease check the file formatting and try again.")
+                return
+
+            chapters.sort()
+            self.table.refresh()
+            # Replace the placeholder text with the path
+            self.timecodes_field.delete(0, END)
+            self.timecodes_field.insert(0, file_path)
+
+        load_chunk()
 
 
     def resize_table(self, chapter):
         """Resize the table column to fit the new chapter title if needed"""
 
         # Get the current width of the column
-        old_size = self.table.column("Chapter title", option="width")
+        old_size = self.table.tree.column("Chapter title", option="width")
         new_size = self.measure_string(chapter)  # Get the width of the input
         if new_size > old_size:
             # Resize the column if the input is longer than the current size
-            self.table.column("Chapter title", width=new_size)
+            self.table.tree.column("Chapter title", width=new_size)
 
 # =================== Action Functions ===================
 
@@ -449,11 +533,13 @@ class Application(customtkinter.CTk):
 
     def help_button_event(self):
         """Opens a window with how to use the program"""
+        from external_windows import Help_window  # Loaded on first use (imports PIL)
         Help_window(self)
 
 
     def credits_button_event(self):
         """Opens a toplevel window with the credits of the program"""
+        from external_windows import Credits_window  # Loaded on first use (imports PIL)
         Credits_window(self)
 
 
@@ -470,15 +556,17 @@ class Application(customtkinter.CTk):
 
 
     def browse_subtitle_event(self):
-        """Browse for a subtitle file and replace the placeholder text with the path"""
+        """Browse for subtitle files (one or more) and replace the placeholder text with their paths"""
 
         # Open a file selection dialog window
-        file_path = askopenfilename(title='Select the subtitle file',
-                                    filetypes=[('Subtitles files', ('*.txt', '*.sbv', '*.srt', '*.vtt')), ("all files", "*.*")])
+        file_paths = askopenfilenames(title='Select the subtitle files',
+                                      filetypes=[('Subtitles files', ('*.txt', '*.sbv', '*.srt', '*.vtt', '*.ass', '*.ssa')), ("all files", "*.*")])
+        if len(file_paths) == 0:
+            return  # Cancelled
 
-        # Replace the placeholder text with the path
+        # Replace the placeholder text with the paths
         self.subtitle_field.delete(0, END)
-        self.subtitle_field.insert(0, file_path)
+        self.subtitle_field.insert(0, "; ".join(file_paths))
 
 
     def browse_save_event(self):
@@ -512,57 +600,26 @@ class Application(customtkinter.CTk):
         if not os.path.isfile(file_path):
             return
 
-        # Read the file
-        with open(file_path, "r") as timecodes_file:
-            lines = timecodes_file.read()
-
-        input = lines.split("\n")  # Split the lines into a list
-
-        try:
-            # Parse the lines into a list of times and a list of titles
-            times, titles = parse(input)
-
-            # If the lists are empty, raise an error
-            if len(times) == 0 or len(titles) == 0:
-                raise ValueError("No chapters found.")
-        except ValueError as e:  # Just in case the file is not formatted correctly
-            Error_Window("Error", 
-                         str(e)+"\nPlease check the file formatting and try again.")
-            return
-
-        # Order the times and titles by time
-        times, titles = (list(t) for t in zip(*sorted(zip(times, titles))))
-
-        # Erase the table
-        for record in self.table.get_children():
-            self.table.delete(record)
-
-        # Add the timecodes and chapters to the table
-        for i in range(len(times)):
-            self.table.insert('', 'end', text=str(i), values=(times[i], titles[i]))
-
-        # Replace the placeholder text with the path
-        self.timecodes_field.delete(0, END)
-        self.timecodes_field.insert(0, file_path)
+        # Replace the table content with the chapters of the file (read in the background)
+        self.load_chapters(file_path)
 
 
     def row_selection(self):
         """Select a row and display the timecode and chapter in the entry fields"""
 
-        try:
-            # Get the selected row
-            selected_row = self.table.selection()[0]
-        except:
+        # Get the selected row
+        index = self.table.selected_index()
+        if index is None:
             return  # If the table is empty, do nothing
 
         # Get the values of the selected row
-        values = self.table.item(selected_row, "values")
+        start_ms, title = self.chapter_list[index]
 
         # Display the values in the entry fields
         self.time_entry.delete(0, END)
-        self.time_entry.insert(0, values[0])
+        self.time_entry.insert(0, ms_to_timecode(start_ms))
         self.chapter_entry.delete(0, END)
-        self.chapter_entry.insert(0, values[1])
+        self.chapter_entry.insert(0, title)
 
 
     def add_button(self):
@@ -581,35 +638,22 @@ class Application(customtkinter.CTk):
             return
 
         chapter = self.chapter_entry.get()
+        start_ms = timecode_to_ms(timecode)
 
-        # Get current table content
-        times = [self.table.item(record)["values"][0]
-                 for record in self.table.get_children()]
-        chapters = [str(self.table.item(record)["values"][1])
-                    for record in self.table.get_children()]
-
-        # Checks if the timecode is already in the table
-        if timecode in times:
+        # Checks if the timecode is already in the table (binary search in the sorted chapters)
+        if start_ms in self.chapter_list:
             msg = f"The timecode \"{timecode}\" is already a chapter !\n"\
                 "Do you want to replace it ?"
             answer = askyesno("Timecode already exists", msg)
-            if answer == True:
-                # Remove the old timecode and chapter from times, chapters
-                index = times.index(timecode)
-                times.pop(index)
-                chapters.pop(index)
-            else:
+            if answer == False:
                 return
 
         # Escape special characters in the chapter name with dedicated function (Not needed anymore)
         #chapter = escape_characters(chapter)
 
-        # Add the new timecode and chapter to the lists
-        times.append(timecode)
-        chapters.append(chapter)
-
-        # Replace the table content with the new lists
-        self.add_to_table(times, chapters)
+        # Add the new timecode and chapter to the list, and show its row in the table
+        index, replaced = self.chapter_list.add(start_ms, chapter)
+        self.table.see(index)
 
         # Resize the chapter column if needed
         self.resize_table(chapter)
@@ -622,22 +666,22 @@ class Application(customtkinter.CTk):
     def clear_line(self):
         """Clear the selected line in the table"""
 
-        # Get the index of the selected line
-        try:
-            index = self.table.selection()[0]
-            timecode_table = self.table.item(index)["values"][0]
-            chapter_table = str(self.table.item(index)["values"][1])
-        except IndexError as e:
+        # Get the selected line
+        index = self.table.selected_index()
+        if index is None:
             # No line selected
             return
+        start_ms, chapter_table = self.chapter_list[index]
+        timecode_table = ms_to_timecode(start_ms)
 
         # Check if the timecode and chapter are the same as the input fields (otherwise it might be a mistake)
         timecode_entry = self.time_entry.get()
         chapter_entry = self.chapter_entry.get()
 
         if timecode_entry == timecode_table and chapter_entry == chapter_table:
-            # Delete the line
-            self.table.delete(index)
+            # Delete the chapter and its line
+            self.chapter_list.remove(start_ms)
+            self.table.select(None)
 
             # Clear the input fields
             self.time_entry.delete(0, END)
@@ -649,7 +693,7 @@ class Application(customtkinter.CTk):
 
 
     def Ok_button_event(self):
-        """Checks if the inputs are valid and puts the data in variables to access from the main program"""
+        """Checks if the inputs are valid and queues the job (the files are probed in the job, see prepare_job)"""
 
         self.get_metadata()  # Get the metadata from the input fields (even if they are empty)
 
@@ -661,59 +705,174 @@ class Application(customtkinter.CTk):
             return
 
         # ========== Main program ==========
+        # The values are copied in the job : the fields can be changed while it runs
+        job = {"movie_file": self.movie_file, "output_file": self.output_file, "subtitle_files": self.subtitle_files,
+               "times": self.times, "chapters": self.chapters,
+               "movie_title": self.movie_title, "author": self.author, "movie_year": self.movie_year,
+               "cmd": None, "metadata": ""}  # Set by prepare_job
 
-        # If the table is not empty, create the metadata file
-        if len(self.times) != 0:
-            try:
-                self.create_metadata()  # Create the metadata file
-                self.add_chapters()  # Add the chapters to the metadata file
-            except AssertionError:
-                err = "The video is shorter than the last timecode.\n"\
-                      "Please check the timecodes."
-                Error_Window("Error", err)
-                return
-        # Handle the case where the table is empty but the metadata is not
-        elif self.movie_title != "" or self.author != "" or self.movie_year != "":
-            self.create_metadata()  # Create the metadata file without chapters
-        else:
-            # No metadata file, but we still need to pass a value to the rest of the code
-            self.metadata_file = ""
+        # Run the job in the background : the window stays responsive and other files can be queued meanwhile
+        self.submit_job(job)
+
+
+    def prepare_job(self, job):
+        """Detects the languages of the subtitles, probes the movie file and creates the metadata and the ffmpeg command
+        of a job (in a worker thread of the runner, the window is not used)
+
+        Raises:
+            ValueError: If a subtitle file is invalid, or the video is shorter than the last timecode
+            OSError: If the movie file can't be probed
+
+        Returns:
+            duration_ms (int): The duration of the video, for the progress
+        """
+
+        # If the output file already exists, delete it when the job starts (The user has then already been asked if he wants to overwrite it by tkinter)
+        if os.path.isfile(job["output_file"]):
+            os.remove(job["output_file"])
 
-        # If the output file already exists, delete it (The user has then already been asked if he wants to overwrite it by tkinter)
-        if os.path.isfile(self.output_file):
-            os.remove(self.output_file)
+        # All the files are checked and their languages detected at the same time (raises a ValueError if a file is invalid)
+        with span("language_detection", files=len(job["subtitle_files"])):
+            subtitles = self.detect_subtitles(job["subtitle_files"])
 
-        # Create the command
-        cmd = "ffmpeg -y "  # Overwrite the output file if it already exists
-        file_input = f"-i \"{self.movie_file}\" "
+        info = probe_file(job["movie_file"])  # The probe is cached on disk
+
+        # If the table is not empty, create the metadata
+        with span("metadata", chapters=len(job["times"])) as fields:
+            if len(job["times"]) != 0:
+                metadata = self.add_chapters(job, info.duration_ms)  # Create the metadata with the chapters
+            # Handle the case where the table is empty but the metadata is not
+            elif job["movie_title"] != "" or job["author"] != "" or job["movie_year"] != "":
+                metadata = self.create_metadata(job)  # Create the metadata without chapters
+            else:
+                # No metadata, but we still need to pass a value to the rest of the code
+                metadata = ""
+            fields["bytes"] = len(metadata.encode("utf-8"))
+
+        # Create the command (a list of arguments)
+        cmd = ['ffmpeg', '-y']  # Overwrite the output file if it already exists
+        file_input = ['-i', job["movie_file"]]
         # Keep pthe metadata from the input file, add the metadata from the metadata file
-        args_metadata = "-map_metadata 0 -map_metadata 1 -codec copy "
-        # Add the subtitles to the metadata
-        args_subtitles = "-c:s mov_text -metadata:s:s:0 language="
-        output = f" \"{self.output_file}\""
-        error_args = " -v error"  # Only display the errors
-
-        # Add the metadata to the video
-        if os.path.isfile(self.metadata_file):
-            metadata_input = f"-i \"{self.metadata_file}\" "
-        else:
-            metadata_input = ""  # If there is no metadata file, don't add it to the command
+        args_metadata = ['-map_metadata', '0', '-map_metadata', '1', '-codec', 'copy']
+        output = [job["output_file"]]
+        error_args = ['-v', 'error']  # Only display the errors
 
-        # Add the subtitles to the video
-        if os.path.isfile(self.subtitle_file):
-            subtitle_imput = f"-i \"{self.subtitle_file}\" "
-            lang = self.detect_language(self.subtitle_file)
+        # Add the metadata to the video (read by ffmpeg from stdin)
+        if metadata != "":
+            metadata_input = METADATA_INPUT
         else:
-            # If there is no subtitle file, don't add it to the command, nor the language
-            subtitle_imput = ""
-            lang = ""
+            metadata_input = []  # If there is no metadata, don't add it to the command
+
+        # Add the subtitles to the video, all in the same ffmpeg pass
+        subtitle_inputs, args_subtitles = subtitle_arguments(subtitles, job["output_file"],
+                                                             first_input=1 if metadata_input == [] else 2,
+                                                             existing_subtitles=len(info.subtitle_streams))
+
+        job["cmd"] = cmd + file_input + metadata_input + subtitle_inputs + \
+            args_metadata + args_subtitles + output + error_args + PROGRESS_ARGS
+        job["metadata"] = metadata
+        return info.duration_ms
 
-        # Run ffmpeg (Handle final error with a yes/no popup + open terminal in debug mode??)
-        ffmpeg_cmd = cmd + file_input + metadata_input + subtitle_imput + \
-            args_metadata + args_subtitles + lang + output + error_args
+
+    def submit_job(self, job):
+        """Queues a job. The jobs are prepared in a worker thread (see prepare_job), and their ffmpeg commands run one
+        at a time by the runner thread (see Runner.py). Their progress and results are sent back to the window through
+        self.events (see poll_events)"""
+
+        import asyncio  # Only needed once a job is submitted (loaded with the runner)
+
+        output_file = job["output_file"]
+
+        # Outcome of the job, read by job_finished
+        job.update({"task": None, "result": None, "error": None, "cancelled": False})
+
+        async def run():
+            job["task"] = asyncio.current_task()  # Cancelled in the event loop by cancel_button_event
+            try:
+                if job["cancelled"]:
+                    raise asyncio.CancelledError  # Cancelled before it started
+
+                # Probing and language detection don't block the window, nor the event loop of the runner
+                duration_ms = await asyncio.get_running_loop().run_in_executor(None, self.prepare_job, job)
+                progress = Progress(duration_ms, callback=lambda progress: self.events.put(("progress", job, progress)))
+                with span("remux", file=output_file) as fields:
+                    job["result"] = await self.runner.run(job["cmd"], input=job["metadata"].encode("utf-8"), stdout_callback=progress.feed)
+                    fields["bytes"] = os.path.getsize(output_file) if os.path.isfile(output_file) else 0
+            except asyncio.CancelledError:
+                # ffmpeg has been killed by the runner, remove the partial output
+                job["cancelled"] = True
+                if job["cmd"] is not None and os.path.isfile(output_file):
+                    os.remove(output_file)
+                raise
+            except Exception as e:
+                job["error"] = e
+            finally:
+                # Sent once ffmpeg is stopped and the output cleaned up : the next job can be shown
+                self.events.put(("finished", job, None))
+
+        job["future"] = self.runner.submit(run())
+        self.jobs.append(job)
+        self.show_progress()
+
+
+    def poll_events(self):
+        """Handles the events sent by the jobs (called every 100 ms with after())"""
+
+        try:
+            while True:
+                event, job, progress = self.events.get_nowait()
+                if event == "progress":
+                    self.progress = progress
+                    self.show_progress()
+                elif event == "requirements":
+                    # ffmpeg or ffprobe is missing (see check_tools)
+                    Error_Window("Error", progress)
+                    if self._runner is not None:
+                        self._runner.close()
+                    self.destroy()
+                    return
+                else:
+                    self.job_finished(job)
+        except queue.Empty:
+            pass
+
+        self.after(100, self.poll_events)
+
+
+    @property
+    def runner(self):
+        if self._runner is None:
+            from Runner import Runner
+            self._runner = Runner(max_jobs=1)
+        return self._runner
+
+
+    def check_tools(self):
+        """Checks that ffmpeg and ffprobe are installed (in a background thread, the result is sent through self.events)"""
+        try:
+            check_requirements()
+        except OSError as e:
+            self.events.put(("requirements", None, str(e)))
+
+
+    def job_finished(self, job):
+        """Shows the result of a finished (or cancelled) job"""
+
+        self.jobs.remove(job)
+        self.progress = None
+        self.show_progress()
+
+        if job["cancelled"]:
+            self.progress_label.configure(text="Cancelled")
+            return
+
+        if job["cmd"] is None:
+            # The job failed before ffmpeg was run (invalid subtitles or chapters, see prepare_job)
+            Error_Window("Error", str(job["error"]))
+            return
 
         try:  # Should allways work, but just in case
-            if subprocess.run(ffmpeg_cmd, capture_output=True, creationflags=CREATE_NO_WINDOW).returncode != 0:
+            if job["result"] is None or not job["result"].ok:
                 raise OSError("FFMPEG encountered an error")
 
         except OSError as e:  # If FFmpeg encounters an error
@@ -724,8 +883,17 @@ class Application(customtkinter.CTk):
                 answer = askyesno("Error", msg)
 
                 if answer == True:
+                    ffmpeg_cmd = job["cmd"]
+                    # The terminal can't use the pipe, so the metadata is written next to the output file
+                    if job["metadata"] != "":
+                        metadata_file = os.path.splitext(job["output_file"])[0] + "_metadata.txt"
+                        with open(metadata_file, "w") as f:
+                            f.write(job["metadata"])
+                        index = ffmpeg_cmd.index(METADATA_INPUT[-1])
+                        ffmpeg_cmd = ffmpeg_cmd[:index-3] + ['-i', metadata_file] + ffmpeg_cmd[index+1:]
+
                     # Open the terminal with the command
-                    os.system("start cmd /k " + ffmpeg_cmd)
+                    os.system("start cmd /k " + subprocess.list2cmdline(ffmpeg_cmd))
 
             else:
                 msg = f"FFMPEG encountered an error.\n\n"\
@@ -735,23 +903,72 @@ class Application(customtkinter.CTk):
             return
 
         # Open folder after the process is finished (comment this line if you don't want to open the folder)
-        os.startfile(os.path.dirname(self.output_file))
+        os.startfile(os.path.dirname(job["output_file"]))
+
+        # Print the metadata given to ffmpeg if debug mode is on
+        if self.debug_mode == True:
+            print(job["metadata"])
+
+
+    def show_progress(self):
+        """Shows the progress of the current job and the number of queued jobs"""
+
+        if len(self.jobs) == 0:
+            self.progress_bar.set(0)
+            self.progress_label.configure(text="")
+            return
+
+        text = str(self.progress) if self.progress is not None else "Starting..."
+        if len(self.jobs) > 1:
+            text += f"  (+{len(self.jobs)-1} queued)"
 
-        # Delete the metadata file if debug mode is off
-        if self.debug_mode == False:
-            os.remove(self.metadata_file)
+        self.progress_bar.set(self.progress.percent / 100 if self.progress is not None else 0)
+        self.progress_label.configure(text=text)
+
+
+    def cancel_button_event(self):
+        """Cancels the running job (ffmpeg is killed and the partial output removed), or closes the window if there is none"""
+
+        if len(self.jobs) == 0:
+            self.on_closing()
+            return
+
+        job = self.jobs[0]
+
+        def cancel():
+            # In the event loop of the runner : the job removes its partial output, then sends its "finished" event
+            if job["task"] is None:
+                job["cancelled"] = True  # Not started yet
+            else:
+                job["task"].cancel()  # No effect if it is already done
+
+        self.runner.call_soon(cancel)
 
 
     def debug_switch_event(self):
         self.debug_mode = not self.debug_mode
 
+        # In debug mode, the duration of each stage is written to a trace file (see Trace.py)
         if self.debug_mode == True:
-            print("Debug mode enabled")
+            trace_file = os.path.join(os.path.dirname(default_cache_path()), "trace.jsonl")
+            os.makedirs(os.path.dirname(trace_file), exist_ok=True)
+            enable_trace(trace_file)
+            print("Debug mode enabled (trace written to " + trace_file + ")")
         else:
+            enable_trace(None)
             print("Debug mode disabled")
 
 
     def on_closing(self):
+        # Ask before cancelling the running jobs
+        if len(self.jobs) != 0:
+            msg = f"{len(self.jobs)} job(s) are still running or queued.\n"\
+                  "Do you want to cancel them and quit ?"
+            if askyesno("Jobs running", msg) == False:
+                return
+
+        if self._runner is not None:
+            self._runner.close()  # Cancels the jobs and kills ffmpeg
         self.destroy()
 
 
@@ -770,22 +987,18 @@ class Application(customtkinter.CTk):
             raise ValueError(msg)
 
         # ========= Subtitles ==========
-        self.subtitle_file = self.subtitle_field.get()
-        self.subtitle_language = self.detect_language(self.subtitle_file)
+        self.subtitle_files = [path.strip() for path in self.subtitle_field.get().split(";") if path.strip() != ""]
 
-        # If the subtitle file do not exists
-        if not os.path.isfile(self.subtitle_file) and self.subtitle_file != "":
-            msg = f"The subtitle file \"{os.path.basename(self.subtitle_file)}\" does not exist."
-            raise ValueError(msg)
+        # (The files are checked and their languages detected in the job, see prepare_job)
 
         # ========= Chapters ==========
-        self.times = [self.table.item(record)["values"][0]
-                      for record in self.table.get_children()]
-        self.chapters = [str(self.table.item(record)["values"][1])
-                         for record in self.table.get_children()]
+        if self.loading is not None:
+            raise ValueError("The chapters file is still loading, please wait.")
+        self.times = self.chapter_list.starts()  # In ms, to keep the milliseconds of the chapters files
+        self.chapters = self.chapter_list.titles()
 
         # If the table is empty, there is no subtitle file and no metadata, raise an error
-        if len(self.times) == 0 and self.subtitle_file == ""\
+        if len(self.times) == 0 and len(self.subtitle_files) == 0 \
                                 and self.movie_title == "" \
                                 and self.author == "" \
                                 and self.movie_year == "":
@@ -804,7 +1017,7 @@ class Application(customtkinter.CTk):
             self.output_file = os.path.splitext(self.movie_file)[0] + "_Shear" + self.movie_file_extension
             n = 1
             # If the file already exists, add a number to the name
-            while os.path.isfile(self.output_file):
+            while self.output_taken(self.output_file):
                 self.output_file = os.path.splitext(self.movie_file)[0] + f"_Shear({n})"+self.movie_file_extension
                 n += 1
             
@@ -840,7 +1053,7 @@ class Application(customtkinter.CTk):
         if self.movie_file == self.output_file:
             n = 1
             # If the file already exists, add a number to the name
-            while os.path.isfile(self.output_file):
+            while self.output_taken(self.output_file):
                 self.output_file = os.path.splitext(self.movie_file)[0] + f"_Shear({n})"+self.movie_file_extension
                 n += 1
                 
@@ -855,6 +1068,17 @@ class Application(customtkinter.CTk):
                 self.save_field.delete(0, END)
                 self.save_field.insert(0, self.output_file) # Put the new output file in the field
 
+        # The queued jobs write their output when they start : two jobs can't have the same output file
+        if self.output_file in [job["output_file"] for job in self.jobs]:
+            msg = f"The file \"{os.path.basename(self.output_file)}\" is already the output of a queued job."
+            raise ValueError(msg)
+
+
+    def output_taken(self, path):
+        """Checks if an output file name is already used, by a file or by a queued job"""
+
+        return os.path.isfile(path) or path in [job["output_file"] for job in self.jobs]
+
 
     def get_metadata(self):
         """Puts the input metadata in variables"""
@@ -864,87 +1088,38 @@ class Application(customtkinter.CTk):
         self.movie_year = self.year_field.get()
 
 
-    def create_metadata(self):
-        """Creates a metadata file with only title, author and year"""
-
-        # Creating the metadata file, and adding the title, author and year (source : http://underpop.online.fr/f/ffmpeg/help/metadata.htm.gz)
-        path = os.getcwd()
-        with open(path+"/metadata.txt", "w") as f:
-            f.write(';FFMETADATA1\n')
-            f.write('title='+self.movie_title +
-                    '\n') if self.movie_title != '' else None
-            f.write('date='+self.movie_year +
-                    '\n') if self.movie_year != '' else None
-            f.write('artist='+self.author+'\n') if self.author != '' else None
-            f.write('\n')
-
-        self.metadata_file = path+"/metadata.txt"
-
-
-    def add_chapters(self):
-        """Creates a metadata file with chapters and subtitles"""
-
-        # Convert the times in milliseconds
-        times_ms = [timecode_to_ms(time) for time in self.times]
-
-        # Checks if the video is longer than the last timecode (source : https://ffmpeg.org/ffprobe.html#Main-options)
-        video_time_s = float(subprocess.check_output(
-            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', self.movie_file]).decode('utf-8'))
-        #os.popen("ffprobe -i \""+movie_file+"\" -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1").read()
-        video_time_ms = int(float(video_time_s)*1000)
-
-        assert video_time_ms > times_ms[-1], "The video is shorter than the last timecode."
-
-        # Adding the chapters to the metadata file (already created)
-        with open(self.metadata_file, "a") as f:
-
-            # Writing the timecodes and titles in the metadata file
-            for i in range(len(times_ms)-1):
-                f.write('[CHAPTER]\n')
-                f.write('TIMEBASE=1/1000\n')
-                f.write('# Chapter '+str(i+1)+' starts at '+self.times[i]+'\n')
-                f.write('START='+str(times_ms[i])+'\n')
-                f.write('# Chapter '+str(i+1)+' ends at ' +
-                        self.times[i+1]+' (minus 1 millisecond)\n')
-                f.write('END='+str(times_ms[i+1]-1)+'\n')
-                f.write('title='+self.chapters[i]+'\n\n')
-
-            # Writing the last timecode and title in the metadata file
-            i = len(times_ms)-1
-            f.write('[CHAPTER]\n')
-            f.write('TIMEBASE=1/1000\n')
-            f.write('# Chapter '+str(i+1)+' starts at '+self.times[i]+'\n')
-            f.write('START='+str(times_ms[i])+'\n')
-            f.write('# Chapter '+str(i+1)+' ends at ' +
-                    ms_to_timecode(video_time_ms)+' (minus 1 millisecond)\n')
-            f.write('END='+str(video_time_ms)+'\n')
-            f.write('title='+self.chapters[i]+'\n\n')
-
-
-#%% Check system requirements
-
-# Check if ffmpeg is installed
-try:
-    subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE,
-                   stderr=subprocess.PIPE, check=True, creationflags=CREATE_NO_WINDOW)
-except:
-    err = "ffmpeg is not installed. Please install it before running this app. (https://ffmpeg.org/)"
-    Error_Window("Error", err)
-    raise SystemExit(err)
-
-# Check if ffprobe is installed
-try:
-    subprocess.run(['ffprobe', '-version'], stdout=subprocess.PIPE,
-                   stderr=subprocess.PIPE, check=True, creationflags=CREATE_NO_WINDOW)
-except:
-    err = "ffprobe is not installed. Please install it before running this app. (https://ffmpeg.org/)"
-    Error_Window("Error", err)
-    raise SystemExit(err)
+    @staticmethod
+    def create_metadata(job):
+        """Returns the metadata with only title, author and year"""
+
+        return build_metadata([], [], 0, job["movie_title"], job["author"], job["movie_year"])
+
+
+    @staticmethod
+    def add_chapters(job, video_time_ms):
+        """Returns the metadata with title, author, year and chapters
+
+        Raises:
+            ValueError: If the video is shorter than the last timecode
+        """
+
+        # Checks if the video is longer than the last timecode (the times are in milliseconds)
+        if video_time_ms <= job["times"][-1]:
+            raise ValueError("The video is shorter than the last timecode.\n"\
+                             "Please check the timecodes.")
+
+        chapters = zip(job["times"], job["chapters"])
+        return "".join(iter_metadata(chapters, video_time_ms, job["movie_title"], job["author"], job["movie_year"]))
 
 
 #%% Call the app
-app = Application()
-app.mainloop()
+# (ffmpeg and ffprobe are checked in the background by the application)
+if __name__ == "__main__":
+    # The splash screen stays until the window of the application is drawn
+    # (the application is the default root of tkinter, not the splash screen, see Splash.py)
+    app = Application()
+    app.after_idle(splash.close)
+    app.mainloop()
 
 # TODO : in README.md, add ffmpeg installation and how to add it to the PATH
 
@@ -972,4 +1147,4 @@ app.mainloop()
 
 # Q : How to compile the code into an executable ?
 # ANSWER : The following command, replacing [.] by the path to the Shears code 
-# pyinstaller --noconfirm --onefile --windowed --icon "[.]/Shears/Ressources/Shears_icon.ico" --name "Shears" --add-data "[.]/customtkinter;customtkinter/" --add-data "[.]/Shears/Ressources/Shears_icon.ico;Ressources/"  "[.]/Shears/Builds/Shears_UI.py"
\ No newline at end of file
+# pyinstaller --noconfirm --onefile --windowed --icon "[.]/Shears/Ressources/Shears_icon.ico" --name "Shears" --add-data "[.]/customtkinter;customtkinter/" --add-data "[.]/Shears/Ressources/Shears_icon.ico;Ressources/" --add-data "[.]/Shears/Ressources/Splash.png;Ressources/"  "[.]/Shears/Builds/Shears_UI.py"
\ No newline at end of file
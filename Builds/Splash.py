@@ -0,0 +1,46 @@
+##################################################################
+## Splash.py : Splash screen shown while the graphical          ##
+## interface loads its modules (only uses tkinter, to be fast). ##
+##################################################################
+
+import tkinter as tk
+
+
+class Splash():
+    """A borderless window with an image, centered on the screen, shown until close() is called.
+    It is not the default root of tkinter (used by the dialogs and the fonts without master) : the main window,
+    created while the splash screen is shown, becomes the default root and can close it once drawn (with after_idle)."""
+
+    def __init__(self, image_path):
+        """
+        Args:
+            image_path (str): The path to the image (PNG or GIF, read by tkinter without PIL)
+        """
+        self.root = None
+        try:
+            # Same as the temporary roots of tkinter : this Tk is not made the default root
+            support_default_root = tk._support_default_root
+            tk._support_default_root = False
+            try:
+                self.root = tk.Tk()
+            finally:
+                tk._support_default_root = support_default_root
+            self.root.overrideredirect(True) # No title bar nor borders
+            self.image = tk.PhotoImage(master=self.root, file=image_path)
+            tk.Label(self.root, image=self.image, borderwidth=0).pack()
+
+            # Centered on the screen
+            width, height = self.image.width(), self.image.height()
+            x = (self.root.winfo_screenwidth() - width) // 2
+            y = (self.root.winfo_screenheight() - height) // 2
+            self.root.geometry(f"{width}x{height}+{x}+{y}")
+
+            self.root.update() # Drawn now, the main loop is not running yet
+        except tk.TclError:
+            # No display or image not readable : no splash screen, the application starts anyway
+            self.close()
+
+    def close(self):
+        if self.root is not None:
+            self.root.destroy()
+            self.root = None
@@ -0,0 +1,203 @@
+##################################################################
+## Split.py : Cuts a video file into one file per chapter, with ##
+## the segment muxer of ffmpeg (the video is only read once).   ##
+##################################################################
+## The pieces are stream copies, so each one starts at the      ##
+## first keyframe at or after the start of its chapter. They    ##
+## are named and tagged with the titles of the chapters.        ##
+##################################################################
+
+import os
+import re
+import csv
+
+from Functions import (METADATA_INPUT, PROGRESS_ARGS, probe_file, open_chapters, iter_metadata, resolve_output_file,
+                       remux, ms_to_timecode)
+from Errors import InputError, ChaptersError
+from Trace import span
+
+# Characters which can't be used in file names (on Windows)
+FORBIDDEN_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+def piece_name(base, number, count, title):
+    """Returns the file name of a piece, without extension : "<base> - 03 - <title>"
+
+    Args:
+        base (str): The name shared by the pieces (e.g. the movie title)
+        number (int): The number of the chapter, from 1
+        count (int): The number of chapters (for the number of digits)
+        title (str): The title of the chapter ("Chapter N" if empty)
+    """
+    title = FORBIDDEN_CHARACTERS.sub("_", title).strip(" .")[:100]
+    if title == '':
+        title = f"Chapter {number}"
+    return f"{base} - {number:0{max(2, len(str(count)))}d} - {title}"
+
+
+def split_command(movie_file, pattern, starts_ms, segment_list, progress=False, readrate=None):
+    """Returns the ffmpeg arguments to cut a video at the given times, in a single pass with stream copy
+    (source : https://ffmpeg.org/ffmpeg-formats.html#segment). The global metadata is read from stdin.
+
+    Args:
+        movie_file (str): The path to the video file
+        pattern (str): The path of the pieces, with a %03d for their number (from 0)
+        starts_ms (list): The start times of the pieces in milliseconds, after the first one
+        segment_list (str): The path to the CSV file where ffmpeg lists the pieces (name, start, end)
+        progress (bool, optional): ffmpeg writes its progress to stdout (see Progress.py). Defaults to False.
+        readrate (float, optional): Speed of the reading compared to real time (see Governor.Limits.readrate). Defaults to None.
+    """
+    readrate_arguments = ['-readrate', f"{readrate:.6g}"] if readrate is not None else []
+    times = ",".join(f"{start_ms / 1000:.3f}" for start_ms in starts_ms)
+    return ['ffmpeg', '-y'] + readrate_arguments + ['-i', movie_file] + METADATA_INPUT + \
+           ['-map', '0', '-map', '-0:d?', '-map_metadata', '1', '-map_chapters', '-1', '-codec', 'copy',
+            '-f', 'segment', '-reset_timestamps', '1', '-segment_list', segment_list, '-segment_list_type', 'csv'] + \
+           (['-segment_times', times] if times != '' else []) + [pattern, '-v', 'error'] + (PROGRESS_ARGS if progress else [])
+
+
+def _read_chapters(movie_file, chapters, info):
+    """Returns the chapters to split at, as a list of (start time in ms, title), checking their order"""
+
+    if chapters is None:
+        # Chapters already in the file
+        chapters = [(start_ms, title) for start_ms, end_ms, title in info.chapters]
+        if len(chapters) == 0:
+            raise ChaptersError(f"The file \"{os.path.basename(movie_file)}\" has no chapters, give a chapters file to split it")
+    elif isinstance(chapters, str):
+        try:
+            chapters = list(open_chapters(chapters))
+        except OSError as e:
+            raise ChaptersError(f"The chapters file can't be read : {e}") from e
+    else:
+        chapters = list(chapters)
+        if len(chapters) == 0:
+            raise ChaptersError("No chapters given")
+
+    for (previous_ms, _), (start_ms, title) in zip(chapters, chapters[1:]):
+        if start_ms <= previous_ms:
+            raise ChaptersError(f"The chapter \"{title}\" ({ms_to_timecode(start_ms)}) starts before the previous one")
+    if chapters[-1][0] >= info.duration_ms > 0:
+        raise ChaptersError("The video is shorter than the last timecode. Please check the timecodes.")
+    return chapters
+
+
+def _timecode(ms):
+    """Returns a timecode with its milliseconds, if any (two chapters can start in the same second)"""
+    return ms_to_timecode(ms) + (f".{ms % 1000:03d}" if ms % 1000 != 0 else "")
+
+
+def _check_segments(chapters, segments):
+    """Checks that ffmpeg wrote one piece per chapter. The segment muxer lists one piece per cut, in order, each one
+    starting at the first keyframe at or after its cut : the i-th piece is the i-th chapter, unless the keyframe
+    comes after the start of the next chapter (the next pieces are then shifted, and the last ones missing).
+
+    Args:
+        chapters (list): The chapters, as (start time in ms, title)
+        segments (list): The (file name, start time in s) of the pieces, from the segment list of ffmpeg
+
+    Raises:
+        ChaptersError: If a chapter has no keyframe before the next chapter (or the end of the video)
+    """
+    for i, (start_ms, title) in enumerate(chapters[1:], start=1):
+        last = i + 1 == len(chapters)
+        if i >= len(segments) or (not last and round(segments[i][1] * 1000) >= chapters[i + 1][0]):
+            raise ChaptersError(f"The chapter \"{title}\" ({_timecode(start_ms)}) has no keyframe before "
+                                + ("the end of the video" if last else f"the next chapter ({_timecode(chapters[i + 1][0])})")
+                                + " : it can't be cut without re-encoding the video")
+
+
+def _write_title(path, title, author, year):
+    """Writes the title of a piece in place, as its only chapter (and as its title in MP4 files)"""
+    from Matroska import MATROSKA_EXTENSIONS, write_chapters as write_matroska # Loaded on first use
+    from MP4 import MP4_EXTENSIONS, write_chapters as write_mp4
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in MATROSKA_EXTENSIONS:
+        write_matroska(path, [(0, title)])
+    elif extension in MP4_EXTENSIONS:
+        write_mp4(path, [(0, title)], title, author, year)
+
+
+def split_movie(movie_file, chapters=None, output='', movie_title='', author='', year='', overwrite="ask",
+                progress_callback=None, limits=None):
+    """Cuts a video file into one file per chapter, in the folder of the video, reading it only once.
+    The part before the first chapter is kept in the first piece.
+
+    Args:
+        movie_file (str): The path to the video file
+        chapters (str or iterable, optional): The path to a chapters file, or the chapters as (start time in ms, title).
+                                              Defaults to None (the chapters already in the video file).
+        output (str, optional): Name shared by the pieces, "<output> - 01 - <title>". Defaults to the movie title, or the file name.
+        movie_title (str, optional): Title of the movie. Defaults to ''.
+        author (str, optional): Author of the movie, written in the pieces. Defaults to ''.
+        year (str, optional): Year of the movie, written in the pieces. Defaults to ''.
+        overwrite (str, optional): One of Functions.OVERWRITE_POLICIES, for each piece. Defaults to "ask".
+        progress_callback (function, optional): Called with a Progress object while ffmpeg runs. Defaults to None.
+        limits (Limits, optional): Priority, CPUs and read throughput of ffmpeg (see Governor.py). Defaults to None.
+
+    Raises:
+        InputError: If the movie file doesn't exist
+        ChaptersError: If there are no chapters, they are not in order, or two of them start before the same keyframe
+        OutputExistsError: If a piece exists and must not be overwritten
+        ProbeError: If ffprobe fails
+        FFmpegError: If ffmpeg fails
+
+    Returns:
+        pieces (list): The paths to the created files, in order
+        warnings (list): The pieces whose title couldn't be written in the file (only in their name)
+    """
+    if not os.path.isfile(movie_file):
+        raise InputError(f"The movie file \"{movie_file}\" does not exist.")
+
+    info = probe_file(movie_file)
+    chapters = _read_chapters(movie_file, chapters, info)
+
+    # Names of the pieces
+    folder = os.path.dirname(movie_file)
+    stem, extension = os.path.splitext(os.path.basename(movie_file))
+    base = output or movie_title or stem
+    if os.path.splitext(base)[1].lower() == extension.lower():
+        base = os.path.splitext(base)[0]
+    names = [resolve_output_file(os.path.join(folder, piece_name(base, i + 1, len(chapters), title) + extension), overwrite)
+             for i, (start_ms, title) in enumerate(chapters)]
+
+    # ffmpeg writes numbered pieces, renamed when they are all written
+    temporary = os.path.join(folder, "." + base + ".split")
+    temporary_pieces = [temporary + f"{i:03d}" + extension for i in range(len(chapters))]
+    segment_list = temporary + ".csv"
+    readrate = limits.readrate(os.path.getsize(movie_file), info.duration_ms) if limits else None
+    command = split_command(movie_file, temporary.replace("%", "%%") + "%03d" + extension, [start_ms for start_ms, title in chapters[1:]],
+                            segment_list, progress_callback is not None, readrate)
+
+    with span("split", file=movie_file, pieces=len(chapters)) as fields:
+        try:
+            metadata = iter_metadata([], info.duration_ms, '', author, year) # Only the author and the year
+            remux(command, temporary_pieces[0], metadata, info.duration_ms, progress_callback, limits)
+            with open(segment_list, newline='', encoding="utf-8") as f:
+                segments = [(row[0], float(row[1])) for row in csv.reader(f) if len(row) >= 2]
+            _check_segments(chapters, segments)
+        except BaseException:
+            # Nothing is left behind
+            for path in temporary_pieces:
+                if os.path.isfile(path):
+                    os.remove(path)
+            raise
+        finally:
+            if os.path.isfile(segment_list):
+                os.remove(segment_list)
+
+        # The pieces are listed in the order of the chapters (see _check_segments)
+        pieces = []
+        warnings = []
+        for index, (name, start) in enumerate(segments):
+            os.replace(os.path.join(folder, name), names[index])
+            pieces.append(names[index])
+
+            try:
+                _write_title(names[index], chapters[index][1] or f"Chapter {index + 1}", author, year)
+            except (OSError, ValueError) as e:
+                warnings.append(f"{names[index]} : {e}")
+
+        fields["bytes"] = sum(os.path.getsize(piece) for piece in pieces)
+
+    return pieces, warnings
@@ -0,0 +1,144 @@
+##################################################################
+## Timecodes.py : Vectorized parsing and conversion of          ##
+## timecodes, for very large chapter lists.                     ##
+##################################################################
+## Requirements: 	numpy                                       ##
+##################################################################
+
+import re # Regular expressions
+import numpy as np
+
+# A timecode alone on a line is [HH:]MM:SS[.mmm] (hours are optional, milliseconds too)
+_TIMECODE = r"(?:(\d+):)?(\d+):(\d+)(?:[.,](\d{1,3}))?"
+
+# A line with a timecode : the words before, the timecode, the words after.
+# The timecode must be a word of its own (separated by spaces), the first one found in the line is used.
+_LINE = re.compile(r"^([^\n]*?)(?<![^ \t\n])" + _TIMECODE + r"(?![^ \t\n])([^\n]*)", re.MULTILINE)
+
+# Only a timecode, used to validate lists of timecodes
+_ONLY_TIMECODE = re.compile(r"^" + _TIMECODE + r"$", re.MULTILINE)
+
+
+def _column(values):
+    """Converts digit strings (empty for 0) to an int64 array, the parsing being done by numpy in C"""
+    # Every value is prefixed with a 0, so that empty strings are 0 and the separators are kept
+    return np.fromstring("0" + " 0".join(values), dtype=np.int64, sep=" ")
+
+
+def _to_ms(hours, minutes, seconds, fraction):
+    """Converts the columns of strings found by the regular expressions to milliseconds
+
+    Args:
+        hours (tuple): The hours (empty strings if not given)
+        minutes (tuple): The minutes
+        seconds (tuple): The seconds
+        fraction (tuple): The fractions of seconds (empty strings if not given)
+
+    Returns:
+        ms (np.ndarray): The times in milliseconds (int64)
+    """
+    if len(seconds) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # The fraction of seconds is padded to milliseconds (".5" is 500 ms)
+    padding = 10 ** (3 - np.fromiter(map(len, fraction), dtype=np.int64, count=len(fraction)))
+
+    return _column(hours) * 3600000 + _column(minutes) * 60000 + _column(seconds) * 1000 + _column(fraction) * padding
+
+
+def parse_timecodes_buffer(text: str):
+    """Parses a whole text (the content of a chapters file) in a single pass of a compiled regular expression.
+    Each line with a timecode ([HH:]MM:SS[.mmm]) gives a chapter, the other words of the line being the title,
+    like Functions.parse_timecodes. Lines without timecodes are skipped.
+
+    Args:
+        text (str): The content of the chapters file
+
+    Returns:
+        times_ms (np.ndarray): The start times of the chapters in milliseconds (int64)
+        titles (list): The titles of the chapters
+    """
+    # Windows line endings would end up in the titles
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+
+    matches = _LINE.findall(text)
+    if len(matches) == 0:
+        return np.zeros(0, dtype=np.int64), []
+
+    before, hours, minutes, seconds, fraction, after = zip(*matches)
+
+    # The title is made of the words before and after the timecode, without the spaces around the timecode
+    titles = [(b[:-1] + " " + a[1:]) if b and a else (b[:-1] if b else a[1:]) for b, a in zip(before, after)]
+
+    return _to_ms(hours, minutes, seconds, fraction), titles
+
+
+def timecodes_to_ms(timecodes):
+    """Converts a list of timecodes ([HH:]MM:SS[.mmm]) to milliseconds
+
+    Args:
+        timecodes (list): A list (or array) of strings
+
+    Raises:
+        ValueError: If a timecode is not in the correct format
+
+    Returns:
+        ms (np.ndarray): The timecodes in milliseconds (int64)
+    """
+    timecodes = [str(timecode) for timecode in timecodes]
+    groups = _ONLY_TIMECODE.findall("\n".join(timecodes))
+
+    if len(groups) != len(timecodes):
+        # Find the first invalid timecode for the error message
+        for timecode in timecodes:
+            if _ONLY_TIMECODE.match(timecode) is None:
+                raise ValueError("The timecode is not in the correct format : " + timecode)
+        raise ValueError("The timecodes are not in the correct format")
+
+    return _to_ms(*zip(*groups)) if len(groups) != 0 else np.zeros(0, dtype=np.int64)
+
+
+def ms_to_timecodes(ms, milliseconds=False):
+    """Converts times in milliseconds to timecodes
+
+    Args:
+        ms (array_like): The times in milliseconds
+        milliseconds (bool, optional): Adds the milliseconds to the timecodes (HH:MM:SS.mmm). Defaults to False.
+
+    Returns:
+        timecodes (np.ndarray): The timecodes in the form HH:MM:SS (or HH:MM:SS.mmm), as strings
+    """
+    ms = np.asarray(ms, dtype=np.int64)
+
+    # Converting the time in hours, minutes, seconds and milliseconds
+    hours, rest = np.divmod(ms, 3600000)
+    minutes, rest = np.divmod(rest, 60000)
+    seconds, rest = np.divmod(rest, 1000)
+
+    # Fields of the timecodes, as (value, number of digits)
+    fields = [(hours, 2), (minutes, 2), (seconds, 2)]
+    if milliseconds:
+        fields.append((rest, 3))
+
+    # Timecodes with more than 99 hours don't have a fixed width, they are formatted as strings (slower)
+    if ms.size != 0 and (hours.max() > 99 or ms.min() < 0):
+        timecodes = np.char.zfill(hours.astype(str), 2)
+        for value, digits in fields[1:]:
+            separator = "." if digits == 3 else ":"
+            timecodes = np.char.add(np.char.add(timecodes, separator), np.char.zfill(value.astype(str), digits))
+        return timecodes
+
+    # Otherwise the ASCII codes of the characters are written in a table with one row per timecode
+    width = 12 if milliseconds else 8
+    table = np.empty((ms.size, width), dtype=np.uint8)
+    column = 0
+    for value, digits in fields:
+        if column != 0:
+            table[:, column] = ord("." if digits == 3 else ":") # Separator
+            column += 1
+        for power in range(digits-1, -1, -1):
+            table[:, column] = ord("0") + (value // 10**power) % 10
+            column += 1
+
+    return table.view(f"S{width}").reshape(ms.shape).astype(f"U{width}")
@@ -0,0 +1,132 @@
+##################################################################
+## Trace.py : Timing spans of the stages of a job (tool checks, ##
+## probe, metadata, language detection, remux), written as a    ##
+## JSONL trace, and optional cProfile dump of the Python side.  ##
+##################################################################
+## Each line of the trace is a JSON object :                    ##
+## {"stage": "remux", "start": 1700000000.123, "duration": 1.5, ##
+##  "bytes": 123456, "pid": 1234, ...}                          ##
+## (start is a UNIX time in seconds, duration in seconds)       ##
+##################################################################
+
+import os
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+
+class Tracer():
+    """Writes the timing spans of the stages to a JSONL file. Without a file, the spans cost nothing.
+    The file is set with enable_trace() or the SHEARS_TRACE environment variable (also read by the batch worker processes).
+
+    Usage:
+        with span("probe", file=movie_file) as fields:
+            ...
+            fields["bytes"] = len(data)
+    """
+
+    def __init__(self, path=None):
+        self.path = path # Path to the JSONL trace, None if disabled
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def write(self, stage, start, duration, fields):
+        """Appends a span to the trace (one line, so that several processes can write to the same file)"""
+
+        line = json.dumps({"stage": stage, "start": round(start, 6), "duration": round(duration, 6),
+                           "bytes": 0, "pid": os.getpid(), **fields}, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Measures the code in the with block. The yielded dictionary can be filled with more fields (e.g. bytes).
+        If the block raises an exception, its type is written in the "error" field."""
+
+        if not self.enabled:
+            yield fields
+            return
+
+        start = time.time()
+        counter = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.write(stage, start, time.perf_counter() - counter, fields)
+
+    def timed(self, stage, chunks, **fields):
+        """Yields the chunks of an iterator (e.g. iter_metadata) and writes one span with the time spent producing them
+        and their size, when the iterator is exhausted. Used for the stages streamed to another one."""
+
+        if not self.enabled:
+            yield from chunks
+            return
+
+        start = time.time()
+        duration = 0.0
+        size = 0
+        iterator = iter(chunks)
+        try:
+            while True:
+                counter = time.perf_counter()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    duration += time.perf_counter() - counter
+                size += len(chunk.encode("utf-8")) if isinstance(chunk, str) else len(chunk)
+                yield chunk
+        finally:
+            self.write(stage, start, duration, {"bytes": size, **fields})
+
+
+# Tracer of the process
+TRACER = Tracer(os.environ.get("SHEARS_TRACE") or None)
+
+
+def enable_trace(path):
+    """Writes the spans of this process, and of the processes it starts, to a JSONL file (None to disable)"""
+
+    TRACER.path = os.path.abspath(path) if path else None
+    if TRACER.path is None:
+        os.environ.pop("SHEARS_TRACE", None)
+    else:
+        os.environ["SHEARS_TRACE"] = TRACER.path
+
+
+def span(stage, **fields):
+    """Measures a stage with the tracer of the process, see Tracer.span"""
+    return TRACER.span(stage, **fields)
+
+
+def timed(stage, chunks, **fields):
+    """Measures a streamed stage with the tracer of the process, see Tracer.timed"""
+    return TRACER.timed(stage, chunks, **fields)
+
+
+@contextmanager
+def profile_to(path):
+    """Profiles the Python code in the with block with cProfile, and dumps the statistics to a file
+    (read them with `python -m pstats FILE` or snakeviz). Does nothing if path is empty."""
+
+    if not path:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,157 @@
+##################################################################
+## VirtualTable.py : Table which keeps its rows in Python and   ##
+## only creates the rows visible on screen in a ttk Treeview.   ##
+##################################################################
+
+from tkinter import ttk
+
+
+class VirtualTable():
+    """A ttk Treeview showing a window of the rows of a Python sequence (e.g. a ChapterList).
+    Whatever the number of rows, the Treeview only has as many items as the lines it can show :
+    scrolling changes the values of these items instead of creating new ones.
+
+    Usage:
+        table = VirtualTable(frame, ("Start time", "Chapter title"), rows, lambda row: (row[0], row[1]))
+        table.tree.grid(row=0, column=0, sticky="nswe")
+        table.scrollbar.grid(row=0, column=1, sticky="ns")
+        ...
+        table.refresh() # After the rows were changed
+    """
+
+    def __init__(self, master, columns, rows=(), format_row=tuple, height=9, rowheight=19, style="Treeview"):
+        """
+        Args:
+            master (widget): The parent of the Treeview and of its scrollbar
+            columns (tuple): The names of the columns
+            rows (sequence, optional): The rows, with len() and indexing. Defaults to ().
+            format_row (function, optional): Gives the values of the columns of a row. Defaults to tuple.
+            height (int, optional): Number of lines shown before the table is resized. Defaults to 9.
+            rowheight (int, optional): Height of a line in pixels (as in the style of the Treeview). Defaults to 19.
+            style (str, optional): The ttk style of the Treeview. Defaults to "Treeview".
+        """
+        self.rows = rows
+        self.format_row = format_row
+        self.rowheight = rowheight
+        self.lines = height # Number of lines shown, updated when the Treeview is resized
+        self.top = 0 # Index of the row on the first line
+        self.selected = None # Index of the selected row (it may be scrolled out of view)
+
+        self.tree = ttk.Treeview(master, style=style, columns=columns, height=height, show="headings", selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(master, orient="vertical", command=self.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+        self.tree.bind("<Configure>", self._resized)
+        self.tree.bind("<<TreeviewSelect>>", self._selected)
+        self.tree.bind("<MouseWheel>", self._wheel) # Windows and macOS
+        self.tree.bind("<Button-4>", lambda e: self._scroll_lines(-3)) # Linux
+        self.tree.bind("<Button-5>", lambda e: self._scroll_lines(3))
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self._move_selection(-self.lines))
+        self.tree.bind("<Next>", lambda e: self._move_selection(self.lines))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def refresh(self):
+        """Shows the rows from self.top in the lines of the Treeview (after the rows or the scroll position changed)"""
+
+        count = len(self.rows)
+        self.top = max(0, min(self.top, count - self.lines))
+        shown = min(self.lines, count - self.top)
+
+        # Items of the Treeview : one per line, identified by their line number
+        items = self.tree.get_children()
+        if len(items) > shown:
+            self.tree.delete(*items[shown:])
+        for line in range(shown):
+            values = self.format_row(self.rows[self.top + line])
+            if line < len(items):
+                self.tree.item(items[line], values=values)
+            else:
+                self.tree.insert('', 'end', iid=str(line), values=values)
+
+        # Selection of the line of the selected row, if it is shown
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        line = None if self.selected is None else self.selected - self.top
+        if line is not None and 0 <= line < shown:
+            self.tree.selection_set(str(line))
+        elif len(self.tree.selection()) != 0:
+            self.tree.selection_set(())
+
+        # Position of the scrollbar
+        if count == 0:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / count, (self.top + shown) / count)
+
+    def yview(self, *args):
+        """Command of the scrollbar ("moveto", fraction) or ("scroll", number, "units"/"pages")"""
+
+        if len(args) == 0:
+            return
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.rows))
+            self.refresh()
+        elif args[0] == "scroll":
+            number = int(args[1])
+            self._scroll_lines(number * self.lines if args[2] == "pages" else number)
+
+    def see(self, index):
+        """Scrolls the table so that the row at index is shown"""
+
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.lines:
+            self.top = index - self.lines + 1
+        self.refresh()
+
+    def select(self, index):
+        """Selects the row at index (None to clear the selection) and shows it"""
+
+        self.selected = index
+        if index is None:
+            self.refresh()
+        else:
+            self.see(index)
+
+    def selected_index(self):
+        """Returns the index of the selected row in self.rows, or None"""
+        self._selected(None) # The line clicked last, even if <<TreeviewSelect>> was not handled yet
+        return self.selected
+
+    def _scroll_lines(self, lines):
+        self.top += lines
+        self.refresh()
+        return "break" # The Treeview must not scroll its own items
+
+    def _wheel(self, event):
+        # One notch is 120 on Windows, 1 on macOS
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll_lines(-3 * notches)
+
+    def _move_selection(self, step):
+        if len(self.rows) == 0:
+            return "break"
+        index = self.top if self.selected is None else self.selected + step
+        self.select(max(0, min(index, len(self.rows) - 1)))
+        self.tree.event_generate("<<VirtualSelect>>")
+        return "break"
+
+    def _selected(self, event):
+        # A line was clicked : the selected row is the one shown on this line
+        selection = self.tree.selection()
+        if len(selection) != 0:
+            self.selected = self.top + int(selection[0])
+
+    def _resized(self, event):
+        # Number of lines which fit in the Treeview (below the headings)
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if len(items) != 0 else ""
+        heading = bbox[1] if bbox else self.rowheight
+        lines = max(1, (event.height - heading) // self.rowheight)
+        if lines != self.lines:
+            self.lines = lines
+            self.refresh()
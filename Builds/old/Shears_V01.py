@@ -21,7 +21,8 @@
 import os, subprocess
 from subprocess import CREATE_NO_WINDOW
 
-from Functions import timecode_to_ms, ms_to_timecode, parse_timecodes as parse, Error_Window, Info_Window
+from Functions import timecode_to_ms, ms_to_timecode, parse_timecodes as parse
+from Dialogs import Error_Window, Info_Window
 
 
 #%% Check system requirements
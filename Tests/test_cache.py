@@ -0,0 +1,57 @@
+##################################################################
+## test_cache.py : On-disk cache of the ffprobe results (see    ##
+## Builds/Cache.py). Run with pytest.                           ##
+##################################################################
+
+import os
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+import Cache
+from Cache import ProbeCache
+from Functions import cached_probe, store_probe
+
+PROBE = json.dumps({"format": {"format_name": "matroska,webm", "duration": "60.000000"}, "streams": [], "chapters": []})
+
+
+def _movies(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / f"movie{i}.mkv")
+        with open(path, "wb") as f:
+            f.write(b"\x00" * (i + 1))
+        paths.append(path)
+    return paths
+
+
+def test_get_put(tmp_path):
+    cache = ProbeCache(str(tmp_path / "cache.sqlite"))
+    (movie,) = _movies(tmp_path, 1)
+
+    assert cache.get(movie) is None
+    cache.put(movie, PROBE)
+    assert cache.get(movie) == PROBE
+
+    # The file changed : the entry is not valid anymore
+    with open(movie, "ab") as f:
+        f.write(b"\x00")
+    assert cache.get(movie) is None
+    assert cache.info()[0] == 0
+
+
+def test_probes_from_several_threads(tmp_path, monkeypatch):
+    # The cache of the process is shared by the worker threads (e.g. of the graphical interface)
+    monkeypatch.setattr(Cache, "_cache", ProbeCache(str(tmp_path / "cache.sqlite")))
+    movies = _movies(tmp_path, 8)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        infos = list(executor.map(lambda movie: store_probe(movie, PROBE), movies))
+        assert [info.duration_ms for info in infos] == [60000] * len(movies)
+
+        cached = list(executor.map(cached_probe, movies * 4))
+
+    assert all(info is not None and info.duration_ms == 60000 for info in cached)
+    assert Cache._cache.info()[0] == len(movies)
@@ -0,0 +1,57 @@
+##################################################################
+## test_chapters.py : Chapters of the graphical interface (see  ##
+## Builds/Chapters.py). Run with pytest.                        ##
+##################################################################
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Chapters import ChapterList
+from Functions import iter_chapters, iter_metadata
+
+
+def test_add_keeps_order():
+    chapters = ChapterList()
+    assert chapters.add(60000, "B") == (0, False)
+    assert chapters.add(0, "A") == (0, False)
+    assert chapters.add(120000, "C") == (2, False)
+    assert chapters.add(30000, "A2") == (1, False)
+
+    # Same start time : the title is replaced, the chapter stays where it is
+    assert chapters.add(60000, "B2") == (2, True)
+
+    assert list(chapters) == [(0, "A"), (30000, "A2"), (60000, "B2"), (120000, "C")]
+    assert chapters.index(60000) == 2 and chapters.index(60001) == -1
+    assert 30000 in chapters and 29999 not in chapters
+
+    assert chapters.remove(30000) == 1
+    assert chapters.starts() == [0, 60000, 120000] and chapters.titles() == ["A", "B2", "C"]
+    with pytest.raises(KeyError):
+        chapters.remove(30000)
+
+
+def test_load_and_append():
+    chapters = ChapterList([(20000, "C"), (0, "A"), (20000, "C2"), (10000, "B")])
+    assert list(chapters) == [(0, "A"), (10000, "B"), (20000, "C2")]
+
+    # The chapters of a file are appended in the order of the file, then sorted once
+    chapters = ChapterList()
+    for start_ms, title in [(20000, "C"), (0, "A"), (10000, "B"), (0, "A2")]:
+        chapters.append(start_ms, title)
+    chapters.sort()
+    assert list(chapters) == [(0, "A2"), (10000, "B"), (20000, "C")]
+    assert chapters.index(10000) == 1
+
+
+def test_milliseconds_kept():
+    # The milliseconds of a chapters file are kept until the metadata given to ffmpeg
+    chapters = ChapterList(iter_chapters(io.StringIO("00:00 A\n01:30.250 B\n1:00:00,5 C\n")))
+    assert chapters.starts() == [0, 90250, 3600500]
+
+    metadata = "".join(iter_metadata(zip(chapters.starts(), chapters.titles()), 7200000))
+    assert "START=90250\n" in metadata and "END=90249\n" in metadata and "START=3600500\n" in metadata
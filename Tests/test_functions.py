@@ -0,0 +1,123 @@
+##################################################################
+## test_functions.py : Chapters files and ffmpeg helpers (see   ##
+## Builds/Functions.py). Run with pytest.                       ##
+##################################################################
+
+import io
+import os
+import sys
+import subprocess
+import collections
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Functions import iter_chapters, open_chapters, remux, _drain_stderr, CHAPTER_TIMECODE, STDERR_TAIL_LINES
+from Errors import ChaptersError
+
+
+def _chapters(text, strict=False):
+    return list(iter_chapters(io.StringIO(text, newline=""), strict))
+
+
+def test_valid_lines():
+    text = "00:00 Opening\n1. 01:30.5 The road\n1:02:03,04 Finale\nCredits 10:00:00\n"
+    assert _chapters(text, strict=True) == [(0, "Opening"), (90500, "1. The road"), (3723040, "Finale"), (36000000, "Credits")]
+
+
+def test_timecode_must_be_a_word():
+    assert CHAPTER_TIMECODE.search("Part2:30 Title") is None
+    assert CHAPTER_TIMECODE.search("Title 2:30:") is None
+    assert CHAPTER_TIMECODE.search("\t2:30\tTitle").group(0) == "2:30"
+
+
+def test_blank_lines():
+    assert _chapters("\n00:00 A\n\n   \n00:10 B\n\n", strict=True) == [(0, "A"), (10000, "B")]
+
+
+def test_bom_and_crlf(tmp_path):
+    path = tmp_path / "chapters.txt"
+    path.write_bytes("\ufeff00:00 Début\r\n00:10 Fin\r\n".encode("utf-8"))
+
+    expected = [(0, "Début"), (10000, "Fin")]
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        assert list(iter_chapters(f, strict=True)) == expected
+    assert _chapters("\ufeff00:00 Début\r\n00:10 Fin\r\n") == expected
+
+
+def test_bad_timecodes():
+    text = "00:00 A\nNo timecode here\n00:10:00.1234 Too precise\n00:20 B\n"
+    assert _chapters(text) == [(0, "A"), (20000, "B")]
+
+    with pytest.raises(ChaptersError, match="Line 2"):
+        _chapters(text, strict=True)
+
+
+def test_unsorted():
+    text = "00:20 B\n00:10 A\n00:10 Again\n"
+    assert _chapters(text) == [(20000, "B"), (10000, "A"), (10000, "Again")]
+
+    with pytest.raises(ChaptersError, match="Line 2 : the chapter starts before the previous one"):
+        _chapters(text, strict=True)
+    with pytest.raises(ChaptersError, match="Line 3"):
+        _chapters("00:00 A\n00:10 B\n00:10 C\n", strict=True)
+
+
+def test_open_chapters(tmp_path):
+    path = tmp_path / "chapters.txt"
+    path.write_text("Nothing\n\n")
+    with pytest.raises(ChaptersError, match="No chapters"):
+        open_chapters(str(path))
+
+    path.write_text("00:00 A\n")
+    assert list(open_chapters(str(path))) == [(0, "A")]
+
+
+def _python_command(script):
+    """A command run like ffmpeg by remux : reads the metadata from stdin"""
+    return [sys.executable, "-c", "import sys, time\n" + script]
+
+
+def test_drain_stderr():
+    tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    stream = io.BytesIO(b"".join(f"line {i}\n".encode() for i in range(1000)))
+
+    _drain_stderr(stream, tail)
+
+    assert len(tail) == STDERR_TAIL_LINES and tail[-1] == b"line 999\n"
+    assert stream.closed
+
+
+def test_remux_keeps_stderr_tail(tmp_path):
+    # Much more error output than a pipe can hold before the metadata is read : ffmpeg must not block
+    command = _python_command("for i in range(20000): sys.stderr.write(f'warning {i}\\n')\n"
+                              "sys.stderr.flush()\n"
+                              "sys.stdin.read()\n")
+    stderr = remux(command, str(tmp_path / "out.mkv"), iter([";FFMETADATA1\n"] * 1000), 60000)
+
+    lines = stderr.splitlines()
+    assert len(lines) == STDERR_TAIL_LINES and lines[-1] == "warning 19999"
+
+
+def test_remux_stopped_if_progress_callback_raises(tmp_path, monkeypatch):
+    processes = []
+
+    class Popen(subprocess.Popen):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            processes.append(self)
+
+    monkeypatch.setattr(subprocess, "Popen", Popen)
+    command = _python_command("sys.stdin.read()\n"
+                              "print('out_time_us=1000000\\nprogress=continue', flush=True)\n"
+                              "time.sleep(60)\n")
+
+    def callback(progress):
+        raise RuntimeError("Interface closed")
+
+    with pytest.raises(RuntimeError, match="Interface closed"):
+        remux(command, str(tmp_path / "out.mkv"), iter([";FFMETADATA1\n"]), 60000, callback)
+
+    (process,) = processes
+    assert process.returncode is not None
@@ -0,0 +1,98 @@
+##################################################################
+## test_governor.py : Limits of the ffmpeg processes (see       ##
+## Builds/Governor.py). Run with pytest.                        ##
+##################################################################
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Governor import Limits, parse_rate, parse_cpus, parse_ionice
+from Functions import ffmpeg_version
+
+
+def test_parse_rate():
+    assert parse_rate("800") == 800
+    assert parse_rate("800k") == 800e3
+    assert parse_rate(" 2.5MB/s ") == 2.5e6
+    assert parse_rate("50M") == parse_rate("50mb") == 50e6
+    assert parse_rate("1G") == 1e9
+    for text in ["", "0", "-5M", "50 MiB", "fast", "5T"]:
+        with pytest.raises(ValueError):
+            parse_rate(text)
+
+
+def test_parse_cpus():
+    assert parse_cpus("0") == {0}
+    assert parse_cpus("0-3,6") == {0, 1, 2, 3, 6}
+    assert parse_cpus(" 1 ; 4 - 5 ") == {1, 4, 5}
+    for text in ["", "a", "3-1", "1,,2", "-1"]:
+        with pytest.raises(ValueError):
+            parse_cpus(text)
+
+
+def test_parse_ionice():
+    assert parse_ionice("idle") == ("idle", None)
+    assert parse_ionice("Best-Effort:7") == ("best-effort", 7)
+    assert parse_ionice("realtime:0") == ("realtime", 0)
+    for text in ["low", "best-effort:8", "best-effort:x", "idle:3"]:
+        with pytest.raises(ValueError):
+            parse_ionice(text)
+
+
+def test_stricter():
+    command_line = Limits(nice=5, ionice=("best-effort", 2), cpus={0, 1, 2}, read_rate=50e6)
+    job = Limits(nice=10, ionice=("best-effort", None), cpus={1, 2, 3}, read_rate=80e6)
+
+    limits = command_line.stricter(job)
+    # The default level of the best-effort class is 4, a lower priority than 2
+    assert (limits.nice, limits.ionice, limits.cpus, limits.read_rate) == (10, ("best-effort", None), {1, 2}, 50e6)
+    assert job.stricter(command_line).ionice == ("best-effort", None)
+    assert Limits(ionice=("best-effort", 5)).stricter(job).ionice == ("best-effort", 5)
+    assert Limits(ionice=("idle", None)).stricter(Limits(ionice=("best-effort", 7))).ionice == ("idle", None)
+
+    # No limit on one side : the other one is kept
+    limits = Limits().stricter(job)
+    assert (limits.nice, limits.ionice, limits.cpus, limits.read_rate) == (10, ("best-effort", None), {1, 2, 3}, 80e6)
+    assert not Limits().stricter(Limits())
+
+    with pytest.raises(ValueError, match="no CPU in common"):
+        Limits(cpus={0}).stricter(Limits(cpus={1}))
+
+
+def test_readrate():
+    # A 600 s file of 600 MB (1 MB/s) read at 50 MB/s : 50 times faster than real time
+    assert Limits(read_rate=50e6).readrate(600e6, 600000) == pytest.approx(50.0)
+    assert Limits(read_rate=50e6).readrate(600e6, 0) is None
+    assert Limits(nice=5).readrate(600e6, 600000) is None
+
+
+def test_spawn_ionice():
+    args, options = Limits(ionice=("best-effort", 7)).spawn(["ffmpeg", "-version"])
+    assert args == ["ionice", "-c", "2", "-n", "7", "ffmpeg", "-version"]
+    assert Limits(ionice=("idle", None)).spawn(["ffmpeg"])[0] == ["ionice", "-c", "3", "ffmpeg"]
+    assert Limits().spawn(["ffmpeg"]) == (["ffmpeg"], {"creationflags": 0})
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="Linux only")
+def test_spawn_limits_set_before_the_command_runs():
+    # The child reports its niceness and CPUs as soon as it starts
+    cpu = min(os.sched_getaffinity(0))
+    limits = Limits(nice=os.getpriority(os.PRIO_PROCESS, 0) + 3, cpus={cpu})
+    args, options = limits.spawn([sys.executable, "-c", "import os; print(os.getpriority(os.PRIO_PROCESS, 0), sorted(os.sched_getaffinity(0)))"])
+
+    output = subprocess.run(args, capture_output=True, text=True, check=True, **options).stdout.split(maxsplit=1)
+    assert int(output[0]) == limits.nice
+    assert output[1].strip() == str([cpu])
+
+
+def test_ffmpeg_version():
+    assert ffmpeg_version("ffmpeg version 7.0.2 Copyright (c) 2000-2024 the FFmpeg developers") == (7, 0)
+    assert ffmpeg_version("ffmpeg version 4.4.2-0ubuntu0.22.04.1 Copyright") == (4, 4)
+    assert ffmpeg_version("ffmpeg version n5.1.2 Copyright") == (5, 1)
+    assert ffmpeg_version("ffmpeg version N-109421-g9adf02247c Copyright") is None
+    assert ffmpeg_version("ffmpeg version 2023-03-05-git-912ac82f66-full_build-www.gyan.dev") is None
@@ -0,0 +1,55 @@
+##################################################################
+## test_jobs.py : Stages of a job (see Builds/Jobs.py). Run     ##
+## with pytest.                                                 ##
+##################################################################
+
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+import Jobs
+from Jobs import ShearsJob, prepare_job, run_job
+from Errors import ChaptersError
+
+
+def _file(path, content=""):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return str(path)
+
+
+def test_chapters_opened_when_read(tmp_path, monkeypatch):
+    # A prepared job waiting for ffmpeg doesn't keep its chapters file open
+    opened = []
+    open_chapters = Jobs.open_chapters
+    monkeypatch.setattr(Jobs, "open_chapters", lambda path: opened.append(path) or open_chapters(path))
+    movie = _file(tmp_path / "movie.mkv")
+    chapters_file = _file(tmp_path / "chapters.txt", "00:00 Start\n01:30 End\n")
+
+    result, chapters = prepare_job(ShearsJob(movie, chapters_file, str(tmp_path / "out.mkv")))
+    assert opened == []
+    assert list(chapters) == [(0, "Start"), (90000, "End")]
+    assert opened == [chapters_file]
+
+
+def test_missing_chapters_file(tmp_path):
+    movie = _file(tmp_path / "movie.mkv")
+    with pytest.raises(ChaptersError, match="does not exist"):
+        prepare_job(ShearsJob(movie, str(tmp_path / "chapters.txt"), str(tmp_path / "out.mkv")))
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None, reason="ffmpeg and ffprobe are needed")
+def test_empty_chapters_file(tmp_path):
+    # The chapters are read while ffmpeg runs : the partial output is removed
+    movie = str(tmp_path / "movie.mkv")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=d=5:r=10:s=160x120", "-c:v", "mpeg4", movie], check=True)
+    output = str(tmp_path / "out.mkv")
+
+    with pytest.raises(ChaptersError, match="No chapters"):
+        run_job(ShearsJob(movie, _file(tmp_path / "chapters.txt", "\n"), output))
+    assert not os.path.exists(output)
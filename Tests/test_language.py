@@ -0,0 +1,52 @@
+##################################################################
+## test_language.py : Language of the subtitle files (see       ##
+## Builds/Language.py). Run with pytest.                        ##
+##################################################################
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+pytest.importorskip("langdetect")
+pytest.importorskip("pycountry")
+
+import Language
+from Language import LanguageDetector
+
+TEXTS = {
+    "en": ["The weather is nice today, we should go for a walk in the park.",
+           "I don't think that is a good idea, it is going to rain all afternoon."],
+    "fr": ["Il fait beau aujourd'hui, nous devrions aller nous promener dans le parc.",
+           "Je ne pense pas que ce soit une bonne idée, il va pleuvoir tout l'après-midi."],
+}
+
+
+def _subtitles(tmp_path, name, language):
+    path = str(tmp_path / f"{name}.srt")
+    with open(path, "w", encoding="utf-8") as f:
+        for i, text in enumerate(TEXTS[language] * 5):
+            f.write(f"{i + 1}\n00:00:{i:02d},000 --> 00:00:{i:02d},900\n{text}\n\n")
+    return path
+
+
+def test_results_of_workers_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(Language, "_languages", Language._languages.__class__())
+    paths = [_subtitles(tmp_path, "en", "en"), _subtitles(tmp_path, "fr", "fr")]
+
+    with LanguageDetector(workers=1) as detector:
+        assert detector.analyse(paths) == {paths[0]: ("eng", ""), paths[1]: ("fra", "")}
+
+        # Analysed again : the languages come from the cache of this process, nothing is sent to the workers
+        submit = detector.submit
+        detector.submit = None
+        assert detector.analyse(paths) == {paths[0]: ("eng", ""), paths[1]: ("fra", "")}
+        assert detector.detect(paths) == {paths[0]: "eng", paths[1]: "fra"}
+
+        # A modified file is analysed again
+        detector.submit = submit
+        with open(paths[0], "w", encoding="utf-8") as f:
+            f.write("1\n00:00:00,000 --> 00:00:01,000\n" + TEXTS["fr"][0] + "\n")
+        assert detector.analyse(paths)[paths[0]] == ("fra", "")
@@ -0,0 +1,146 @@
+##################################################################
+## test_matroska.py : Chapters written in place in Matroska     ##
+## files (see Builds/Matroska.py). Run with pytest.             ##
+##################################################################
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Matroska import (Layout, write_chapters, build_chapters, _element, _uint, _void, _build_seek_head,
+                      EBML, SEGMENT, SEEK_HEAD, INFO, TIMESTAMP_SCALE, CHAPTERS, CLUSTER, VOID)
+
+
+def _matroska_file(path, void_size):
+    """Writes a small Matroska file : SeekHead, Void, Info, Chapters (one chapter) and a Cluster.
+    The SeekHead points to the Info and the Chapters."""
+
+    info = _element(INFO, _uint(TIMESTAMP_SCALE, 1000000))
+    chapters = build_chapters([(0, "Old")], 60000)
+    seek_head_size = len(_build_seek_head([(INFO, 256), (CHAPTERS, 256)])) # Same size with the real positions (2 bytes)
+    info_position = seek_head_size + void_size
+    seek_head = _build_seek_head([(INFO, info_position), (CHAPTERS, info_position + len(info))])
+    assert len(seek_head) == seek_head_size
+
+    segment = seek_head + _void(void_size) + info + chapters + _element(CLUSTER, _uint(0xE7, 0))
+    with open(path, "wb") as f:
+        f.write(_element(EBML, _element(0x4282, b"matroska")) + _element(SEGMENT, segment))
+
+
+def _chapters_from_seek_head(path):
+    """Returns the element found at the Chapters position of the SeekHead, and the Chapters elements of the file"""
+
+    with open(path, "rb") as f:
+        layout = Layout(f)
+        (seek_head,) = layout.find(SEEK_HEAD)
+        positions = [position for id, position in layout.read_seek_head(f, seek_head) if id == CHAPTERS]
+        assert len(positions) == 1
+        element = layout.elements.get(layout.segment.data_offset + positions[0])
+        return element, layout.find(CHAPTERS)
+
+
+def test_chapters_over_old_chapters(tmp_path):
+    path = str(tmp_path / "movie.mkv")
+    _matroska_file(path, 300)
+    write_chapters(path, [(0, "New")], 60000)
+
+    element, chapters = _chapters_from_seek_head(path)
+    assert element is not None and element.id == CHAPTERS
+    assert chapters == [element]
+
+
+def test_chapters_in_void_after_seek_head(tmp_path):
+    # The new chapters don't fit over the old ones : they are written in the Void after the SeekHead,
+    # which must then point to them (and not to the old chapters, now a Void element)
+    path = str(tmp_path / "movie.mkv")
+    _matroska_file(path, 300)
+    size = os.path.getsize(path)
+    write_chapters(path, [(0, "First chapter"), (20000, "Second chapter"), (40000, "Third chapter")], 60000)
+
+    assert os.path.getsize(path) == size
+    element, chapters = _chapters_from_seek_head(path)
+    assert element is not None and element.id == CHAPTERS
+    assert chapters == [element]
+    with open(path, "rb") as f:
+        layout = Layout(f)
+        assert layout.find(SEEK_HEAD)[0].end == element.offset
+        assert len(layout.find(VOID)) >= 1
+        assert len(layout.find(INFO)) == 1
+
+
+TAGS = 0x1254C367
+
+
+def _segment_file(path, parts):
+    """Writes a Matroska file with the given top level elements in its Segment, then a Cluster.
+    A part is an element (bytes), or a SeekHead given as a list of (ID, index of the part it points to)."""
+
+    offsets = None
+    while True:
+        elements = [_build_seek_head([(id, offsets[i] if offsets else 0) for id, i in part]) if isinstance(part, list) else part
+                    for part in parts]
+        new_offsets = [sum(len(element) for element in elements[:i]) for i in range(len(elements))]
+        if new_offsets == offsets:
+            break
+        offsets = new_offsets
+
+    segment = b"".join(elements) + _element(CLUSTER, _uint(0xE7, 0))
+    with open(path, "wb") as f:
+        f.write(_element(EBML, _element(0x4282, b"matroska")) + _element(SEGMENT, segment))
+
+
+def _chapters_entries(path):
+    """Returns the elements found at the Chapters positions of all the SeekHeads, and the Chapters elements of the file"""
+
+    with open(path, "rb") as f:
+        layout = Layout(f)
+        elements = [layout.elements.get(layout.segment.data_offset + position)
+                    for seek_head in layout.find(SEEK_HEAD)
+                    for id, position in layout.read_seek_head(f, seek_head) if id == CHAPTERS]
+        return elements, layout.find(CHAPTERS)
+
+
+def test_seek_head_growth_counted(tmp_path):
+    # The chapters fit in the Void after the SeekHead, but not with the new entry of the SeekHead :
+    # they go in the next Void, and the SeekHead grows in the first one
+    path = str(tmp_path / "movie.mkv")
+    chapters = [(0, "First"), (30000, "Second")]
+    info = _element(INFO, _uint(TIMESTAMP_SCALE, 1000000))
+    _segment_file(path, [[(INFO, 2)], _void(len(build_chapters(chapters, 60000))), info, _void(300)])
+    size = os.path.getsize(path)
+
+    write_chapters(path, chapters, 60000)
+
+    assert os.path.getsize(path) == size
+    elements, found = _chapters_entries(path)
+    assert len(found) == 1 and elements == found
+
+
+def test_seek_head_without_room(tmp_path):
+    # The new position of the chapters needs one more byte in the SeekHead, which has no room :
+    # they are written before the clusters and the SeekHead doesn't point to the old ones anymore
+    path = str(tmp_path / "movie.mkv")
+    info = _element(INFO, _uint(TIMESTAMP_SCALE, 1000000))
+    _segment_file(path, [[(INFO, 1), (CHAPTERS, 2)], info, build_chapters([(0, "Old")], 60000),
+                         _element(TAGS, bytes(300)), _void(300)])
+
+    write_chapters(path, [(0, "First chapter"), (30000, "Second chapter")], 60000)
+
+    elements, found = _chapters_entries(path)
+    assert elements == [] and len(found) == 1
+    with open(path, "rb") as f:
+        layout = Layout(f)
+        assert found[0].offset > layout.find(TAGS)[0].offset
+
+
+def test_all_seek_heads_updated(tmp_path):
+    path = str(tmp_path / "movie.mkv")
+    info = _element(INFO, _uint(TIMESTAMP_SCALE, 1000000))
+    _segment_file(path, [[(INFO, 2), (SEEK_HEAD, 4), (CHAPTERS, 3)], _void(50), info, build_chapters([(0, "Old")], 60000),
+                         [(INFO, 2), (CHAPTERS, 3)], _void(50), _void(300)])
+
+    write_chapters(path, [(0, "First chapter"), (30000, "Second chapter")], 60000)
+
+    elements, found = _chapters_entries(path)
+    assert len(found) == 1 and elements == found * 2
@@ -0,0 +1,105 @@
+##################################################################
+## test_mp4.py : Chapters written in place in MP4 files (see    ##
+## Builds/MP4.py). Needs ffmpeg. Run with pytest.               ##
+##################################################################
+
+import os
+import sys
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from MP4 import write_chapters, parse_boxes, _box_headers
+from Errors import ChaptersError
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is needed")
+
+
+def _movie(path, *options):
+    """Writes a 60 s MP4 video (10 images per second)"""
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=d=60:r=10:s=160x120",
+                    "-c:v", "mpeg4", *options, path], check=True)
+    return path
+
+
+def _boxes(path):
+    """Returns the types and offsets of the top-level boxes of a file"""
+    with open(path, "rb") as f:
+        return [(type, offset) for type, offset, _, _ in _box_headers(f, 0, os.path.getsize(path))]
+
+
+def _read_chpl(path):
+    """Returns the chapters of the chpl box of a file, as (start time in milliseconds, title)"""
+    with open(path, "rb") as f:
+        (moov,) = [box for box in _box_headers(f, 0, os.path.getsize(path)) if box[0] == b"moov"]
+        _, offset, header_size, size = moov
+        f.seek(offset + header_size)
+        moov = parse_boxes(f.read(size - header_size))
+
+    (udta,) = [box for box in moov if box.type == b"udta"]
+    data = udta.find(b"chpl").data
+    chapters = []
+    position = 9 # Version, flags, reserved and number of chapters
+    for _ in range(data[8]):
+        start, length = struct.unpack_from(">QB", data, position)
+        chapters.append((start // 10000, data[position + 9:position + 9 + length].decode("utf-8")))
+        position += 9 + length
+    return chapters
+
+
+def test_moov_at_end_in_place(tmp_path):
+    path = _movie(str(tmp_path / "movie.mp4"))
+    boxes = _boxes(path)
+    assert boxes[-1][0] == b"moov"
+
+    chapters = [(0, "Début"), (20000, "Milieu"), (40500, "Fin")]
+    write_chapters(path, chapters, title="Movie")
+
+    # The moov is rewritten where it was, the media data doesn't move
+    assert _boxes(path) == boxes
+    assert _read_chpl(path) == chapters
+
+
+def test_moov_before_media_appended(tmp_path):
+    path = _movie(str(tmp_path / "movie.mp4"), "-movflags", "faststart")
+    boxes = _boxes(path)
+    moov_offset = dict(boxes)[b"moov"]
+    mdat_offset = dict(boxes)[b"mdat"]
+    assert moov_offset < mdat_offset
+
+    chapters = [(0, "A"), (30000, "B")]
+    write_chapters(path, chapters)
+
+    # The new moov doesn't fit before the media data : it is appended and the old one becomes a free box
+    new_boxes = _boxes(path)
+    assert (b"free", moov_offset) in new_boxes
+    assert dict(new_boxes)[b"mdat"] == mdat_offset
+    assert [type for type, _ in new_boxes].count(b"moov") == 1 and new_boxes[-1][0] == b"moov"
+    assert _read_chpl(path) == chapters
+
+    # Written again, the chapters replace the old ones
+    write_chapters(path, [(0, "C")])
+    assert _read_chpl(path) == [(0, "C")]
+
+
+def test_long_title_not_cut_in_a_character(tmp_path):
+    path = _movie(str(tmp_path / "movie.mp4"))
+    write_chapters(path, [(0, "é" * 200)])
+
+    (title,) = [title for _, title in _read_chpl(path)]
+    assert title == "é" * 127 # 254 bytes, the 128th character doesn't fit in 255 bytes
+
+
+def test_chapter_after_end(tmp_path):
+    path = _movie(str(tmp_path / "movie.mp4"))
+    with open(path, "rb") as f:
+        content = f.read()
+
+    with pytest.raises(ChaptersError):
+        write_chapters(path, [(0, "A"), (60000, "B")])
+    with open(path, "rb") as f:
+        assert f.read() == content
@@ -0,0 +1,87 @@
+##################################################################
+## test_progress.py : Progress of ffmpeg jobs (see              ##
+## Builds/Progress.py). Run with pytest.                        ##
+##################################################################
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Progress import Progress
+
+# Output of `ffmpeg -progress pipe:1 -nostats` for a 600 s video (one block at the start, one in the middle, the end)
+STREAM = b"""frame=0
+fps=0.00
+stream_0_0_q=-1.0
+bitrate=N/A
+total_size=N/A
+out_time_us=N/A
+out_time_ms=N/A
+out_time=N/A
+dup_frames=0
+drop_frames=0
+speed=N/A
+progress=continue
+frame=3750
+fps=0.00
+stream_0_0_q=-1.0
+bitrate= 206.1kbits/s
+total_size=3864131
+out_time_us=150000000
+out_time_ms=150000000
+out_time=00:02:30.000000
+dup_frames=0
+drop_frames=0
+speed=2.00x
+progress=continue
+frame=15000
+fps=0.00
+stream_0_0_q=-1.0
+bitrate= 206.1kbits/s
+total_size=15456524
+out_time_us=600000000
+out_time_ms=600000000
+out_time=00:10:00.000000
+dup_frames=0
+drop_frames=0
+speed=3.34e+03x
+progress=end
+""".replace(b"\n", b"\r\n") # Windows line endings, as read from the pipe on Windows
+
+
+def test_feed_captured_stream():
+    updates = []
+    progress = Progress(600000, lambda p: updates.append((p.out_time_ms, p.total_size, p.percent, p.eta, p.finished)))
+
+    for line in STREAM.splitlines(keepends=True):
+        progress.feed(line)
+
+    # One update per block : the N/A values of the first block are ignored
+    assert updates[0][:2] == (0, 0) and updates[0][3] is None
+    # At 150 s of 600 s, twice as fast as real time : 225 s left
+    assert updates[1] == (150000, 3864131, 25.0, pytest.approx(225.0), False)
+    assert updates[2] == (600000, 15456524, 100.0, 0.0, True)
+    assert progress.speed == pytest.approx(3340.0)
+
+
+def test_unknown_duration():
+    progress = Progress(0)
+    for line in STREAM.decode().splitlines()[:24]:
+        progress.feed(line)
+
+    assert progress.out_time_ms == 150000
+    assert progress.percent == 0.0 and progress.eta is None
+    assert str(progress).startswith("  0.0 %")
+
+
+def test_eta_from_average_speed():
+    # Without the speed of ffmpeg, the remaining time is estimated from the time elapsed since the start
+    progress = Progress(600000)
+    progress.start -= 10
+    for line in ["out_time_us=200000000", "speed=N/A", "progress=continue"]:
+        progress.feed(line)
+
+    assert progress.eta == pytest.approx(20.0, rel=0.01)
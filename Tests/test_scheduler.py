@@ -0,0 +1,94 @@
+##################################################################
+## test_scheduler.py : Adaptive number of jobs per disk (see    ##
+## Builds/Scheduler.py). Run with pytest.                       ##
+##################################################################
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+import Scheduler
+from Scheduler import DeviceLimit
+from Batch import Job, _destination
+
+
+class Clock():
+    """Replaces time.perf_counter in Scheduler.py, to measure synthetic intervals"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _interval(limit, clock, jobs, mb, elapsed=2.0):
+    """Runs `jobs` jobs on the device for `elapsed` seconds, writing `mb` MB, then measures its throughput"""
+    while limit.running < jobs:
+        limit.start()
+    while limit.running > jobs:
+        limit.finish()
+    clock.now += elapsed
+    limit.bytes += mb * 1e6
+    return limit.measure(elapsed)
+
+
+def test_measure_adjusts_limit(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(Scheduler.time, "perf_counter", clock)
+    limit = DeviceLimit(1, limit=1, maximum=4)
+    limit.waiting = 1 # More jobs are waiting for the device
+
+    # 1 job : 50 MB/s, one more job is tried
+    assert _interval(limit, clock, 1, 100) == 50.0
+    assert limit.limit == 2
+
+    # 2 jobs : 75 MB/s, more than 10 % faster : one more job is tried
+    _interval(limit, clock, 2, 150)
+    assert limit.limit == 3
+
+    # 3 jobs : 77.5 MB/s, 2 jobs were about as fast : back to 2 jobs
+    _interval(limit, clock, 3, 155)
+    assert limit.limit == 2
+
+    # 2 jobs kept while 3 jobs are known to be no faster, then 3 jobs are tried again (the load may have changed)
+    for _ in range(DeviceLimit.EXPLORE_EVERY - 1):
+        _interval(limit, clock, 2, 150)
+        assert limit.limit == 2
+    _interval(limit, clock, 2, 150)
+    assert limit.limit == 3
+
+
+def test_measure_needs_waiting_jobs_and_full_slots(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(Scheduler.time, "perf_counter", clock)
+    limit = DeviceLimit(1, limit=2, maximum=4)
+
+    # Fewer jobs than allowed (end of the batch) : the measure doesn't change the limit
+    limit.waiting = 1
+    _interval(limit, clock, 1, 100)
+    assert limit.limit == 2 and limit.rates == {}
+
+    # No job waiting : the limit is not raised
+    limit.waiting = 0
+    _interval(limit, clock, 2, 100)
+    assert limit.limit == 2
+
+    # Never more than the maximum
+    limit = DeviceLimit(1, limit=1, maximum=1)
+    limit.waiting = 1
+    _interval(limit, clock, 1, 100)
+    assert limit.limit == 1
+
+
+def test_destination_after_overwrite_policy(tmp_path):
+    # The device of a job is the one of the file it writes, renamed if the output exists
+    movie = str(tmp_path / "movie.mkv")
+    for path in [movie, str(tmp_path / "out.mkv")]:
+        open(path, "wb").close()
+    job = Job(movie, "chapters.txt", output="out")
+
+    assert _destination(job, "rename") == str(tmp_path / "out(1).mkv")
+    assert _destination(job, "overwrite") == str(tmp_path / "out.mkv")
+    assert _destination(job, "skip") == str(tmp_path / "out.mkv")
@@ -0,0 +1,45 @@
+##################################################################
+## test_split.py : One file per chapter (see Builds/Split.py).  ##
+## Needs ffmpeg and ffprobe. Run with pytest.                   ##
+##################################################################
+
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+from Split import split_movie
+from Errors import ChaptersError
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                reason="ffmpeg and ffprobe are needed")
+
+
+@pytest.fixture
+def movie(tmp_path):
+    """A 60 s Matroska video with a keyframe every 25 s (10 images per second)"""
+    path = str(tmp_path / "movie.mkv")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=d=60:r=10:s=160x120",
+                    "-c:v", "mpeg4", "-g", "250", path], check=True)
+    return path
+
+
+def test_split_on_keyframes(movie):
+    pieces, warnings = split_movie(movie, [(0, "A"), (25000, "B")], overwrite="overwrite")
+
+    folder = os.path.dirname(movie)
+    assert pieces == [os.path.join(folder, "movie - 01 - A.mkv"), os.path.join(folder, "movie - 02 - B.mkv")]
+    assert all(os.path.isfile(piece) for piece in pieces)
+    assert sorted(os.listdir(folder)) == sorted(["movie.mkv"] + [os.path.basename(piece) for piece in pieces])
+
+
+def test_split_chapters_in_one_gop(movie):
+    # B and C start before the same keyframe (25 s) : they can't be cut apart, no piece is overwritten nor kept
+    with pytest.raises(ChaptersError, match="\"B\""):
+        split_movie(movie, [(0, "A"), (1000, "B"), (1500, "C"), (30000, "D")], overwrite="overwrite")
+
+    assert os.listdir(os.path.dirname(movie)) == ["movie.mkv"]
@@ -0,0 +1,67 @@
+##################################################################
+## test_timecodes.py : Vectorized timecodes (see                ##
+## Builds/Timecodes.py). Run with pytest.                       ##
+##################################################################
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Builds"))
+
+np = pytest.importorskip("numpy")
+
+from Timecodes import parse_timecodes_buffer, timecodes_to_ms, ms_to_timecodes
+from Functions import iter_chapters, ms_to_timecode
+
+CHAPTERS = ("00:00 Opening\r\n"
+            "Chapter 2 01:30.5 The road\r\n"
+            "\r\n"
+            "A line without timecode\r\n"
+            "1:02:03,004 Finale\r\n"
+            "Credits 1:59:59\r\n")
+
+
+def test_parse_timecodes_buffer():
+    times, titles = parse_timecodes_buffer(CHAPTERS)
+
+    assert times.tolist() == [0, 90500, 3723004, 7199000]
+    assert titles == ["Opening", "Chapter 2 The road", "Finale", "Credits"]
+    # Same chapters as the line by line parser of Functions.py
+    assert list(zip(times.tolist(), titles)) == list(iter_chapters(CHAPTERS.splitlines(keepends=True)))
+
+
+def test_malformed_lines_skipped():
+    text = "1:2:3:4 Too many fields\nTitle00:10 Glued\n00:10:00.1234 Too precise\n\n"
+    times, titles = parse_timecodes_buffer(text)
+    assert times.tolist() == [] and titles == []
+
+    times, titles = parse_timecodes_buffer("")
+    assert times.dtype == np.int64 and times.size == 0
+
+
+def test_round_trip():
+    ms = [0, 999, 61001, 3723004, 99 * 3600000 + 59 * 60000 + 59999]
+
+    timecodes = ms_to_timecodes(ms, milliseconds=True)
+    assert timecodes.tolist() == ["00:00:00.000", "00:00:00.999", "00:01:01.001", "01:02:03.004", "99:59:59.999"]
+    assert timecodes_to_ms(timecodes).tolist() == ms
+
+    # Without the milliseconds, like Functions.ms_to_timecode
+    assert ms_to_timecodes(ms).tolist() == [ms_to_timecode(value) for value in ms]
+
+
+def test_long_and_negative_times():
+    # More than 99 hours, or negative : the timecodes don't have a fixed width
+    assert ms_to_timecodes([100 * 3600000 + 1000, 0]).tolist() == ["100:00:01", "00:00:00"]
+    assert timecodes_to_ms(["100:00:01"]).tolist() == [100 * 3600000 + 1000]
+    assert ms_to_timecodes([]).size == 0
+
+
+def test_invalid_timecode():
+    with pytest.raises(ValueError, match="1:2:3:4"):
+        timecodes_to_ms(["00:01", "1:2:3:4", "00:02"])
+    with pytest.raises(ValueError, match="00:01 Title"):
+        timecodes_to_ms(["00:01 Title"])
+    assert timecodes_to_ms([]).size == 0